@@ -0,0 +1,201 @@
+"""
+回合内的迭代加深 alpha-beta（negamax）搜索
+
+从发牌到圆盘和待定区被拿空，一个回合内的对局是确定的。
+搜索只看到本回合结束，叶子节点用真实的回合结算（准备区上墙和扣分区扣分）
+计算双方的分差。
+
+走法排序：置换表走法、杀手走法、历史启发，直接放入扣分区的走法排在最后。
+每次迭代使用期望窗口，超出窗口时用完整窗口重新搜索；超过时间立即停止，
+使用上一次完整迭代的结果。不设时间限制时结果完全可复现。
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+from engine import AzulEngine, FLOOR
+from moves import Move, generate_moves
+from zobrist import TranspositionTable
+
+INF = 10 ** 6
+MAX_PLY = 64
+# 置换表中表示"子树已经搜索到回合结束"的深度
+EXACT_DEPTH = 99
+
+
+class SearchTimeout(Exception):
+    """搜索超过时间限制"""
+
+
+def evaluate(state: AzulEngine) -> int:
+    """在副本上执行回合结算，返回当前玩家与对手的分差"""
+    scored = state.copy()
+    scored.score_round()
+    player = state.current_player
+    return scored.players[player].score - scored.players[1 - player].score
+
+
+class AlphaBetaSearch:
+    """一次搜索的状态：置换表、杀手走法和历史表"""
+
+    def __init__(self, time_limit: Optional[float] = None, max_depth: int = MAX_PLY,
+                 aspiration: int = 3, tt: Optional[TranspositionTable] = None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.aspiration = aspiration
+        self.tt = tt if tt is not None else TranspositionTable(18)
+        self.deadline: Optional[float] = None
+        self.killers: List[List[Optional[tuple]]] = []
+        self.history: Dict[tuple, int] = {}
+        self.nodes = 0
+        self.depth_limited = False
+        self.root_move: Optional[Move] = None
+        self.completed_depth = 0
+
+    def search(self, engine: AzulEngine) -> Tuple[Optional[Move], int]:
+        """迭代加深搜索，返回(最佳走法, 分差估值)"""
+        self.deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = {}
+        self.nodes = 0
+        self.completed_depth = 0
+
+        moves = generate_moves(engine)
+        if not moves:
+            return None, evaluate(engine)
+        best_move, best_value = moves[0], -INF
+        value = None
+        for depth in range(1, self.max_depth + 1):
+            try:
+                if value is None:
+                    value = self.root_search(engine, depth, -INF, INF)
+                else:
+                    alpha, beta = value - self.aspiration, value + self.aspiration
+                    value = self.root_search(engine, depth, alpha, beta)
+                    if value <= alpha or value >= beta:
+                        value = self.root_search(engine, depth, -INF, INF)
+            except SearchTimeout:
+                break
+            best_move, best_value = self.root_move, value
+            self.completed_depth = depth
+            # 整棵树都已搜索到回合结束，更深的迭代结果相同
+            if not self.depth_limited:
+                break
+        return best_move, best_value
+
+    def root_search(self, engine: AzulEngine, depth: int, alpha: int, beta: int) -> int:
+        self.depth_limited = False
+        self.root_move = None
+        return self.negamax(engine, depth, alpha, beta, 0)
+
+    def negamax(self, state: AzulEngine, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """返回当前玩家视角的分差"""
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 255 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        if state.is_round_over():
+            return evaluate(state)
+        if depth == 0 or ply >= MAX_PLY:
+            self.depth_limited = True
+            return evaluate(state)
+
+        key = state.key
+        entry = self.tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry.move
+            if ply > 0 and entry.depth >= depth:
+                if entry.depth < EXACT_DEPTH:
+                    self.depth_limited = True
+                if entry.flag == TranspositionTable.EXACT:
+                    return entry.value
+                if entry.flag == TranspositionTable.LOWER:
+                    alpha = max(alpha, entry.value)
+                else:
+                    beta = min(beta, entry.value)
+                if alpha >= beta:
+                    return entry.value
+
+        alpha_orig = alpha
+        outer_limited = self.depth_limited
+        self.depth_limited = False
+        best_value = -INF
+        best_move = None
+        player = state.current_player
+        for move in self.order_moves(generate_moves(state), ply, tt_move):
+            child = state.copy()
+            child._play(move.source, move.color, move.target)
+            if child.current_player == player:
+                # 这一步结束了回合，仍然是同一玩家的视角
+                value = self.negamax(child, depth - 1, alpha, beta, ply + 1)
+            else:
+                value = -self.negamax(child, depth - 1, -beta, -alpha, ply + 1)
+            if value > best_value:
+                best_value, best_move = value, move
+                if ply == 0:
+                    self.root_move = move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                self.record_cutoff(move, depth, ply)
+                break
+
+        node_limited = self.depth_limited
+        self.depth_limited = outer_limited or node_limited
+        if best_value <= alpha_orig:
+            flag = TranspositionTable.UPPER
+        elif best_value >= beta:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.tt.store(key, depth if node_limited else EXACT_DEPTH, best_value, flag, best_move)
+        return best_value
+
+    def order_moves(self, moves: List[Move], ply: int, tt_move: Optional[Move]) -> List[Move]:
+        """置换表走法、杀手走法、历史得分依次优先，放入扣分区的走法最后"""
+        killers = self.killers[ply]
+        history = self.history
+        tt_key = tt_move[:3] if tt_move else None
+
+        def priority(move: Move):
+            key = move[:3]
+            return (
+                key == tt_key,
+                move.target != FLOOR,
+                key in killers,
+                history.get(key, 0),
+                -move.overflow,
+            )
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def record_cutoff(self, move: Move, depth: int, ply: int):
+        """beta剪枝时更新杀手走法和历史表"""
+        key = move[:3]
+        killers = self.killers[ply]
+        if killers[0] != key:
+            killers[1] = killers[0]
+            killers[0] = key
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+
+class AlphaBetaPlayer:
+    """使用回合内 alpha-beta 搜索的电脑玩家
+
+    参数:
+        time_limit (float): 每步的时间上限（秒），None 表示不限时（结果可复现）
+        max_depth (int): 迭代加深的最大深度
+    """
+
+    def __init__(self, time_limit: Optional[float] = 1.0, max_depth: int = MAX_PLY,
+                 aspiration: int = 3, tt_bits: int = 18):
+        self.search = AlphaBetaSearch(time_limit, max_depth, aspiration, TranspositionTable(tt_bits))
+        self.last_value = 0
+
+    def choose_move(self, engine: AzulEngine) -> Move:
+        """为当前玩家选择一步走法"""
+        move, self.last_value = self.search.search(engine)
+        return move
+
+    def close(self):
+        self.search.tt.clear()
@@ -0,0 +1,100 @@
+"""
+界面资源缓存
+
+- 每种字号只创建一个 Font 对象
+- 渲染好的文字按 (文字, 字号, 颜色) 放入 LRU 缓存
+- 棋子贴图按 (颜色, 是否先手棋子, 是否选中) 预先光栅化，绘制时只需一次 blit
+
+缓存的 Surface 是共享的，调用者不能修改它们（需要半透明时先 copy）。
+pygame.quit() 之后字体失效，需要调用 clear()。
+"""
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import pygame
+
+Color = Tuple[int, int, int]
+
+# 文字缓存的容量，足够放下所有提示、标签和常见的分数
+TEXT_CACHE_SIZE = 512
+# 选中时的高亮颜色
+GLOW_COLOR = (255, 255, 0)
+
+
+@lru_cache(maxsize=None)
+def get_font(size: int) -> pygame.font.Font:
+    """每种字号共享一个默认字体对象"""
+    return pygame.font.Font(None, size)
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text: str, size: int, color: Color) -> pygame.Surface:
+    """渲染（抗锯齿）文字，结果按 (文字, 字号, 颜色) 缓存"""
+    return get_font(size).render(text, True, color)
+
+
+class TileAtlas:
+    """棋子贴图集。贴图四周留出 margin 像素放选中时的高亮边框"""
+
+    def __init__(self, piece_size: int, border_color: Color, margin: int = 2):
+        self.piece_size = piece_size
+        self.border_color = border_color
+        self.margin = margin
+        self.sprites: Dict[Tuple[Color, bool, bool], pygame.Surface] = {}
+
+    def preload(self, colors):
+        """预先光栅化给定颜色的全部贴图"""
+        for color in colors:
+            for is_first in (False, True):
+                for selected in (False, True):
+                    self.sprite(color, is_first, selected)
+
+    def sprite(self, color: Color, is_first: bool, selected: bool) -> pygame.Surface:
+        key = (color, is_first, selected)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = self.rasterize(color, is_first, selected)
+        return sprite
+
+    def blit(self, screen: pygame.Surface, x: int, y: int, color: Color, is_first: bool, selected: bool):
+        """把左上角在 (x, y) 的棋子画到屏幕上"""
+        screen.blit(self.sprite(color, is_first, selected), (x - self.margin, y - self.margin))
+
+    def rasterize(self, color: Color, is_first: bool, selected: bool) -> pygame.Surface:
+        size = self.piece_size
+        m = self.margin
+        sprite = pygame.Surface((size + 2 * m, size + 2 * m), pygame.SRCALPHA)
+        if is_first:
+            # 先手棋子：双层边框的菱形
+            points = [(m + size//2, m), (m + size, m + size//2), (m + size//2, m + size), (m, m + size//2)]
+            pygame.draw.polygon(sprite, color, points)
+            pygame.draw.polygon(sprite, self.border_color, points, 2)
+            pygame.draw.polygon(sprite, self.border_color, [
+                (m + size//2, m + 4),
+                (m + size - 4, m + size//2),
+                (m + size//2, m + size - 4),
+                (m + 4, m + size//2)
+            ], 2)
+            if selected:
+                pygame.draw.polygon(sprite, GLOW_COLOR, [
+                    (m + size//2, m - 2),
+                    (m + size + 2, m + size//2),
+                    (m + size//2, m + size + 2),
+                    (m - 2, m + size//2)
+                ], 2)
+        else:
+            center = (m + size//2, m + size//2)
+            pygame.draw.circle(sprite, color, center, size//2)
+            pygame.draw.circle(sprite, self.border_color, center, size//2, 2)
+            if selected:
+                pygame.draw.circle(sprite, GLOW_COLOR, center, size//2 + 2, 2)
+        return sprite
+
+    def clear(self):
+        self.sprites.clear()
+
+
+def clear():
+    """清空字体和文字缓存（pygame.quit 之后调用）"""
+    render_text.cache_clear()
+    get_font.cache_clear()
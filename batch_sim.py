@@ -0,0 +1,314 @@
+"""
+NumPy 批量模拟器
+
+N 局游戏保存在数组中，每一步为每局执行一个走法，发牌和回合结算也是整批的数组运算：
+
+    disks     N x 5 x 5   每个圆盘每种颜色的数量
+    center    N x 5       待定区每种颜色的数量
+    bag       N x 5       棋子池
+    discard   N x 5       废棋堆
+    prep      N x 2 x 5   准备区每行的颜色（-1为空）和数量
+    wall      N x 2 x 25  结算区
+    floor     N x 2 x 7   扣分区（-1为空，FIRST_TOKEN 为先手棋子）
+    score     N x 2
+
+规则与 engine.py 完全一致（可以用 from_engines / to_engine 互相转换来核对）。
+所有局按回合同步推进：本回合先结束的局等待其他局，全部结束后一起结算和发牌。
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from bitboard import COLOR_BONUS, COLUMN_BONUS, ROW_BONUS
+from engine import (AzulEngine, CENTER, EMPTY, FIRST_TOKEN, FLOOR_SIZE, NUM_COLORS, NUM_DISKS,
+                    NUM_ROWS, PENALTY_VALUES, TILES_PER_COLOR, TILES_PER_DISK, wall_column)
+
+NUM_SOURCES = NUM_DISKS + 1    # 走法数组中来源 NUM_DISKS 表示待定区
+NUM_TARGETS = NUM_ROWS + 1     # 目标 NUM_ROWS 表示扣分区
+
+PENALTY_TABLE = np.array(PENALTY_VALUES, dtype=np.int32)
+# WALL_INDEX[row, color] -> 该颜色在结算区的格子序号
+WALL_INDEX = np.array([[row * NUM_COLORS + wall_column(row, color) for color in range(NUM_COLORS)]
+                       for row in range(NUM_ROWS)], dtype=np.intp)
+
+
+class BatchSimulator:
+    """N 局同步推进的批量模拟器"""
+
+    def __init__(self, n: int, seed: Optional[int] = None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.bag = np.full((n, NUM_COLORS), TILES_PER_COLOR, dtype=np.int16)
+        self.discard = np.zeros((n, NUM_COLORS), dtype=np.int16)
+        self.disks = np.zeros((n, NUM_DISKS, NUM_COLORS), dtype=np.int16)
+        self.center = np.zeros((n, NUM_COLORS), dtype=np.int16)
+        self.prep_colors = np.full((n, 2, NUM_ROWS), EMPTY, dtype=np.int8)
+        self.prep_counts = np.zeros((n, 2, NUM_ROWS), dtype=np.int8)
+        self.wall = np.zeros((n, 2, NUM_ROWS * NUM_COLORS), dtype=bool)
+        self.floor = np.full((n, 2, FLOOR_SIZE), EMPTY, dtype=np.int8)
+        self.score = np.zeros((n, 2), dtype=np.int32)
+        self.first_token_in_center = np.zeros(n, dtype=bool)
+        self.next_first_player = np.zeros(n, dtype=np.int8)
+        self.current_player = np.zeros(n, dtype=np.int8)
+        self.round_count = np.zeros(n, dtype=np.int16)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.rows = np.arange(n)
+
+    # ------------------------------------------------------------------
+    # 发牌
+
+    def start_new_round(self):
+        """为所有未结束的局发牌"""
+        live = ~self.game_over
+        self.first_token_in_center[live] = True
+
+        # 棋子池空了的局把废棋堆倒回棋子池
+        refill = live & (self.bag.sum(axis=1) == 0)
+        self.bag[refill] = self.discard[refill]
+        self.discard[refill] = 0
+
+        # 逐个棋子抽取，每次对所有局同时进行
+        for disk in range(NUM_DISKS):
+            for _ in range(TILES_PER_DISK):
+                total = self.bag.sum(axis=1)
+                drawing = live & (total > 0)
+                pick = (self.rng.random(self.n) * np.maximum(total, 1)).astype(np.int32)
+                color = (pick[:, None] >= np.cumsum(self.bag, axis=1)).sum(axis=1)
+                color = np.minimum(color, NUM_COLORS - 1)
+                games = self.rows[drawing]
+                self.bag[games, color[drawing]] -= 1
+                self.disks[games, disk, color[drawing]] += 1
+
+        self.current_player[live] = self.next_first_player[live]
+        self.round_count[live] += 1
+        # 棋子全部用完时无法继续
+        self.game_over |= live & (self.tiles_on_table() == 0)
+
+    # ------------------------------------------------------------------
+    # 走法
+
+    def tiles_on_table(self) -> np.ndarray:
+        return self.disks.sum(axis=(1, 2)) + self.center.sum(axis=1)
+
+    def active(self) -> np.ndarray:
+        """本回合还有棋子可拿的局"""
+        return ~self.game_over & (self.tiles_on_table() > 0)
+
+    def sources(self) -> np.ndarray:
+        """N x 6 x 5：5个圆盘和待定区中每种颜色的数量"""
+        return np.concatenate([self.disks, self.center[:, None, :]], axis=1)
+
+    def legal_mask(self) -> np.ndarray:
+        """N x 6(来源) x 5(颜色) x 6(目标) 的合法走法掩码
+
+        与 moves.generate_moves 相同，不包括放入已满的准备区行。
+        """
+        player = self.current_player.astype(np.intp)
+        prep_colors = self.prep_colors[self.rows, player]      # N x 5
+        prep_counts = self.prep_counts[self.rows, player]
+        wall = self.wall[self.rows, player]                    # N x 25
+
+        colors = np.arange(NUM_COLORS)
+        row_lengths = np.arange(1, NUM_ROWS + 1)
+        same_color = (prep_counts[:, :, None] == 0) | (prep_colors[:, :, None] == colors)
+        not_full = (prep_counts < row_lengths)[:, :, None]
+        on_wall = wall[:, WALL_INDEX]                          # N x 5(行) x 5(颜色)
+        allowed = same_color & not_full & ~on_wall
+        targets = np.concatenate([allowed, np.ones((self.n, 1, NUM_COLORS), dtype=bool)], axis=1)
+
+        available = self.sources() > 0                         # N x 6 x 5
+        legal = available[:, :, :, None] & targets.transpose(0, 2, 1)[:, None, :, :]
+        return legal & self.active()[:, None, None, None]
+
+    def random_moves(self, legal: Optional[np.ndarray] = None):
+        """为每局均匀随机选择一个合法走法，返回 (来源, 颜色, 目标) 三个数组"""
+        if legal is None:
+            legal = self.legal_mask()
+        flat = legal.reshape(self.n, -1)
+        choice = np.argmax(self.rng.random(flat.shape) * flat, axis=1)
+        source, color, target = np.unravel_index(choice, legal.shape[1:])
+        return source, color, target
+
+    def step(self, source: np.ndarray, color: np.ndarray, target: np.ndarray,
+             mask: Optional[np.ndarray] = None):
+        """每局执行一个走法；来源 NUM_DISKS 为待定区，目标 NUM_ROWS 为扣分区
+
+        mask 为 None 时对所有 active() 的局执行，走法必须合法。
+        """
+        if mask is None:
+            mask = self.active()
+        games = self.rows[mask]
+        source = np.asarray(source)[mask].astype(np.intp)
+        color = np.asarray(color)[mask].astype(np.intp)
+        target = np.asarray(target)[mask].astype(np.intp)
+        player = self.current_player[games].astype(np.intp)
+
+        # 拿走棋子
+        from_center = source == NUM_DISKS
+        disk_index = np.minimum(source, NUM_DISKS - 1)
+        count = np.where(from_center, self.center[games, color], self.disks[games, disk_index, color])
+        count = count.astype(np.int32)
+        self.center[games[from_center], color[from_center]] = 0
+        disk_games = games[~from_center]
+        disk_sources = disk_index[~from_center]
+        rest = self.disks[disk_games, disk_sources].copy()
+        rest[np.arange(len(disk_games)), color[~from_center]] = 0
+        # 剩余棋子移到待定区
+        self.center[disk_games] += rest
+        self.disks[disk_games, disk_sources] = 0
+
+        # 放入准备区
+        to_row = target < NUM_ROWS
+        row = np.minimum(target, NUM_ROWS - 1)
+        free = row + 1 - self.prep_counts[games, player, row]
+        placed = np.where(to_row, np.minimum(count, free), 0)
+        self.prep_counts[games, player, row] += placed.astype(np.int8)
+        has_placed = placed > 0
+        self.prep_colors[games[has_placed], player[has_placed], row[has_placed]] = color[has_placed]
+
+        # 溢出的棋子从左到右放入扣分区，放不下的进入废棋堆
+        overflow = count - placed
+        slots = np.arange(FLOOR_SIZE)
+        floor = self.floor[games, player]
+        length = (floor >= 0).sum(axis=1)
+        fit = np.minimum(overflow, FLOOR_SIZE - length)
+        fill = (slots >= length[:, None]) & (slots < (length + fit)[:, None])
+        floor = np.where(fill, color[:, None], floor)
+        np.add.at(self.discard, (games, color), (overflow - fit).astype(np.int16))
+
+        # 第一个从待定区拿棋子的玩家获得先手棋子
+        took_token = from_center & self.first_token_in_center[games]
+        length = (floor >= 0).sum(axis=1)
+        token_slot = took_token & (length < FLOOR_SIZE)
+        floor[token_slot, length[token_slot]] = FIRST_TOKEN
+        self.floor[games, player] = floor
+        token_games = games[took_token]
+        self.first_token_in_center[token_games] = False
+        self.next_first_player[token_games] = player[took_token]
+
+        # 回合没有结束时轮到对手
+        still_playing = self.tiles_on_table()[games] > 0
+        self.current_player[games[still_playing]] = 1 - player[still_playing]
+
+    # ------------------------------------------------------------------
+    # 结算
+
+    def score_round(self, mask: Optional[np.ndarray] = None):
+        """批量回合结算：准备区从上到下上墙计分，再结算扣分区，游戏结束时加上奖励分"""
+        if mask is None:
+            mask = ~self.game_over
+        games = self.rows[mask]
+        for player in range(2):
+            for row in range(NUM_ROWS):
+                full = self.prep_counts[games, player, row] == row + 1
+                scoring = games[full]
+                color = self.prep_colors[scoring, player, row].astype(np.intp)
+                cell = WALL_INDEX[row, color]
+                self.wall[scoring, player, cell] = True
+
+                # 按整行/整列的棋子数计分，与 bitboard.PLACEMENT_SCORE 一致
+                wall = self.wall[scoring, player].reshape(-1, NUM_ROWS, NUM_COLORS)
+                horizontal = wall[:, row, :].sum(axis=1)
+                col = cell - row * NUM_COLORS
+                vertical = wall[np.arange(len(scoring)), :, col].sum(axis=1)
+                gained = np.where(horizontal >= 2, horizontal, 0) + np.where(vertical >= 2, vertical, 0)
+                self.score[scoring, player] += np.maximum(gained, 1).astype(np.int32)
+
+                np.add.at(self.discard, (scoring, color), row)
+                self.prep_counts[scoring, player, row] = 0
+                self.prep_colors[scoring, player, row] = EMPTY
+
+            # 扣分区
+            floor = self.floor[games, player]
+            occupied = floor >= 0
+            self.score[games, player] += (occupied * PENALTY_TABLE).sum(axis=1).astype(np.int32)
+            for color in range(NUM_COLORS):
+                self.discard[games, color] += (floor == color).sum(axis=1).astype(np.int16)
+            self.floor[games, player] = EMPTY
+
+        wall = self.wall.reshape(self.n, 2, NUM_ROWS, NUM_COLORS)
+        full_rows = wall.all(axis=3)
+        complete = full_rows.any(axis=(1, 2))
+        self.game_over[games] = complete[games]
+
+        # 游戏结束的局加上奖励分，与 AzulEngine.apply_end_game_bonus 一致
+        ended = games[complete[games]]
+        if len(ended):
+            rows = full_rows[ended].sum(axis=2)
+            columns = wall[ended].all(axis=2).sum(axis=2)
+            colors = self.wall[ended][:, :, WALL_INDEX].all(axis=2).sum(axis=2)
+            self.score[ended] += (rows * ROW_BONUS + columns * COLUMN_BONUS + colors * COLOR_BONUS).astype(np.int32)
+
+    # ------------------------------------------------------------------
+    # 整局
+
+    def play_random(self, max_rounds: int = 30) -> np.ndarray:
+        """所有局都用随机走法下完，返回 N x 2 的最终分数"""
+        return self.play(lambda sim: sim.random_moves(), max_rounds)
+
+    def play(self, policy, max_rounds: int = 30) -> np.ndarray:
+        """用 policy(sim) -> (来源, 颜色, 目标) 下完所有局，返回最终分数"""
+        self.start_new_round()
+        while not self.game_over.all():
+            while self.active().any():
+                self.step(*policy(self))
+            self.score_round()
+            self.game_over |= self.round_count >= max_rounds
+            if not self.game_over.all():
+                self.start_new_round()
+        return self.score.copy()
+
+    # ------------------------------------------------------------------
+    # 与 engine.AzulEngine 互相转换
+
+    @classmethod
+    def from_engines(cls, engines: Sequence[AzulEngine], seed: Optional[int] = None) -> "BatchSimulator":
+        sim = cls(len(engines), seed)
+        for i, engine in enumerate(engines):
+            sim.bag[i] = engine.bag
+            sim.discard[i] = engine.discard
+            sim.disks[i] = engine.disks
+            sim.center[i] = engine.center
+            for player, board in enumerate(engine.players):
+                sim.prep_colors[i, player] = board.prep_colors
+                sim.prep_counts[i, player] = board.prep_counts
+                sim.wall[i, player] = [bool(board.wall >> cell & 1) for cell in range(NUM_ROWS * NUM_COLORS)]
+                sim.floor[i, player, :len(board.floor)] = board.floor
+                sim.score[i, player] = board.score
+            sim.first_token_in_center[i] = engine.first_token_in_center
+            sim.next_first_player[i] = engine.next_first_player
+            sim.current_player[i] = engine.current_player
+            sim.round_count[i] = engine.round_count
+            sim.game_over[i] = engine.game_over
+        return sim
+
+    def to_engine(self, i: int) -> AzulEngine:
+        engine = AzulEngine()
+        engine.bag = self.bag[i].tolist()
+        engine.discard = self.discard[i].tolist()
+        engine.disks = self.disks[i].tolist()
+        engine.center = self.center[i].tolist()
+        engine.tiles_on_table = int(self.disks[i].sum() + self.center[i].sum())
+        for player, board in enumerate(engine.players):
+            board.prep_colors = self.prep_colors[i, player].tolist()
+            board.prep_counts = self.prep_counts[i, player].tolist()
+            board.wall = sum(1 << cell for cell in np.flatnonzero(self.wall[i, player]).tolist())
+            board.floor = [tile for tile in self.floor[i, player].tolist() if tile != EMPTY]
+            board.score = int(self.score[i, player])
+            board.refresh_allowed()
+        engine.first_token_in_center = bool(self.first_token_in_center[i])
+        engine.first_player_decided = not engine.first_token_in_center
+        engine.next_first_player = int(self.next_first_player[i])
+        engine.current_player = int(self.current_player[i])
+        engine.round_count = int(self.round_count[i])
+        engine.game_over = bool(self.game_over[i])
+        engine.rehash()
+        return engine
+
+
+def move_arrays(moves: List) -> tuple:
+    """把每局一个的 moves.Move 转换成 step() 使用的三个数组"""
+    source = np.array([NUM_DISKS if move.source == CENTER else move.source for move in moves])
+    color = np.array([move.color for move in moves])
+    target = np.array([move.target for move in moves])
+    return source, color, target
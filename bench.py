@@ -0,0 +1,296 @@
+"""
+性能基准
+
+每个用例使用固定的种子准备数据，重复计时若干次，记录每次操作的最短和中位时间（纳秒）。
+结果写入 JSON；--compare 与保存的基准比较，最短时间（受干扰最小）变慢超过阈值的用例标记为退化，
+此时退出码为 1。界面用例在 SDL 的 dummy 视频驱动下运行，不需要窗口。
+
+用法：
+    python bench.py --out baseline.json
+    python bench.py --compare baseline.json --threshold 0.15
+    python bench.py draw_full hit_test --repeat 9
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from bots import RandomPlayer
+from engine import AzulEngine, MAX_ROUNDS, NUM_COLORS, NUM_ROWS
+
+# 用例名 -> 准备函数。准备函数接收种子，返回 (执行一次的函数, 每次执行包含的操作数)
+CASES: Dict[str, Callable[[int], Tuple[Callable[[], None], int]]] = {}
+
+
+def case(function):
+    CASES[function.__name__] = function
+    return function
+
+
+def random_walls(rng: random.Random, count: int) -> List[Tuple[int, int, int]]:
+    """随机的结算区状态和一个空格子：(掩码, 行, 列)"""
+    walls = []
+    while len(walls) < count:
+        mask = 0
+        for cell in range(25):
+            if rng.random() < rng.random():
+                mask |= 1 << cell
+        cell = rng.randrange(25)
+        if not mask >> cell & 1:
+            walls.append((mask, cell // 5, cell % 5))
+    return walls
+
+
+@case
+def line_scores(seed: int):
+    """PlayerBoard.calculate_line_scores 和 calculate_piece_score"""
+    from game import PlayerBoard
+    board = PlayerBoard(50, 50, "Player 1")
+    walls = random_walls(random.Random(seed), 2000)
+
+    def run():
+        for mask, row, col in walls:
+            board.wall_mask = mask
+            board.calculate_line_scores(row, [(None, col)])
+            board.calculate_piece_score(row, col)
+    return run, len(walls)
+
+
+@case
+def board_place(seed: int):
+    """界面 PlayerBoard.can_place_pieces 和 place_pieces"""
+    from game import COLORS, PlayerBoard, Piece
+    rng = random.Random(seed)
+    board = PlayerBoard(50, 50, "Player 1")
+    requests = [(rng.randrange(NUM_ROWS), COLORS[rng.randrange(NUM_COLORS)], rng.randint(1, 4))
+                for _ in range(2000)]
+    pieces = {color: [Piece(color) for _ in range(4)] for color in COLORS}
+
+    def run():
+        for i, (row, color, count) in enumerate(requests):
+            if i % 50 == 0:
+                board.prep_area = [[None] * (r + 1) for r in range(NUM_ROWS)]
+            if board.can_place_pieces(row, color):
+                board.place_pieces(pieces[color][:count], row)
+    return run, len(requests)
+
+
+@case
+def state_place(seed: int):
+    """引擎 PlayerState.can_place_pieces 和 place_pieces"""
+    from engine import PlayerState
+    rng = random.Random(seed)
+    requests = [(rng.randrange(NUM_ROWS), rng.randrange(NUM_COLORS), rng.randint(1, 4)) for _ in range(2000)]
+    walls = [mask for mask, _, _ in random_walls(rng, 40)]
+
+    def run():
+        board = PlayerState("Player 1")
+        for i, (row, color, count) in enumerate(requests):
+            if i % 50 == 0:
+                board = PlayerState("Player 1")
+                board.wall = walls[i // 50]
+                board.refresh_allowed()
+            if board.can_place_pieces(row, color):
+                board.place_pieces(row, color, count)
+    return run, len(requests)
+
+
+@case
+def deal(seed: int):
+    """AzulEngine.start_new_round 发牌（包括棋子池用完后倒回废棋堆）"""
+    engine = AzulEngine(seed)
+    rounds = 500
+
+    def run():
+        engine.rng.seed(seed)
+        engine.bag = [20] * NUM_COLORS
+        engine.discard = [0] * NUM_COLORS
+        for _ in range(rounds):
+            # 每回合的棋子全部放回废棋堆，棋子池每5回合用完一次
+            for disk in engine.disks:
+                for color in range(NUM_COLORS):
+                    engine.discard[color] += disk[color]
+                    disk[color] = 0
+            engine.tiles_on_table = 0
+            engine.start_new_round()
+    return run, rounds
+
+
+@case
+def playout(seed: int):
+    """完整的无界面随机对局"""
+    games = 20
+
+    def run():
+        for i in range(games):
+            engine = AzulEngine(seed + i)
+            players = [RandomPlayer(seed + i), RandomPlayer(seed + i + 1)]
+            engine.start_new_round()
+            while not engine.game_over and engine.round_count <= MAX_ROUNDS:
+                while not engine.is_round_over():
+                    move = players[engine.current_player].choose_move(engine)
+                    engine.play(move.source, move.color, move.target)
+                engine.finish_round()
+    return run, games
+
+
+def started_game(seed: int):
+    """开始游戏并随机走几步，得到一个有代表性的界面状态"""
+    from game import Game
+    game = Game(instant=True)
+    game.engine = AzulEngine(seed)
+    game.handle_click(game.game_button.rect.center)
+    players = [RandomPlayer(seed), RandomPlayer(seed + 1)]
+    for _ in range(6):
+        move = players[game.engine.current_player].choose_move(game.engine)
+        game.play_move(move.source, move.color, move.target)
+    game.draw()
+    return game
+
+
+@case
+def draw_full(seed: int):
+    """Game.draw 整屏重绘"""
+    game = started_game(seed)
+    frames = 50
+
+    def run():
+        for _ in range(frames):
+            game.renderer.invalidate()
+            game.draw()
+    return run, frames
+
+
+@case
+def draw_idle(seed: int):
+    """Game.draw 没有变化时（只比较各区域的状态）"""
+    game = started_game(seed)
+    frames = 1000
+
+    def run():
+        for _ in range(frames):
+            game.draw()
+    return run, frames
+
+
+@case
+def hit_test(seed: int):
+    """点击检测：屏幕上的随机位置"""
+    from game import WINDOW_HEIGHT, WINDOW_WIDTH
+    game = started_game(seed)
+    rng = random.Random(seed)
+    points = [(rng.randrange(WINDOW_WIDTH), rng.randrange(WINDOW_HEIGHT)) for _ in range(5000)]
+
+    def run():
+        for point in points:
+            game.hit_test(point)
+    return run, len(points)
+
+
+@case
+def handle_click(seed: int):
+    """handle_click：轮流点击圆盘和待定区的棋子（只选择，不走棋）"""
+    from game import PIECE_SIZE
+    game = started_game(seed)
+    targets = []
+    for i, disk in enumerate(game.disks):
+        x, y = game.disk_position(i)
+        targets.extend((x + (j % 2) * PIECE_SIZE + 5, y + (j // 2) * PIECE_SIZE + 5) for j in range(len(disk)))
+    targets.extend((955, 100 + j * PIECE_SIZE + 5) for j in range(len(game.waiting_area)))
+    targets = (targets or [(0, 0)]) * (2000 // max(len(targets), 1) + 1)
+
+    def run():
+        for point in targets:
+            game.handle_click(point)
+    return run, len(targets)
+
+
+def measure(name: str, seed: int, repeat: int) -> dict:
+    """运行一个用例，返回每次操作的耗时（纳秒）"""
+    run, ops = CASES[name](seed)
+    run()   # 预热（字体、贴图缓存等）
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        run()
+        times.append((time.perf_counter_ns() - started) / ops)
+    return {"best_ns": round(min(times), 1), "median_ns": round(statistics.median(times), 1),
+            "ops": ops, "repeat": repeat}
+
+
+def environment() -> dict:
+    info = {"python": platform.python_version(), "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    try:
+        info["commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                        text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        pass
+    return info
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """返回 (报告行, 退化的用例)。比较最短时间"""
+    lines = [f"{'Case':<14}{'Baseline':>12}{'Current':>12}{'Change':>9}"]
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            lines.append(f"{name:<14}{'-':>12}{result['best_ns']:>12.0f}{'new':>9}")
+            continue
+        ratio = result["best_ns"] / base["best_ns"] - 1
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif ratio < -threshold:
+            flag = "  faster"
+        lines.append(f"{name:<14}{base['best_ns']:>12.0f}{result['best_ns']:>12.0f}{100 * ratio:>+8.1f}%{flag}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能基准")
+    parser.add_argument("cases", nargs="*", help=f"要运行的用例（默认全部）：{', '.join(CASES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="每个用例计时的次数")
+    parser.add_argument("--out", help="把结果写入 JSON 文件")
+    parser.add_argument("--compare", metavar="BASELINE", help="与保存的基准比较")
+    parser.add_argument("--threshold", type=float, default=0.10, help="最短时间变慢超过这个比例视为退化")
+    args = parser.parse_args()
+    names = args.cases or list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+
+    current = {"environment": environment(), "seed": args.seed, "results": {}}
+    for name in names:
+        result = measure(name, args.seed, args.repeat)
+        current["results"][name] = result
+        print(f"{name:<14}{result['median_ns'] / 1000:>10.2f}us/op (best {result['best_ns'] / 1000:.2f}us)",
+              flush=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressions = compare(baseline, current, args.threshold)
+        print("\n" + "\n".join(lines))
+        if regressions:
+            print(f"\nRegressions beyond {100 * args.threshold:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
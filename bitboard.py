@@ -0,0 +1,154 @@
+"""
+结算区的位棋盘表示
+
+结算区是5x5的格子，用一个25位整数保存：第 row 行第 col 列对应第 row*5+col 位。
+整行、整列、同色五格是否放满都只需要一次掩码比较，
+放入棋子的得分通过预先计算的查找表得到，游戏结束的奖励分只需要几次移位、与运算和 popcount。
+"""
+from typing import List
+
+WALL_SIZE = 5
+FULL_WALL = (1 << WALL_SIZE * WALL_SIZE) - 1
+LINE_FULL = (1 << WALL_SIZE) - 1
+
+# 每一行、每一列的掩码
+ROW_MASKS = [LINE_FULL << (row * WALL_SIZE) for row in range(WALL_SIZE)]
+COLUMN_0 = sum(1 << (row * WALL_SIZE) for row in range(WALL_SIZE))   # 0x108421
+COL_MASKS = [COLUMN_0 << col for col in range(WALL_SIZE)]
+
+# 每种颜色的五个格子（颜色在第 row 行位于第 (row + color) % 5 列）
+COLOR_MASKS = [
+    sum(1 << (row * WALL_SIZE + (row + color) % WALL_SIZE) for row in range(WALL_SIZE))
+    for color in range(WALL_SIZE)
+]
+
+# 把某一列的五个位收拢到低5位的乘数：第 r 行的位落到第 16 + r 位
+_GATHER_MULTIPLIER = 0x11111
+_GATHER_SHIFT = 16
+
+POPCOUNT5 = [bin(bits).count("1") for bits in range(1 << WALL_SIZE)]
+
+# ROW_COLORS[row][行的5位] -> 该行已经放入结算区的颜色集合（第 color 位）
+ROW_COLORS = [
+    [sum(1 << (col - row) % WALL_SIZE for col in range(WALL_SIZE) if bits >> col & 1)
+     for bits in range(1 << WALL_SIZE)]
+    for row in range(WALL_SIZE)
+]
+
+
+def cell_bit(row: int, col: int) -> int:
+    """结算区某个位置对应的位"""
+    return 1 << (row * WALL_SIZE + col)
+
+
+def row_bits(mask: int, row: int) -> int:
+    """取出某一行的5位（第 col 位对应第 col 列）"""
+    return (mask >> (row * WALL_SIZE)) & LINE_FULL
+
+
+def column_bits(mask: int, col: int) -> int:
+    """取出某一列的5位（第 row 位对应第 row 行）"""
+    return ((((mask >> col) & COLUMN_0) * _GATHER_MULTIPLIER) >> _GATHER_SHIFT) & LINE_FULL
+
+
+def popcount(mask: int) -> int:
+    """统计结算区中的棋子数"""
+    return bin(mask).count("1")
+
+
+def _line_count_score(bits: int) -> int:
+    """与 PlayerBoard.calculate_line_scores 一致：一行（列）中棋子数≥2时得到该数"""
+    count = POPCOUNT5[bits]
+    return count if count >= 2 else 0
+
+
+def _run_length(bits: int, pos: int) -> int:
+    """包含 pos 的连续棋子长度"""
+    if not bits >> pos & 1:
+        return 0
+    start = pos
+    while start > 0 and bits >> (start - 1) & 1:
+        start -= 1
+    end = pos
+    while end < WALL_SIZE - 1 and bits >> (end + 1) & 1:
+        end += 1
+    return end - start + 1
+
+
+def _build_placement_table(line_score) -> List[int]:
+    """以 (行的5位 << 5 | 列的5位) 为下标的得分表，没有形成连线时得1分"""
+    table = []
+    for horizontal in range(1 << WALL_SIZE):
+        for vertical in range(1 << WALL_SIZE):
+            score = line_score(horizontal) + line_score(vertical)
+            table.append(score or 1)
+    return table
+
+
+# 放入棋子后，按整行/整列棋子数计分（游戏实际使用的规则）
+PLACEMENT_SCORE = _build_placement_table(_line_count_score)
+
+# 按相邻连续棋子计分：RUN_LENGTH[行或列的5位][位置]
+RUN_LENGTH = [[_run_length(bits, pos) for pos in range(WALL_SIZE)] for bits in range(1 << WALL_SIZE)]
+
+
+def placement_score(mask: int, row: int, col: int) -> int:
+    """放入 (row, col) 后的得分，mask 为已经包含该棋子的结算区"""
+    return PLACEMENT_SCORE[row_bits(mask, row) << WALL_SIZE | column_bits(mask, col)]
+
+
+def adjacency_score(mask: int, row: int, col: int) -> int:
+    """按相邻连续棋子计算 (row, col) 的得分（与 PlayerBoard.calculate_piece_score 一致）"""
+    if not mask & cell_bit(row, col):
+        return 0
+    horizontal = RUN_LENGTH[row_bits(mask, row)][col]
+    vertical = RUN_LENGTH[column_bits(mask, col)][row]
+    score = (horizontal if horizontal >= 2 else 0) + (vertical if vertical >= 2 else 0)
+    return score or 1
+
+
+def is_row_full(mask: int, row: int) -> bool:
+    return mask & ROW_MASKS[row] == ROW_MASKS[row]
+
+
+def is_column_full(mask: int, col: int) -> bool:
+    return mask & COL_MASKS[col] == COL_MASKS[col]
+
+
+def is_color_complete(mask: int, color: int) -> bool:
+    return mask & COLOR_MASKS[color] == COLOR_MASKS[color]
+
+
+def has_complete_row(mask: int) -> bool:
+    """是否有放满的一行：把每行的五位与到该行的最低位上再检查"""
+    folded = mask & (mask >> 1) & (mask >> 2) & (mask >> 3) & (mask >> 4)
+    return bool(folded & COLUMN_0)
+
+
+# 游戏结束时的奖励分：每个完整的行、完整的列、集齐五个的颜色
+ROW_BONUS = 2
+COLUMN_BONUS = 7
+COLOR_BONUS = 10
+
+
+def complete_rows(mask: int) -> int:
+    """放满的行数：每行的五位与到该行的最低位上再统计"""
+    folded = mask & (mask >> 1) & (mask >> 2) & (mask >> 3) & (mask >> 4)
+    return popcount(folded & COLUMN_0)
+
+
+def complete_columns(mask: int) -> int:
+    """放满的列数：五行与到第一行上再统计"""
+    folded = mask & (mask >> 5) & (mask >> 10) & (mask >> 15) & (mask >> 20)
+    return popcount(folded & LINE_FULL)
+
+
+def complete_colors(mask: int) -> int:
+    """五个格子都放满的颜色数"""
+    return sum(mask & color_mask == color_mask for color_mask in COLOR_MASKS)
+
+
+def bonus_score(mask: int) -> int:
+    """游戏结束时的奖励分合计"""
+    return (complete_rows(mask) * ROW_BONUS + complete_columns(mask) * COLUMN_BONUS
+            + complete_colors(mask) * COLOR_BONUS)
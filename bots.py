@@ -0,0 +1,103 @@
+"""
+电脑玩家注册表
+
+所有电脑玩家都有 choose_move(engine) -> Move 和 close() 两个方法。
+make_bot 根据字符串描述创建玩家，例如：
+
+    random
+    greedy
+    mcts:time=0.5,workers=4
+    alphabeta:depth=4
+    alphabeta:time=1.0
+    pipe:python mybot.py --level 3    外部进程，通过管道协议通信（见 pipebot.py）
+
+内置电脑玩家都可以加上 endgame=N：桌面剩余棋子不超过 N 颗时改用精确求解（见 endgame.py），
+例如 mcts:time=0.5,endgame=12。
+"""
+import random
+from typing import Dict, Optional
+
+from alphabeta import AlphaBetaPlayer, evaluate
+from endgame import EndgamePlayer
+from engine import AzulEngine
+from mcts import MCTSPlayer, rollout_move
+from moves import Move, generate_moves
+from pipebot import PipeBot
+
+
+class RandomPlayer:
+    """随机玩家：尽量选择不会溢出的走法（与MCTS的模拟策略相同）"""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+
+    def choose_move(self, engine: AzulEngine) -> Move:
+        return rollout_move(engine, self.rng)
+
+    def close(self):
+        pass
+
+
+class GreedyPlayer:
+    """贪心玩家：选择立即结算后分差最大的走法"""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+
+    def choose_move(self, engine: AzulEngine) -> Move:
+        player = engine.current_player
+        best_moves = []
+        best_value = None
+        for move in generate_moves(engine):
+            child = engine.copy()
+            child._play(move.source, move.color, move.target)
+            value = evaluate(child) if child.current_player == player else -evaluate(child)
+            if best_value is None or value > best_value:
+                best_moves, best_value = [move], value
+            elif value == best_value:
+                best_moves.append(move)
+        return self.rng.choice(best_moves)
+
+    def close(self):
+        pass
+
+
+def _parse_options(text: str) -> Dict[str, str]:
+    options = {}
+    for item in filter(None, text.split(",")):
+        name, _, value = item.partition("=")
+        options[name.strip()] = value.strip()
+    return options
+
+
+def make_bot(spec: str, seed: Optional[int] = None):
+    """根据描述字符串创建电脑玩家"""
+    kind, _, option_text = spec.partition(":")
+    if kind == "pipe":
+        return PipeBot(option_text)
+    options = _parse_options(option_text)
+    bot = _make_builtin(kind, options, seed)
+    if "endgame" in options:
+        return EndgamePlayer(bot, int(options["endgame"]))
+    return bot
+
+
+def _make_builtin(kind: str, options: Dict[str, str], seed: Optional[int]):
+    if kind == "random":
+        return RandomPlayer(seed)
+    if kind == "greedy":
+        return GreedyPlayer(seed)
+    if kind == "mcts":
+        time_limit = float(options["time"]) if "time" in options else None
+        playouts = int(options["playouts"]) if "playouts" in options else None
+        if time_limit is None and playouts is None:
+            time_limit = 1.0
+        return MCTSPlayer(time_limit=time_limit, playouts=playouts,
+                          workers=int(options.get("workers", 1)),
+                          exploration=float(options.get("c", 1.4)), seed=seed)
+    if kind == "alphabeta":
+        time_limit = float(options["time"]) if "time" in options else None
+        # 不限时的时候默认只搜3层，避免回合开始时搜索整个回合
+        default_depth = 64 if time_limit is not None else 3
+        return AlphaBetaPlayer(time_limit=time_limit, max_depth=int(options.get("depth", default_depth)))
+    raise ValueError(f"Unknown bot: {kind}")
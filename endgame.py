@@ -0,0 +1,341 @@
+"""
+回合末的精确求解
+
+回合快结束时桌面上只剩几个圆盘和待定区的少量棋子，可以搜索到回合结束的所有走法序列，
+得到每一步走法的精确分差。回合结算用引擎的 PlayerState.score_row 和 apply_penalties，
+与真实对局相同；这一回合结束游戏时还包括双方的奖励分。
+
+分差只计算从当前局面到回合结算为止双方各自增加的分数，与已有的分数无关，
+所以子局面可以按下面的状态记忆化，同一回合内不同走法顺序到达的局面只求解一次：
+
+    桌面：非空圆盘内容的多重集（排序后的元组，圆盘的序号不影响结果）、待定区、
+          先手棋子是否还在待定区
+    行动方和对手的棋盘：准备区每行的颜色和数量、结算区掩码、扣分区的棋子数
+
+搜索内部直接用这些元组表示局面（不复制引擎），走法规则与 AzulEngine.play 一致；
+状态以行动方为准，两个座位互换的局面也共用结果，内容相同的圆盘只搜索其中一个。
+在此基础上用 alpha-beta 剪枝（主要变例搜索），记忆化表保存每个子局面的上下界和最佳走法，
+再次访问时先试上次的最佳走法。
+
+用法：
+    python endgame.py --seed 3 --tiles 16             随机走到第一回合桌面剩 16 颗棋子后求解
+    python endgame.py --seed 3 --tiles 12 --compare   同时用朴素穷举验证并计时
+"""
+import argparse
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bitboard import ROW_COLORS, bonus_score, has_complete_row, row_bits
+from engine import (ALL_COLORS, AzulEngine, CENTER, EMPTY, FIRST_TOKEN, FLOOR, FLOOR_SIZE, NUM_COLORS, NUM_ROWS,
+                    PlayerState)
+from moves import Move, generate_moves
+
+# EndgamePlayer 默认在桌面剩余棋子不超过这个数时使用精确求解
+ENDGAME_TILES = 12
+# 记忆化表超过这个大小时清空
+MAX_MEMO = 2_000_000
+INF = 10 ** 6
+
+# 棋盘：(准备区每行的颜色, 准备区每行的数量, 结算区掩码, 扣分区棋子数)
+Board = Tuple[Tuple[int, ...], Tuple[int, ...], int, int]
+# 求解器内部的走法：(来源, 颜色, 目标, 数量, 溢出数)，来源是排序后圆盘元组的下标或 CENTER
+CompactMove = Tuple[int, int, int, int, int]
+
+
+def board_state(board: PlayerState) -> Board:
+    """影响本回合剩余得分的棋盘状态"""
+    return tuple(board.prep_colors), tuple(board.prep_counts), board.wall, len(board.floor)
+
+
+def table_state(engine: AzulEngine) -> tuple:
+    """(圆盘多重集, 待定区, 先手棋子是否在待定区)"""
+    disks = tuple(sorted(tuple(disk) for disk in engine.disks if any(disk)))
+    return disks, tuple(engine.center), engine.first_token_in_center
+
+
+class EndgameSolver:
+    """精确求解到回合结束的分差"""
+
+    def __init__(self):
+        # 子局面 -> (下界, 上界, 最佳走法)，剪枝后可能只知道一侧的界
+        self.memo: Dict[tuple, Tuple[int, int, Optional[tuple]]] = {}
+        self.gains: Dict[tuple, Tuple[int, int]] = {}   # 结算区、扣分区和填满的行 -> 回合结算的结果
+        self.scratch = PlayerState("")          # 结算用的空白棋盘
+        self.targets: Dict[Board, list] = {}    # 棋盘 -> 每种颜色可以放入的 (行, 空格数)
+        self.nodes = 0
+
+    def clear(self):
+        self.memo.clear()
+        self.gains.clear()
+        self.targets.clear()
+
+    def round_gain(self, board: Board) -> Tuple[int, int]:
+        """用引擎的结算规则在临时棋盘上结算准备区和扣分区，返回 (得分, 结算后的结算区)"""
+        colors, counts, wall, floor = board
+        # 只有填满的行和扣分区的棋子数影响结算
+        key = (wall, floor) + tuple(color if count == row + 1 else EMPTY
+                                    for row, (color, count) in enumerate(zip(colors, counts)))
+        gain = self.gains.get(key)
+        if gain is None:
+            scored = self.scratch.copy()
+            scored.prep_colors = list(colors)
+            scored.prep_counts = list(counts)
+            scored.wall = wall
+            # 扣分只与棋子数有关
+            scored.floor = [FIRST_TOKEN] * floor
+            for row in range(NUM_ROWS):
+                scored.score_row(row)
+            scored.apply_penalties()
+            gain = self.gains[key] = scored.score, scored.wall
+        return gain
+
+    def leaf_value(self, board: Board, other: Board) -> int:
+        """回合结算的分差；有人放满一行时游戏结束，再加上双方的奖励分"""
+        gain, wall = self.round_gain(board)
+        other_gain, other_wall = self.round_gain(other)
+        value = gain - other_gain
+        if has_complete_row(wall) or has_complete_row(other_wall):
+            value += bonus_score(wall) - bonus_score(other_wall)
+        return value
+
+    def board_targets(self, board: Board) -> list:
+        """与 PlayerState.allowed 相同的规则，已满的行不列出（等同于放入扣分区）"""
+        targets = self.targets.get(board)
+        if targets is None:
+            colors, counts, wall, _ = board
+            targets = [[] for _ in range(NUM_COLORS)]
+            for row in range(NUM_ROWS):
+                count = counts[row]
+                if count == row + 1:
+                    continue
+                if count:
+                    targets[colors[row]].append((row, row + 1 - count))
+                    continue
+                allowed = ALL_COLORS & ~ROW_COLORS[row][row_bits(wall, row)]
+                for color in range(NUM_COLORS):
+                    if allowed >> color & 1:
+                        targets[color].append((row, row + 1))
+            self.targets[board] = targets
+        return targets
+
+    def compact_moves(self, disks: tuple, center: tuple, board: Board,
+                      best: Optional[tuple]) -> List[CompactMove]:
+        """子局面的走法：记忆化的最佳走法最先，然后是不溢出的走法，放入扣分区的走法最后"""
+        targets = self.board_targets(board)
+        sources = [(index, disk) for index, disk in enumerate(disks) if index == 0 or disk != disks[index - 1]]
+        sources.append((CENTER, center))
+        exact, overflowing, floor = [], [], []
+        for source, counts in sources:
+            for color in range(NUM_COLORS):
+                count = counts[color]
+                if not count:
+                    continue
+                for row, free in targets[color]:
+                    if count > free:
+                        overflowing.append((source, color, row, count, count - free))
+                    else:
+                        exact.append((source, color, row, count, 0))
+                floor.append((source, color, FLOOR, count, count))
+        moves = exact + overflowing + floor
+        if best is not None:
+            for index, move in enumerate(moves):
+                if move[:3] == best:
+                    moves[0], moves[index] = move, moves[0]
+                    break
+        return moves
+
+    @staticmethod
+    def apply(disks: tuple, center: tuple, token: bool, board: Board, move: CompactMove):
+        """与 AzulEngine.play 相同的规则，返回新的 (圆盘, 待定区, 先手棋子, 行动方棋盘)"""
+        source, color, target, count, overflow = move
+        if source == CENTER:
+            center = center[:color] + (0,) + center[color + 1:]
+        else:
+            # 剩余棋子移到待定区
+            disk = disks[source]
+            center = tuple(c + (d if i != color else 0) for i, (c, d) in enumerate(zip(center, disk)))
+            disks = disks[:source] + disks[source + 1:]
+        colors, counts, wall, floor = board
+        if target != FLOOR:
+            colors = colors[:target] + (color,) + colors[target + 1:]
+            counts = counts[:target] + (counts[target] + count - overflow,) + counts[target + 1:]
+        floor += overflow
+        if source == CENTER and token:
+            token = False
+            floor += 1
+        # 扣分区放不下的棋子进入废棋堆
+        return disks, center, token, (colors, counts, wall, min(floor, FLOOR_SIZE))
+
+    def value(self, disks: tuple, center: tuple, token: bool, board: Board, other: Board,
+              alpha: int = -INF, beta: int = INF) -> int:
+        """行动方视角的精确分差（只计本回合剩余部分的得分）。
+
+        alpha-beta 剪枝：结果不在 (alpha, beta) 之内时只保证是正确方向的界。
+        """
+        self.nodes += 1
+        key = (disks, center, token, board, other)
+        entry = self.memo.get(key)
+        best_key = None
+        if entry is not None:
+            lower, upper, best_key = entry
+            if lower >= beta or lower == upper:
+                return lower
+            if upper <= alpha:
+                return upper
+            alpha = max(alpha, lower)
+            beta = min(beta, upper)
+        alpha_orig = alpha
+
+        leaf_value = self.leaf_value
+        best, best_move = -INF, None
+        for move in self.compact_moves(disks, center, board, best_key):
+            child_disks, child_center, child_token, child_board = self.apply(disks, center, token, board, move)
+            if child_disks or any(child_center):
+                if best_move is None:
+                    value = -self.value(child_disks, child_center, child_token, other, child_board, -beta, -alpha)
+                else:
+                    # 主要变例搜索：先用零窗口验证后面的走法不比当前最好的走法好
+                    value = -self.value(child_disks, child_center, child_token, other, child_board,
+                                        -alpha - 1, -alpha)
+                    if alpha < value < beta:
+                        value = -self.value(child_disks, child_center, child_token, other, child_board,
+                                            -beta, -value)
+            else:
+                # 回合结束
+                value = leaf_value(child_board, other)
+            if value > best:
+                best, best_move = value, move
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+        lower, upper = (entry[0], entry[1]) if entry is not None else (-INF, INF)
+        if best <= alpha_orig:
+            upper = best
+        elif best >= beta:
+            lower = best
+        else:
+            lower = upper = best
+        self.memo[key] = (lower, upper, best_move[:3])
+        return best
+
+    def position_value(self, engine: AzulEngine, alpha: int = -INF, beta: int = INF) -> int:
+        """引擎局面的分差（当前玩家视角）"""
+        player = engine.current_player
+        board = board_state(engine.players[player])
+        other = board_state(engine.players[1 - player])
+        if engine.is_round_over():
+            return self.leaf_value(board, other)
+        return self.value(*table_state(engine), board, other, alpha, beta)
+
+    def move_value(self, engine: AzulEngine, move: Move, alpha: int = -INF, beta: int = INF) -> int:
+        """在引擎上走出 move 后，走棋一方视角的分差"""
+        child = engine.copy()
+        child._play(move.source, move.color, move.target)
+        # 回合结束时不换行动方
+        if child.current_player == engine.current_player:
+            return self.position_value(child, alpha, beta)
+        return -self.position_value(child, -beta, -alpha)
+
+    def move_values(self, engine: AzulEngine) -> List[Tuple[Move, int]]:
+        """每一步合法走法的精确分差，可用于评判其它电脑玩家的走法"""
+        return [(move, self.move_value(engine, move)) for move in generate_moves(engine)]
+
+    def solve(self, engine: AzulEngine) -> Tuple[Optional[Move], int]:
+        """返回 (最佳走法, 精确分差)"""
+        if len(self.memo) > MAX_MEMO:
+            self.clear()
+        if engine.is_round_over():
+            return None, self.position_value(engine)
+        moves = generate_moves(engine)
+        moves.sort(key=lambda move: (move.target == FLOOR, move.overflow))
+        best_move, best_value = None, -INF
+        for move in moves:
+            value = self.move_value(engine, move, best_value, INF)
+            if value > best_value:
+                best_move, best_value = move, value
+        return best_move, best_value
+
+
+class EndgamePlayer:
+    """桌面剩余棋子不多时使用精确求解，其余时候交给另一个电脑玩家
+
+    参数:
+        fallback: 回合前半段使用的电脑玩家
+        max_tiles (int): 桌面剩余棋子数不超过它时使用精确求解
+    """
+
+    def __init__(self, fallback, max_tiles: int = ENDGAME_TILES):
+        self.fallback = fallback
+        self.max_tiles = max_tiles
+        # 状态包含了所有影响结果的部分，记忆化表跨回合也有效
+        self.solver = EndgameSolver()
+        self.last_value: Optional[int] = None
+
+    def choose_move(self, engine: AzulEngine) -> Move:
+        if engine.tiles_on_table > self.max_tiles:
+            self.last_value = None
+            return self.fallback.choose_move(engine)
+        move, self.last_value = self.solver.solve(engine)
+        return move
+
+    def close(self):
+        self.solver.clear()
+        self.fallback.close()
+
+
+def enumerate_value(engine: AzulEngine) -> int:
+    """朴素穷举：在引擎副本上走完所有走法序列，不记忆化也不剪枝（用于验证求解结果）"""
+    player = engine.current_player
+    if engine.is_round_over():
+        scored = engine.copy()
+        scored.score_round()
+        return ((scored.players[player].score - engine.players[player].score)
+                - (scored.players[1 - player].score - engine.players[1 - player].score))
+    best = -INF
+    for move in generate_moves(engine):
+        child = engine.copy()
+        child._play(move.source, move.color, move.target)
+        value = enumerate_value(child)
+        best = max(best, value if child.current_player == player else -value)
+    return best
+
+
+def random_position(seed: int, tiles: int) -> AzulEngine:
+    """随机走到第一回合桌面剩余不超过 tiles 颗棋子的局面"""
+    rng = random.Random(seed)
+    engine = AzulEngine(seed)
+    engine.start_new_round()
+    while engine.tiles_on_table > tiles:
+        moves = generate_moves(engine)
+        good = [move for move in moves if not move.overflow]
+        move = rng.choice(good or moves)
+        engine.play(move.source, move.color, move.target)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回合末的精确求解")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tiles", type=int, default=ENDGAME_TILES, help="随机走到桌面剩余多少颗棋子")
+    parser.add_argument("--compare", action="store_true", help="同时用朴素穷举求解并比较（可能需要几分钟）")
+    args = parser.parse_args()
+
+    engine = random_position(args.seed, args.tiles)
+    print(f"Round {engine.round_count}, {engine.tiles_on_table} tiles left, "
+          f"{engine.players[engine.current_player].name} to move")
+    started = time.perf_counter()
+    solver = EndgameSolver()
+    move, value = solver.solve(engine)
+    print(f"memoized {time.perf_counter() - started:8.3f}s {solver.nodes:>10} nodes  "
+          f"best move {move.source} {move.color} -> {move.target}, differential {value:+d}")
+    if args.compare:
+        started = time.perf_counter()
+        plain = enumerate_value(engine)
+        print(f"plain    {time.perf_counter() - started:8.3f}s  differential {plain:+d}")
+        if plain != value:
+            raise SystemExit("Memoized and plain results differ")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+"""
+无界面的花砖物语规则引擎
+
+不依赖pygame，负责发牌、取棋子、放置、扣分区溢出、先手棋子和回合结算。
+game.py 中的界面只是这个引擎的一个客户端，模拟和AI可以直接使用它。
+
+状态只保存每种颜色的数量（棋子池、废棋堆、每个圆盘、待定区）和几个小整数列表
+（准备区、扣分区），结算区是一个整数掩码。对象都使用 __slots__，
+copy() 只复制这些小列表，足够在搜索树中频繁复制。
+"""
+import random
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from bitboard import (COLOR_BONUS, COLUMN_BONUS, ROW_BONUS, ROW_COLORS, bonus_score, cell_bit, complete_colors,
+                      complete_columns, complete_rows, has_complete_row, placement_score, row_bits)
+from zobrist import (CENTER_KEYS, DISK_KEYS, FLOOR_KEYS, PREP_KEYS, SCORE_KEYS, SCORE_MASK, SIDE_KEY,
+                     TOKEN_CENTER_KEY, TOKEN_HELD_KEYS, WALL_KEYS)
+
+# 颜色编号，顺序与 game.py 中的 [BLUE, YELLOW, RED, BLACK, WHITE] 一致
+NUM_COLORS = 5
+COLOR_NAMES = ["Blue", "Yellow", "Red", "Black", "White"]
+
+# 游戏配置
+TILES_PER_COLOR = 20
+NUM_DISKS = 5
+TILES_PER_DISK = 4
+NUM_ROWS = 5
+FLOOR_SIZE = 7
+PENALTY_VALUES = (-1, -1, -2, -2, -2, -3, -3)
+# 对局最多进行的回合数：电脑玩家一直不完成整行时对局不会结束，到达上限按平局处理
+MAX_ROUNDS = 50
+
+CENTER = -1                 # 取棋子来源：待定区
+FLOOR = NUM_ROWS            # 放置目标：扣分区
+FIRST_TOKEN = NUM_COLORS    # 扣分区中的先手棋子
+EMPTY = -1
+ALL_COLORS = (1 << NUM_COLORS) - 1
+
+# 结算事件类型
+WALL_EVENT = "wall"
+PENALTY_EVENT = "penalty"
+BONUS_EVENT = "bonus"
+
+
+def wall_column(row: int, color: int) -> int:
+    """某颜色在结算区指定行中的列号"""
+    return (row + color) % NUM_COLORS
+
+
+def wall_color(row: int, col: int) -> int:
+    """结算区指定位置的颜色"""
+    return (col - row) % NUM_COLORS
+
+
+class ScoreEvent(NamedTuple):
+    """结算中的一步：棋子进入结算区（wall）、结算扣分区的一格（penalty）或游戏结束的奖励分（bonus）"""
+    player: int
+    kind: str
+    row: int      # penalty 事件为 FLOOR，bonus 事件为 EMPTY
+    col: int      # penalty 事件为扣分区格子序号，bonus 事件为 EMPTY
+    color: int    # penalty 事件可能是 FIRST_TOKEN，bonus 事件为 EMPTY
+    score: int
+
+
+class EndGameBonus(NamedTuple):
+    """游戏结束时的奖励：完整的行数、列数和集齐五个的颜色数"""
+    rows: int
+    columns: int
+    colors: int
+
+    @property
+    def points(self) -> Tuple[int, int, int]:
+        """每一项的奖励分"""
+        return self.rows * ROW_BONUS, self.columns * COLUMN_BONUS, self.colors * COLOR_BONUS
+
+    @property
+    def total(self) -> int:
+        return sum(self.points)
+
+
+def end_game_bonus(wall: int) -> EndGameBonus:
+    """结算区掩码对应的奖励分明细"""
+    return EndGameBonus(complete_rows(wall), complete_columns(wall), complete_colors(wall))
+
+
+class MoveResult(NamedTuple):
+    """一步操作的结果"""
+    placed: int               # 放入准备区的数量
+    overflow: int             # 进入扣分区（或扣分区已满时进入废棋堆）的数量
+    took_first_token: bool    # 是否拿到了先手棋子
+
+
+class PlayerState:
+    """单个玩家的棋盘状态：准备区、结算区、扣分区和分数"""
+    __slots__ = ("name", "seat", "prep_colors", "prep_counts", "wall", "floor", "score", "allowed", "hash")
+
+    def __init__(self, name: str, seat: int = 0):
+        self.name = name
+        self.seat = seat                        # 座位号，用于选择哈希键
+        self.prep_colors = [EMPTY] * NUM_ROWS   # 每行棋子的颜色
+        self.prep_counts = [0] * NUM_ROWS       # 每行棋子的数量
+        self.wall = 0                           # 结算区的25位掩码，见 bitboard.py
+        self.floor: List[int] = []              # 扣分区，颜色编号或 FIRST_TOKEN
+        self.score = 0
+        # 每行还能放入（且不会全部溢出）的颜色集合，随准备区和结算区增量更新
+        self.allowed = [ALL_COLORS] * NUM_ROWS
+        self.hash = 0                           # 这块棋盘的Zobrist哈希，见 zobrist.py
+        self.rehash()
+
+    def copy(self) -> "PlayerState":
+        """复制玩家状态"""
+        other = PlayerState.__new__(PlayerState)
+        other.name = self.name
+        other.seat = self.seat
+        other.prep_colors = self.prep_colors[:]
+        other.prep_counts = self.prep_counts[:]
+        other.wall = self.wall
+        other.floor = self.floor[:]
+        other.score = self.score
+        other.allowed = self.allowed[:]
+        other.hash = self.hash
+        return other
+
+    def rehash(self):
+        """直接修改状态后从头计算哈希"""
+        seat = self.seat
+        h = SCORE_KEYS[seat][self.score & SCORE_MASK]
+        for row in range(NUM_ROWS):
+            if self.prep_counts[row]:
+                h ^= PREP_KEYS[seat][row][self.prep_colors[row]][self.prep_counts[row]]
+        for cell in range(25):
+            if self.wall >> cell & 1:
+                h ^= WALL_KEYS[seat][cell]
+        for slot, tile in enumerate(self.floor):
+            h ^= FLOOR_KEYS[seat][slot][tile]
+        self.hash = h
+
+    def set_score(self, score: int):
+        """修改分数并更新哈希"""
+        keys = SCORE_KEYS[self.seat]
+        self.hash ^= keys[self.score & SCORE_MASK] ^ keys[score & SCORE_MASK]
+        self.score = score
+
+    def update_allowed(self, row: int):
+        """重新计算一行允许放入的颜色"""
+        count = self.prep_counts[row]
+        if count == 0:
+            self.allowed[row] = ALL_COLORS & ~ROW_COLORS[row][row_bits(self.wall, row)]
+        elif count == row + 1:
+            self.allowed[row] = 0
+        else:
+            self.allowed[row] = 1 << self.prep_colors[row]
+
+    def refresh_allowed(self):
+        """直接修改准备区或结算区后重新计算所有行"""
+        for row in range(NUM_ROWS):
+            self.update_allowed(row)
+
+    def can_place_pieces(self, row: int, color: int) -> bool:
+        """检查是否可以在指定行放置指定颜色的棋子"""
+        if self.prep_counts[row] and self.prep_colors[row] != color:
+            return False
+        return not self.wall & cell_bit(row, wall_column(row, color))
+
+    def place_pieces(self, row: int, color: int, count: int) -> int:
+        """在指定行放置棋子，返回无法放置的数量"""
+        old = self.prep_counts[row]
+        placed = min(count, row + 1 - old)
+        if placed:
+            keys = PREP_KEYS[self.seat][row][color]
+            self.hash ^= keys[old] ^ keys[old + placed]
+            self.prep_colors[row] = color
+            self.prep_counts[row] = old + placed
+            self.update_allowed(row)
+        return count - placed
+
+    def add_to_floor(self, tile: int, count: int = 1) -> int:
+        """把棋子放入扣分区（从左到右），返回放不下的数量"""
+        start = len(self.floor)
+        fit = min(count, FLOOR_SIZE - start)
+        keys = FLOOR_KEYS[self.seat]
+        for slot in range(start, start + fit):
+            self.hash ^= keys[slot][tile]
+        self.floor.extend([tile] * fit)
+        return count - fit
+
+    def score_row(self, row: int) -> Optional[Tuple[int, int]]:
+        """结算一行：填满时把一颗棋子移到结算区，返回(列号, 得分)，未填满返回None"""
+        count = self.prep_counts[row]
+        if count < row + 1:
+            return None
+        color = self.prep_colors[row]
+        col = wall_column(row, color)
+        self.wall |= cell_bit(row, col)
+        self.hash ^= PREP_KEYS[self.seat][row][color][count] ^ WALL_KEYS[self.seat][row * NUM_COLORS + col]
+        score = placement_score(self.wall, row, col)
+        self.set_score(self.score + score)
+        self.prep_colors[row] = EMPTY
+        self.prep_counts[row] = 0
+        self.update_allowed(row)
+        return col, score
+
+    def apply_penalties(self) -> List[Tuple[int, int, int]]:
+        """结算扣分区，返回(格子序号, 棋子, 扣分)列表并清空扣分区"""
+        penalties = [(i, tile, PENALTY_VALUES[i]) for i, tile in enumerate(self.floor)]
+        keys = FLOOR_KEYS[self.seat]
+        for slot, tile in enumerate(self.floor):
+            self.hash ^= keys[slot][tile]
+        self.set_score(self.score + sum(value for _, _, value in penalties))
+        self.floor = []
+        return penalties
+
+    def has_complete_row(self) -> bool:
+        """检查结算区是否有完整的一行"""
+        return has_complete_row(self.wall)
+
+    def end_game_bonus(self) -> EndGameBonus:
+        return end_game_bonus(self.wall)
+
+
+class AzulEngine:
+    """双人花砖物语的完整规则，不涉及任何绘制和等待"""
+    __slots__ = ("rng", "players", "bag", "discard", "disks", "center", "tiles_on_table",
+                 "first_token_in_center", "first_player_decided", "next_first_player",
+                 "current_player", "round_count", "game_over", "table_hash")
+
+    def __init__(self, seed: Optional[int] = None,
+                 player_names: Sequence[str] = ("Player 1", "Player 2")):
+        self.rng = random.Random(seed)
+        self.players = [PlayerState(name, seat) for seat, name in enumerate(player_names)]
+        self.bag = [0] * NUM_COLORS           # 棋子池中每种颜色的数量
+        self.discard = [0] * NUM_COLORS       # 废棋堆中每种颜色的数量
+        self.disks = [[0] * NUM_COLORS for _ in range(NUM_DISKS)]
+        self.center = [0] * NUM_COLORS        # 待定区（不含先手棋子）
+        self.tiles_on_table = 0               # 圆盘和待定区中的棋子总数
+        self.first_token_in_center = False
+        self.first_player_decided = False
+        self.next_first_player = 0            # 下一回合的先手玩家
+        self.current_player = 0               # 第一回合固定Player 1先手
+        self.round_count = 0
+        self.game_over = False
+        self.table_hash = 0                   # 圆盘、待定区和先手棋子部分的哈希
+        self.initialize_pieces()
+
+    def copy(self) -> "AzulEngine":
+        """复制整个状态（随机数生成器共享，不复制）"""
+        other = AzulEngine.__new__(AzulEngine)
+        other.rng = self.rng
+        other.players = [board.copy() for board in self.players]
+        other.bag = self.bag[:]
+        other.discard = self.discard[:]
+        other.disks = [disk[:] for disk in self.disks]
+        other.center = self.center[:]
+        other.tiles_on_table = self.tiles_on_table
+        other.first_token_in_center = self.first_token_in_center
+        other.first_player_decided = self.first_player_decided
+        other.next_first_player = self.next_first_player
+        other.current_player = self.current_player
+        other.round_count = self.round_count
+        other.game_over = self.game_over
+        other.table_hash = self.table_hash
+        return other
+
+    @property
+    def key(self) -> int:
+        """整个局面的Zobrist哈希（不含棋子池和废棋堆）"""
+        key = self.table_hash ^ self.players[0].hash ^ self.players[1].hash
+        return key ^ SIDE_KEY if self.current_player else key
+
+    def token_key(self) -> int:
+        """先手棋子位置对应的哈希键"""
+        if self.first_token_in_center:
+            return TOKEN_CENTER_KEY
+        if self.first_player_decided:
+            return TOKEN_HELD_KEYS[self.next_first_player]
+        return 0
+
+    def rehash(self):
+        """直接修改状态后从头计算哈希"""
+        h = self.token_key()
+        for disk_index, disk in enumerate(self.disks):
+            for color in range(NUM_COLORS):
+                h ^= DISK_KEYS[disk_index][color][disk[color]]
+        for color in range(NUM_COLORS):
+            h ^= CENTER_KEYS[color][self.center[color]]
+        self.table_hash = h
+        for board in self.players:
+            board.rehash()
+
+    def initialize_pieces(self):
+        """初始化棋子池 - 每种颜色20个棋子"""
+        self.bag = [TILES_PER_COLOR] * NUM_COLORS
+
+    def draw_tile(self) -> int:
+        """从棋子池随机抽取一个棋子，返回颜色"""
+        pick = self.rng.randrange(sum(self.bag))
+        for color, count in enumerate(self.bag):
+            if pick < count:
+                self.bag[color] -= 1
+                return color
+            pick -= count
+        raise ValueError("Piece pool is empty")
+
+    def start_new_round(self, deal: Optional[Sequence[Sequence[int]]] = None) -> bool:
+        """开始新回合，返回是否把废棋堆倒回了棋子池
+
+        deal 给出每个圆盘每种颜色的数量时按它发牌（用于回放和搜索中的随机事件），
+        否则从棋子池随机抽取。
+        """
+        old_token_key = self.token_key()
+        self.first_token_in_center = True
+        self.first_player_decided = False
+        self.table_hash ^= old_token_key ^ TOKEN_CENTER_KEY
+        refilled = False
+        if not any(self.bag):
+            self.bag = self.discard
+            self.discard = [0] * NUM_COLORS
+            refilled = True
+
+        for disk_index, disk in enumerate(self.disks):
+            keys = DISK_KEYS[disk_index]
+            if deal is not None:
+                for color, count in enumerate(deal[disk_index]):
+                    if count > self.bag[color]:
+                        raise ValueError(f"Not enough {COLOR_NAMES[color]} pieces in pool for this deal")
+                    if count:
+                        self.bag[color] -= count
+                        self.table_hash ^= keys[color][disk[color]] ^ keys[color][disk[color] + count]
+                        disk[color] += count
+                        self.tiles_on_table += count
+                continue
+            for _ in range(TILES_PER_DISK):
+                if not any(self.bag):
+                    break
+                color = self.draw_tile()
+                self.table_hash ^= keys[color][disk[color]] ^ keys[color][disk[color] + 1]
+                disk[color] += 1
+                self.tiles_on_table += 1
+
+        self.current_player = self.next_first_player
+        self.round_count += 1
+        # 棋子全部用完时无法继续
+        if self.is_round_over():
+            self.game_over = True
+        return refilled
+
+    def count_tiles(self, source: int, color: int) -> int:
+        """来源（圆盘序号或 CENTER）中指定颜色的棋子数量"""
+        tiles = self.center if source == CENTER else self.disks[source]
+        return tiles[color]
+
+    def can_place(self, color: int, target: int, player: Optional[int] = None) -> bool:
+        """检查玩家能否把指定颜色放到目标行（FLOOR 表示直接放入扣分区）"""
+        if target == FLOOR:
+            return True
+        if player is None:
+            player = self.current_player
+        return self.players[player].can_place_pieces(target, color)
+
+    def play(self, source: int, color: int, target: int) -> MoveResult:
+        """当前玩家从圆盘或待定区拿走某颜色的全部棋子，并放入准备区的一行或扣分区，非法走法抛出 ValueError 且不修改状态"""
+        # 负数下标会指向别的圆盘、颜色或行，必须先检查范围
+        if not (source == CENTER or 0 <= source < NUM_DISKS):
+            raise ValueError(f"Bad source: {source}")
+        if not 0 <= color < NUM_COLORS:
+            raise ValueError(f"Bad color: {color}")
+        if not 0 <= target <= FLOOR:
+            raise ValueError(f"Bad target: {target}")
+        if self.count_tiles(source, color) == 0:
+            raise ValueError(f"No {COLOR_NAMES[color]} pieces at source {source}")
+        if not self.can_place(color, target):
+            raise ValueError(f"Cannot place {COLOR_NAMES[color]} pieces in row {target + 1}")
+        return self._play(source, color, target)
+
+    def _play(self, source: int, color: int, target: int) -> MoveResult:
+        """不检查的 play，只用于走法来自 generate_moves 的搜索代码"""
+        board = self.players[self.current_player]
+        center = self.center
+        h = self.table_hash
+        if source == CENTER:
+            count = center[color]
+            center[color] = 0
+            h ^= CENTER_KEYS[color][count]
+        else:
+            disk = self.disks[source]
+            disk_keys = DISK_KEYS[source]
+            count = disk[color]
+            # 剩余棋子移到待定区
+            for other in range(NUM_COLORS):
+                moved = disk[other]
+                if moved:
+                    h ^= disk_keys[other][moved]
+                    disk[other] = 0
+                    if other != color:
+                        keys = CENTER_KEYS[other]
+                        h ^= keys[center[other]] ^ keys[center[other] + moved]
+                        center[other] += moved
+        self.table_hash = h
+        self.tiles_on_table -= count
+
+        overflow = count if target == FLOOR else board.place_pieces(target, color, count)
+        # 扣分区放不下的棋子进入废棋堆
+        self.discard[color] += board.add_to_floor(color, overflow)
+
+        # 第一个从待定区拿棋子的玩家获得先手棋子
+        took_first_token = source == CENTER and self.first_token_in_center
+        if took_first_token:
+            self.first_token_in_center = False
+            self.first_player_decided = True
+            self.next_first_player = self.current_player
+            self.table_hash ^= TOKEN_CENTER_KEY ^ TOKEN_HELD_KEYS[self.current_player]
+            board.add_to_floor(FIRST_TOKEN)
+
+        if self.tiles_on_table:
+            self.current_player = 1 - self.current_player
+        return MoveResult(count - overflow, overflow, took_first_token)
+
+    def is_round_over(self) -> bool:
+        """所有圆盘和待定区的棋子都被拿完时回合结束"""
+        return not self.tiles_on_table
+
+    def score_round(self) -> List[ScoreEvent]:
+        """结算本回合：先准备区从上到下，再扣分区，依次处理每个玩家；游戏结束时再加上奖励分"""
+        events = []
+        for player, board in enumerate(self.players):
+            for row in range(NUM_ROWS):
+                color = board.prep_colors[row]
+                result = board.score_row(row)
+                if result is None:
+                    continue
+                col, score = result
+                # 该行剩余的棋子移入废棋堆
+                self.discard[color] += row
+                events.append(ScoreEvent(player, WALL_EVENT, row, col, color, score))
+
+            for slot, tile, value in board.apply_penalties():
+                if tile != FIRST_TOKEN:
+                    self.discard[tile] += 1
+                events.append(ScoreEvent(player, PENALTY_EVENT, FLOOR, slot, tile, value))
+
+        self.game_over = self.check_game_end()
+        if self.game_over:
+            events.extend(self.apply_end_game_bonus())
+        return events
+
+    def apply_end_game_bonus(self) -> List[ScoreEvent]:
+        """游戏结束时给每个玩家加上完整的行、列和颜色的奖励分"""
+        events = []
+        for player, board in enumerate(self.players):
+            bonus = bonus_score(board.wall)
+            if bonus:
+                board.set_score(board.score + bonus)
+                events.append(ScoreEvent(player, BONUS_EVENT, EMPTY, EMPTY, EMPTY, bonus))
+        return events
+
+    def finish_round(self) -> List[ScoreEvent]:
+        """结算本回合，游戏未结束时直接开始下一回合"""
+        events = self.score_round()
+        if not self.game_over:
+            self.start_new_round()
+        return events
+
+    def check_game_end(self) -> bool:
+        """任意玩家的结算区有一整行都有棋子时游戏结束"""
+        return any(board.has_complete_row() for board in self.players)
+
+    def winner(self) -> Optional[int]:
+        """返回分数高的玩家序号，平局返回None"""
+        scores = [board.score for board in self.players]
+        if scores[0] == scores[1]:
+            return None
+        return 0 if scores[0] > scores[1] else 1
@@ -1,6 +1,24 @@
+import argparse
+import time
 import pygame
-import random
-from typing import List, Tuple, Dict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Tuple, Dict, Optional
+
+from bitboard import adjacency_score, cell_bit, has_complete_row, placement_score
+from alphabeta import AlphaBetaPlayer
+import assets
+from assets import TileAtlas, render_text
+from mcts import MCTSPlayer
+from endgame import EndgamePlayer
+from pipebot import PipeBot
+from profiler import Profiler
+from hittest import BOARD, BUTTON, CENTER as CENTER_TARGET, DISK, FLOOR as FLOOR_TARGET, PREP, GridIndex, HitTarget, IntervalTable
+from render import FrameStats, RetainedRenderer
+from replay import Replay, load_replays
+from snapshot import History, restore_snapshot
+from timeline import Timeline
+from engine import (AzulEngine, EndGameBonus, PlayerState, CENTER, EMPTY, FLOOR, FIRST_TOKEN, NUM_COLORS,
+                    BONUS_EVENT, PENALTY_EVENT, WALL_EVENT, end_game_bonus)
 
 # 初始化颜色常量 - 调整为更柔和的颜色
 BLUE = (100, 140, 255)    # 柔和的蓝色
@@ -9,19 +27,29 @@ RED = (255, 130, 130)     # 柔和的红色
 BLACK = (100, 100, 100)   # 柔和的黑色（深灰）
 WHITE = (240, 240, 240)   # 柔和的白色（浅灰）
 GRAY = (128, 128, 128)
+HOVER = (255, 255, 255)   # 鼠标悬停的高亮边框
 BACKGROUND = (200, 200, 200)
 
+# 引擎中的颜色编号到显示颜色的映射
+COLORS = [BLUE, YELLOW, RED, BLACK, WHITE]
+COLOR_IDS = {color: i for i, color in enumerate(COLORS)}
+
 # 游戏配置
 WINDOW_WIDTH = 1200
 WINDOW_HEIGHT = 800
 PIECE_SIZE = 30
 DISK_SIZE = 80
+FPS = 60               # 有动画时的帧率上限
+IDLE_TIMEOUT = 500     # 空闲时等待事件的最长时间（毫秒）
+REPLAY_SPEED = 2.0     # 回放的默认速度（每秒步数）
+AI_MOVE_READY = pygame.USEREVENT + 1   # 后台线程中的电脑玩家搜索完成，唤醒空闲等待
 
 class GameState:
     INIT = "INIT"         # 游戏初始状态
     RUNNING = "RUNNING"   # 游戏进行中
     SCORING = "SCORING"   # 结算阶段
     END = "END"          # 游戏结束
+    REPLAY = "REPLAY"    # 回放对局记录
 
 class Button:
     def __init__(self, x: int, y: int, width: int, height: int, text: str):
@@ -34,14 +62,16 @@ class Button:
         pygame.draw.rect(screen, color, self.rect)
         pygame.draw.rect(screen, BLACK, self.rect, 2)
         
-        font = pygame.font.Font(None, 36)
-        text_surface = font.render(self.text, True, BLACK if self.enabled else (100, 100, 100))
+        text_surface = render_text(self.text, 36, BLACK if self.enabled else (100, 100, 100))
         text_rect = text_surface.get_rect(center=self.rect.center)
         screen.blit(text_surface, text_rect)
         
     def is_clicked(self, pos) -> bool:
         return self.enabled and self.rect.collidepoint(pos)
 
+# 所有棋子共享的贴图集
+TILE_ATLAS = TileAtlas(PIECE_SIZE, BLACK)
+
 class Piece:
     def __init__(self, color: Tuple[int, int, int], is_first: bool = False):
         self.color = color
@@ -52,39 +82,12 @@ class Piece:
     def draw(self, screen: pygame.Surface, x: int, y: int):
         self.rect.x = x
         self.rect.y = y
-        if self.is_first:
-            # 绘制菱形
-            points = [
-                (x + PIECE_SIZE//2, y),  # 上
-                (x + PIECE_SIZE, y + PIECE_SIZE//2),  # 右
-                (x + PIECE_SIZE//2, y + PIECE_SIZE),  # 下
-                (x, y + PIECE_SIZE//2)  # 左
-            ]
-            pygame.draw.polygon(screen, self.color, points)
-            # 双层边框
-            pygame.draw.polygon(screen, BLACK, points, 2)
-            pygame.draw.polygon(screen, BLACK, [
-                (x + PIECE_SIZE//2, y + 4),
-                (x + PIECE_SIZE - 4, y + PIECE_SIZE//2),
-                (x + PIECE_SIZE//2, y + PIECE_SIZE - 4),
-                (x + 4, y + PIECE_SIZE//2)
-            ], 2)
-            if self.selected:  # 如果被选中，添加高亮效果
-                glow_points = [
-                    (x + PIECE_SIZE//2, y - 2),
-                    (x + PIECE_SIZE + 2, y + PIECE_SIZE//2),
-                    (x + PIECE_SIZE//2, y + PIECE_SIZE + 2),
-                    (x - 2, y + PIECE_SIZE//2)
-                ]
-                pygame.draw.polygon(screen, (255, 255, 0), glow_points, 2)
-        else:
-            # 普通棋子仍然是圆形
-            pygame.draw.circle(screen, self.color, (x + PIECE_SIZE//2, y + PIECE_SIZE//2), PIECE_SIZE//2)
-            pygame.draw.circle(screen, BLACK, (x + PIECE_SIZE//2, y + PIECE_SIZE//2), PIECE_SIZE//2, 2)
-            if self.selected:  # 如果被选中，添加高亮效果
-                pygame.draw.circle(screen, (255, 255, 0), 
-                                (x + PIECE_SIZE//2, y + PIECE_SIZE//2), 
-                                PIECE_SIZE//2 + 2, 2)
+        # 贴图预先光栅化（菱形先手棋子、圆形普通棋子以及选中高亮）
+        TILE_ATLAS.blit(screen, x, y, self.color, self.is_first, self.selected)
+
+def piece_key(piece: Optional[Piece]):
+    """棋子外观的状态键，用于判断区域是否需要重绘"""
+    return piece and (piece.color, piece.is_first, piece.selected)
 
 class PlayerBoard:
     def __init__(self, x: int, y: int, player_name: str):
@@ -93,6 +96,7 @@ class PlayerBoard:
         self.player_name = player_name
         self.prep_area = [[None for _ in range(i)] for i in range(1, 6)]
         self.scoring_area = [[None for _ in range(5)] for _ in range(5)]
+        self.wall_mask = 0  # 结算区的位棋盘，与 scoring_area 同步
         self.penalty_area = [None] * 7
         self.penalty_values = [-1, -1, -2, -2, -2, -3, -3]
         self.score = 0
@@ -106,51 +110,148 @@ class PlayerBoard:
             [YELLOW, RED, BLACK, WHITE, BLUE]       # 第5排
         ]
         
+        # 格子、底色和扣分标签只渲染一次，布局或配色变化时重建
+        self._static_layer = None
+        self._static_key = None
+        
     def draw(self, screen: pygame.Surface):
+        self.draw_header(screen)
+        self.draw_prep_area(screen)
+        self.draw_scoring_area(screen)
+        self.draw_penalty_area(screen)
+
+    def draw_header(self, screen: pygame.Surface):
         # 绘制玩家名字和分数
-        font = pygame.font.Font(None, 36)
-        name_text = font.render(f"{self.player_name} - Score: {self.score}", True, BLACK)
+        name_text = render_text(f"{self.player_name} - Score: {self.score}", 36, BLACK)
         screen.blit(name_text, (self.x, self.y - 30))
+
+    @property
+    def prep_rect(self) -> pygame.Rect:
+        return pygame.Rect(self.x, self.y, 5 * PIECE_SIZE, 5 * PIECE_SIZE)
+
+    @property
+    def wall_rect(self) -> pygame.Rect:
+        return pygame.Rect(self.x + 200, self.y, 5 * PIECE_SIZE, 5 * PIECE_SIZE)
+
+    @property
+    def floor_rect(self) -> pygame.Rect:
+        # 包括上方的扣分标签和先手棋子菱形的下边缘
+        return pygame.Rect(self.x, self.y + 180, 7 * PIECE_SIZE + 1, 52)
+
+    def static_layer(self) -> pygame.Surface:
+        """玩家板的静态部分（以 (x, y) 为原点），布局或配色变化时才重新渲染"""
+        key = (self.x, self.y, BACKGROUND, GRAY,
+               tuple(map(tuple, self.scoring_colors)), tuple(self.penalty_values))
+        if key != self._static_key:
+            self._static_layer = self.render_static_layer()
+            self._static_key = key
+        return self._static_layer
+
+    def render_static_layer(self) -> pygame.Surface:
+        layer = pygame.Surface((350, 232))
+        layer.fill(BACKGROUND)
+        
+        # 准备区格子 - 右对齐
+        prep_width = 5 * PIECE_SIZE  # 最长一行的宽度
+        for row in range(5):
+            row_length = row + 1
+            for col in range(row_length):
+                x = prep_width - (row_length - col) * PIECE_SIZE
+                pygame.draw.rect(layer, GRAY, (x, row * PIECE_SIZE, PIECE_SIZE, PIECE_SIZE), 1)
+        
+        # 结算区底色和边框
+        for row in range(5):
+            for col in range(5):
+                cell = (200 + col * PIECE_SIZE, row * PIECE_SIZE, PIECE_SIZE, PIECE_SIZE)
+                pygame.draw.rect(layer, self.scoring_colors[row][col], cell)
+                pygame.draw.rect(layer, GRAY, cell, 1)
         
+        # 扣分区格子和扣分值
+        for i in range(7):
+            x = i * PIECE_SIZE
+            penalty_text = render_text(str(self.penalty_values[i]), 24, BLACK)
+            text_rect = penalty_text.get_rect(centerx=x + PIECE_SIZE//2, bottom=198)
+            layer.blit(penalty_text, text_rect)
+            pygame.draw.rect(layer, GRAY, (x, 200, PIECE_SIZE, PIECE_SIZE), 1)
+        return layer
+
+    def blit_static(self, screen: pygame.Surface, rect: pygame.Rect):
+        """把静态层中与 rect 对应的部分画到屏幕上"""
+        screen.blit(self.static_layer(), rect, rect.move(-self.x, -self.y))
+
+    def draw_prep_area(self, screen: pygame.Surface):
         # 绘制准备区 - 修改为右对齐
+        self.blit_static(screen, self.prep_rect)
         prep_width = 5 * PIECE_SIZE  # 最长一行的宽度
         for row in range(5):
             row_length = row + 1
             for col in range(row_length):
-                # 计算右对齐的x坐标
-                x = self.x + prep_width - (row_length - col) * PIECE_SIZE
-                y = self.y + row * PIECE_SIZE
-                pygame.draw.rect(screen, GRAY, (x, y, PIECE_SIZE, PIECE_SIZE), 1)
                 if self.prep_area[row][col]:
-                    self.prep_area[row][col].draw(screen, x, y)
-        
+                    # 计算右对齐的x坐标
+                    x = self.x + prep_width - (row_length - col) * PIECE_SIZE
+                    self.prep_area[row][col].draw(screen, x, self.y + row * PIECE_SIZE)
+
+    def draw_scoring_area(self, screen: pygame.Surface):
         # 绘制结算区
+        self.blit_static(screen, self.wall_rect)
         for row in range(5):
             for col in range(5):
-                x = self.x + 200 + col * PIECE_SIZE
-                y = self.y + row * PIECE_SIZE
-                # 绘制底色
-                pygame.draw.rect(screen, self.scoring_colors[row][col], 
-                               (x, y, PIECE_SIZE, PIECE_SIZE))
-                # 绘制边框
-                pygame.draw.rect(screen, GRAY, 
-                               (x, y, PIECE_SIZE, PIECE_SIZE), 1)
                 if self.scoring_area[row][col]:
-                    self.scoring_area[row][col].draw(screen, x, y)
-        
-        # 绘制扣分区及其分数
-        small_font = pygame.font.Font(None, 24)
+                    x = self.x + 200 + col * PIECE_SIZE
+                    self.scoring_area[row][col].draw(screen, x, self.y + row * PIECE_SIZE)
+
+    def draw_penalty_area(self, screen: pygame.Surface):
+        # 绘制扣分区的棋子
+        self.blit_static(screen, self.floor_rect)
         for i in range(7):
-            x = self.x + i * PIECE_SIZE
-            y = self.y + 200
-            # 绘制扣分值
-            penalty_text = small_font.render(str(self.penalty_values[i]), True, BLACK)
-            text_rect = penalty_text.get_rect(centerx=x + PIECE_SIZE//2, bottom=y - 2)
-            screen.blit(penalty_text, text_rect)
-            # 绘制格子和棋子
-            pygame.draw.rect(screen, GRAY, (x, y, PIECE_SIZE, PIECE_SIZE), 1)
             if self.penalty_area[i]:
-                self.penalty_area[i].draw(screen, x, y)
+                self.penalty_area[i].draw(screen, self.x + i * PIECE_SIZE, self.y + 200)
+
+    def add_regions(self, renderer: RetainedRenderer):
+        """把玩家板的各部分注册为独立重绘的区域"""
+        name = self.player_name
+        renderer.add(f"{name} header", pygame.Rect(self.x, self.y - 30, 260, 28),
+                     lambda: self.score, self.draw_header, "boards")
+        renderer.add(f"{name} prep", self.prep_rect,
+                     lambda: tuple(piece_key(piece) for row in self.prep_area for piece in row),
+                     self.draw_prep_area, "boards")
+        renderer.add(f"{name} wall", self.wall_rect,
+                     lambda: self.wall_mask, self.draw_scoring_area, "boards")
+        renderer.add(f"{name} floor", self.floor_rect,
+                     lambda: tuple(piece_key(piece) for piece in self.penalty_area),
+                     self.draw_penalty_area, "boards")
+
+    def sync_from_state(self, state: PlayerState, first_piece: Piece):
+        """根据引擎中的玩家状态重建棋子布局"""
+        for row in range(5):
+            count = state.prep_counts[row]
+            self.prep_area[row] = [None] * (row + 1 - count)
+            self.prep_area[row].extend(Piece(COLORS[state.prep_colors[row]]) for _ in range(count))
+        for row in range(5):
+            for col in range(5):
+                self.scoring_area[row][col] = Piece(self.scoring_colors[row][col]) if state.wall & cell_bit(row, col) else None
+        self.wall_mask = state.wall
+        self.penalty_area = [first_piece if tile == FIRST_TOKEN else Piece(COLORS[tile]) for tile in state.floor]
+        self.penalty_area.extend([None] * (7 - len(self.penalty_area)))
+        self.score = state.score
+
+    def to_state(self, seat: int) -> PlayerState:
+        """把当前的棋子布局转换为引擎中的玩家状态"""
+        state = PlayerState(self.player_name, seat)
+        for row in range(5):
+            pieces = [piece for piece in self.prep_area[row] if piece]
+            state.prep_counts[row] = len(pieces)
+            state.prep_colors[row] = COLOR_IDS[pieces[0].color] if pieces else EMPTY
+        for row in range(5):
+            for col in range(5):
+                if self.scoring_area[row][col]:
+                    state.wall |= cell_bit(row, col)
+        state.floor = [FIRST_TOKEN if piece.is_first else COLOR_IDS[piece.color]
+                       for piece in self.penalty_area if piece]
+        state.score = self.score
+        state.refresh_allowed()
+        state.rehash()
+        return state
 
     def get_prep_area_position(self, pos) -> Tuple[int, int]:
         """获取点击的准备区位置"""
@@ -203,59 +304,13 @@ class PlayerBoard:
         return overflow
 
     def calculate_piece_score(self, row: int, col: int) -> int:
-        """计算新放置的棋子的得分"""
-        piece = self.scoring_area[row][col]
-        if not piece:
-            return 0
-            
-        # 检查水平方向
-        horizontal_line = [piece]
-        # 向左检查
-        for c in range(col - 1, -1, -1):
-            if self.scoring_area[row][c]:
-                horizontal_line.insert(0, self.scoring_area[row][c])
-            else:
-                break
-        # 向右检查
-        for c in range(col + 1, 5):
-            if self.scoring_area[row][c]:
-                horizontal_line.append(self.scoring_area[row][c])
-            else:
-                break
-                
-        # 检查垂直方向
-        vertical_line = [piece]
-        # 向上检查
-        for r in range(row - 1, -1, -1):
-            if self.scoring_area[r][col]:
-                vertical_line.insert(0, self.scoring_area[r][col])
-            else:
-                break
-        # 向下检查
-        for r in range(row + 1, 5):
-            if self.scoring_area[r][col]:
-                vertical_line.append(self.scoring_area[r][col])
-            else:
-                break
-        
-        total_score = 0
-        has_line = False
-        
-        # 计算水平连线分数（长度≥2才计分）
-        if len(horizontal_line) >= 2:
-            total_score += len(horizontal_line)
-            has_line = True
-            
-        # 计算垂直连线分数（长度≥2才计分）
-        if len(vertical_line) >= 2:
-            total_score += len(vertical_line)
-            has_line = True
-            
-        # 只有在没有形成任何连线时才得1分
-        if not has_line:
-            total_score = 1
-            
-        return total_score
+        """计算新放置的棋子的得分（按相邻的连续棋子计算）"""
+        return adjacency_score(self.wall_mask, row, col)
+
+    def place_on_wall(self, row: int, col: int, piece: Piece):
+        """把棋子放入结算区并更新位棋盘"""
+        self.scoring_area[row][col] = piece
+        self.wall_mask |= cell_bit(row, col)
 
     def score_row(self, row: int) -> List[Tuple[int, int, int]]:
         """结算一行，返回需要计分的位置和分数"""
@@ -276,7 +331,7 @@ class PlayerBoard:
         
         if target_col is not None and target_piece:
             # 将一颗棋子移到结算区
-            self.scoring_area[row][target_col] = target_piece
+            self.place_on_wall(row, target_col, target_piece)
             
             # 记录需要移入废棋堆的棋子
             waste_pieces = []
@@ -297,10 +352,11 @@ class PlayerBoard:
 
     def has_complete_row(self) -> bool:
         """检查是否有完整的一行"""
-        for row in range(5):
-            if all(self.scoring_area[row]):  # 如果这一行的所有位置都有棋子
-                return True
-        return False
+        return has_complete_row(self.wall_mask)
+
+    def end_game_bonus(self) -> EndGameBonus:
+        """游戏结束的奖励分明细（完整的行、列和颜色）"""
+        return end_game_bonus(self.wall_mask)
 
     def calculate_line_scores(self, row: int, moves: List[Tuple[Piece, int]]) -> List[Tuple[int, int, int]]:
         """
@@ -316,58 +372,142 @@ class PlayerBoard:
         score_positions = []  # 最终的得分列表
         scored_positions = set()  # 记录已经计算过分数的位置
         
-        # 对每个新放置的棋子
+        # 对每个新放置的棋子，直接查表得到得分
         for _, col in moves:
-            # 如果这个位置已经计算过分数，跳过
             if (row, col) in scored_positions:
                 continue
-            
-            # 检查水平连线
-            horizontal_line = []
-            for c in range(5):
-                if self.scoring_area[row][c]:
-                    horizontal_line.append(c)
-            
-            # 检查垂直连线
-            vertical_line = []
-            for r in range(5):
-                if self.scoring_area[r][col]:
-                    vertical_line.append(r)
-            
-            # 计算分数
-            score = 0
-            has_line = False
-            
-            # 如果形成水平连线（长度≥2）
-            if len(horizontal_line) >= 2 and col in horizontal_line:
-                score += len(horizontal_line)
-                has_line = True
-            
-            # 如果形成垂直连线（长度≥2）
-            if len(vertical_line) >= 2:
-                score += len(vertical_line)
-                has_line = True
-            
-            # 如果没有形成任何连线，得1分
-            if not has_line:
-                score = 1
-            
-            # 记录这个位置已经计算过分数
             scored_positions.add((row, col))
-            score_positions.append((row, col, score))
+            score_positions.append((row, col, placement_score(self.wall_mask, row, col)))
         
         return score_positions
 
-class Game:
+def pieces_from_counts(counts: List[int]) -> List[Piece]:
+    """按颜色数量生成棋子列表（同色棋子相邻）"""
+    return [Piece(COLORS[color]) for color in range(NUM_COLORS) for _ in range(counts[color])]
+
+def search_move(ai_player, engine: AzulEngine):
+    """在后台线程中运行电脑玩家的搜索，返回 (走法, 开始时间, 结束时间)，时间为纳秒"""
+    start = time.perf_counter_ns()
+    move = ai_player.choose_move(engine)
+    return move, start, time.perf_counter_ns()
+
+def notify_ai_move_ready(future: Future):
+    """搜索完成时（在后台线程中）发送事件唤醒主循环"""
+    try:
+        pygame.event.post(pygame.event.Event(AI_MOVE_READY))
+    except pygame.error:
+        pass  # 窗口已经关闭
+
+def counts_from_pieces(pieces: List[Piece]) -> List[int]:
+    """统计棋子列表中每种颜色的数量（先手棋子不计）"""
+    counts = [0] * NUM_COLORS
+    for piece in pieces:
+        if not piece.is_first:
+            counts[COLOR_IDS[piece.color]] += 1
+    return counts
+
+class CenterArea:
+    """待定区：每种颜色一个桶，桶按颜色第一次进入待定区的顺序排列；先手棋子单独存放。
+    
+    加入一个棋子和取走一种颜色都是 O(1)，绘制和点击检测直接按桶的顺序读取，位置不会跳动。
+    """
+    
     def __init__(self):
+        self.buckets: Dict[Tuple[int, int, int], List[Piece]] = {}
+        self.first_piece: Optional[Piece] = None
+    
+    def add(self, piece: Piece):
+        if piece.is_first:
+            self.first_piece = piece
+        else:
+            self.buckets.setdefault(piece.color, []).append(piece)
+    
+    def take_color(self, color: Tuple[int, int, int]) -> List[Piece]:
+        """取走某种颜色的全部棋子"""
+        return self.buckets.pop(color, [])
+    
+    def take_first_piece(self) -> Optional[Piece]:
+        piece, self.first_piece = self.first_piece, None
+        return piece
+    
+    def color_pieces(self, color: Tuple[int, int, int]) -> List[Piece]:
+        return self.buckets.get(color, [])
+    
+    def groups(self) -> List[Tuple[Tuple[int, int, int], List[Piece]]]:
+        """按顺序排列的 (颜色, 棋子列表)"""
+        return list(self.buckets.items())
+    
+    def counts(self) -> List[int]:
+        """每种颜色的数量（引擎的待定区表示）"""
+        counts = [0] * NUM_COLORS
+        for color, pieces in self.buckets.items():
+            counts[COLOR_IDS[color]] = len(pieces)
+        return counts
+    
+    def sync_counts(self, counts: List[int], first_piece: Optional[Piece]):
+        """按引擎的每色数量更新：只增减变化的桶，新出现的颜色排在最后"""
+        for color_id, count in enumerate(counts):
+            color = COLORS[color_id]
+            bucket = self.buckets.get(color)
+            if not count:
+                if bucket is not None:
+                    del self.buckets[color]
+            elif bucket is None:
+                self.buckets[color] = [Piece(color) for _ in range(count)]
+            elif len(bucket) < count:
+                bucket.extend(Piece(color) for _ in range(count - len(bucket)))
+            elif len(bucket) > count:
+                del bucket[count:]
+        self.first_piece = first_piece
+    
+    def clear(self):
+        self.buckets.clear()
+        self.first_piece = None
+    
+    def __iter__(self):
+        if self.first_piece is not None:
+            yield self.first_piece
+        for pieces in self.buckets.values():
+            yield from pieces
+    
+    def __len__(self) -> int:
+        return (self.first_piece is not None) + sum(len(pieces) for pieces in self.buckets.values())
+    
+    def __contains__(self, piece: Piece) -> bool:
+        if piece.is_first:
+            return piece is self.first_piece
+        return piece in self.buckets.get(piece.color, ())
+
+class Game:
+    def __init__(self, ai_seat: Optional[int] = None, ai_player=None, instant: bool = False,
+                 replay: Optional[Replay] = None, replay_speed: float = REPLAY_SPEED,
+                 profiler: Optional[Profiler] = None):
         pygame.init()
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("方砖游戏")
+        TILE_ATLAS.preload(COLORS + [GRAY])
+        
+        # 规则由无界面引擎负责，下面的棋子列表只用于绘制和点击检测
+        self.engine = AzulEngine()
+        
+        # 电脑玩家（1或2号座位），None 表示双人对战
+        self.ai_seat = ai_seat
+        self.ai_player = ai_player or (MCTSPlayer() if ai_seat else None)
+        # 电脑玩家在后台线程中思考，界面照常处理事件和刷新。只有一个线程，同一个电脑玩家不会同时搜索两次
+        self.ai_executor = ThreadPoolExecutor(1, thread_name_prefix="ai") if self.ai_player else None
+        self.ai_search: Optional[Future] = None
+        self.ai_search_position = None   # 开始搜索时的 (引擎, 局面哈希)
+        
+        # 每个需要玩家决策的局面保存一个快照，用于悔棋/重做
+        self.history = History()
+        
+        # 结算动画的时间线，instant 模式下立即应用结果（不播放动画）
+        self.instant = instant
+        self.timeline = Timeline(pygame.time.get_ticks, instant)
         
         self.piece_pool = []
         self.waste_pool = []
-        self.waiting_area = []
-        self.first_piece = None
+        self.waiting_area = CenterArea()
         self.disks = [[] for _ in range(5)]
         
         self.player1_board = PlayerBoard(50, 50, "Player 1")
@@ -387,8 +527,6 @@ class Game:
         
         self.round_count = 0  # 改为从0开始，这样第一回合会变成1
         
-        self.initialize_pieces()
-        
         # 只保留一个按钮，初始显示为"Start Game"
         self.game_button = Button(600, 300, 150, 40, "Start Game")
         
@@ -398,89 +536,236 @@ class Game:
         # 创建独立的先手棋子（使用灰色）
         self.first_piece = Piece(GRAY, is_first=True)
         
-    def initialize_pieces(self):
-        """初始化棋子池 - 每种颜色20个棋子"""
-        self.piece_pool = []
-        colors = [BLUE, YELLOW, RED, BLACK, WHITE]
-        for color in colors:
-            for _ in range(20):  # 每种颜色20个
-                self.piece_pool.append(Piece(color))
-        random.shuffle(self.piece_pool)
+        # 回放模式：按时间推进到对应的步数，局面从最近的关键帧恢复
+        self.replay = replay
+        self.replay_speed = replay_speed
+        self.replay_index = 0
+        self.replay_playing = False
+        self.replay_anchor = (0, 0)   # 开始播放时的 (毫秒数, 步数)
+        if replay is not None:
+            self.state = GameState.REPLAY
+            self.engine = replay.position(0)
+            self.play_replay()
+        
+        self.sync_from_engine()
+        
+        # 点击检测索引：固定布局在布局变化时重建，待定区在内容变化时重建
+        self.hit_index: Optional[GridIndex] = None
+        self._layout_key = None
+        self.center_index: Optional[IntervalTable] = None
+        self.mouse_pos = (-1, -1)
+        
+        # 圆盘底图缓存
+        self._disk_layer = None
+        self._disk_layer_key = None
+        
+        # 性能剖析（默认关闭，关闭时几乎没有开销）
+        self.profiler = profiler or Profiler(enabled=False)
+        
+        # 只重绘发生变化的区域
+        self.renderer = RetainedRenderer(self.screen, BACKGROUND)
+        self.renderer.profiler = self.profiler
+        self.add_regions()
+        
+    def add_regions(self):
+        """注册界面区域，注册顺序即绘制的层次"""
+        renderer = self.renderer
+        self.player1_board.add_regions(renderer)
+        self.player2_board.add_regions(renderer)
+        for i in range(len(self.disks)):
+            x, y = self.disk_position(i)
+            renderer.add(f"disk {i}", pygame.Rect(x, y, DISK_SIZE, DISK_SIZE).inflate(4, 4),
+                         lambda i=i: tuple(piece_key(piece) for piece in self.disks[i]),
+                         lambda screen, i=i: self.draw_disk(screen, i), "disks")
+        renderer.add("waiting area", pygame.Rect(948, 98, PIECE_SIZE + 4, WINDOW_HEIGHT - 98),
+                     lambda: tuple(piece_key(piece) for piece in self.waiting_area),
+                     self.draw_waiting_area, "center")
+        renderer.add("button", self.game_button.rect,
+                     lambda: (self.game_button.text, self.game_button.enabled),
+                     self.game_button.draw)
+        renderer.add("info", pygame.Rect(600, 395, 350, 195),
+                     lambda: (self.state, self.round_count, len(self.piece_pool), len(self.waste_pool),
+                              self.current_player, self.selected_color is None,
+                              self.replay_index, self.replay_speed, self.replay_playing),
+                     self.draw_info_panel, "info")
+        renderer.add("hover", self.hover_rect, lambda: tuple(map(tuple, self.hover_rects())), self.draw_hover)
+        renderer.add("animations", self.score_animation_rect, self.score_animation_key,
+                     lambda screen: self.draw_score_animations(), "animations")
+        renderer.add("message", pygame.Rect(0, 5, WINDOW_WIDTH, 35),
+                     self.active_error_message, lambda screen: self.draw_error_message())
+        # 游戏结果覆盖在最上层，覆盖层下面的区域变化时连同覆盖层一起重绘
+        renderer.add("result",
+                     lambda: self.screen.get_rect() if self.state == GameState.END else pygame.Rect(0, 0, 0, 0),
+                     lambda: self.state == GameState.END, self.draw_game_result)
+        renderer.add("profiler", self.profiler_rect, self.profiler_key, self.draw_profiler)
+        
+    def sync_from_engine(self):
+        """根据引擎状态重建用于绘制和点击检测的棋子布局"""
+        engine = self.engine
+        self.piece_pool = pieces_from_counts(engine.bag)
+        self.waste_pool = pieces_from_counts(engine.discard)
+        self.disks = [pieces_from_counts(disk) for disk in engine.disks]
+        self.waiting_area.sync_counts(engine.center, self.first_piece if engine.first_token_in_center else None)
+        self.center_index = None
+        self.player1_board.sync_from_state(engine.players[0], self.first_piece)
+        self.player2_board.sync_from_state(engine.players[1], self.first_piece)
+        self.current_player = engine.current_player + 1
+        self.round_count = engine.round_count
+        self.first_player_decided = engine.first_player_decided
+        
+    def engine_from_layout(self) -> AzulEngine:
+        """把当前的棋子布局转换为引擎状态"""
+        engine = AzulEngine()
+        engine.bag = counts_from_pieces(self.piece_pool)
+        engine.discard = counts_from_pieces(self.waste_pool)
+        engine.disks = [counts_from_pieces(disk) for disk in self.disks]
+        engine.center = self.waiting_area.counts()
+        engine.tiles_on_table = sum(engine.center) + sum(sum(disk) for disk in engine.disks)
+        engine.first_token_in_center = self.first_piece in self.waiting_area
+        engine.players = [self.player1_board.to_state(0), self.player2_board.to_state(1)]
+        engine.current_player = self.current_player - 1
+        engine.round_count = self.round_count
+        engine.first_player_decided = self.first_player_decided
+        engine.next_first_player = self.engine.next_first_player
+        engine.game_over = self.engine.game_over
+        engine.rehash()
+        return engine
         
     def start_new_round(self):
         """开始新回合"""
-        # 将先手棋子放入待定区
-        if self.first_piece not in self.waiting_area:
-            self.waiting_area.append(self.first_piece)
-        
-        # 清空所有圆盘
-        for disk in self.disks:
-            disk.clear()
-        
-        # 检查棋子池是否完全空了
-        if not self.piece_pool:
+        if self.engine.start_new_round():
             self.show_error_message("Using pieces from waste pool!")
-            pygame.time.wait(1000)
-            self.piece_pool.extend(self.waste_pool)
-            self.waste_pool.clear()
-            random.shuffle(self.piece_pool)
+        self.sync_from_engine()
+        self.history.record(self.engine)
         
-        # 分配棋子到圆盘
-        for disk in self.disks:
-            for _ in range(4):
-                if self.piece_pool:
-                    disk.append(self.piece_pool.pop())
-                else:
-                    break
+    def disk_position(self, i: int) -> Tuple[int, int]:
+        """圆盘左上角的坐标"""
+        return 600 + (i % 3) * (DISK_SIZE + 20), 100 + (i // 3) * (DISK_SIZE + 20)
         
-        self.first_player_decided = False
-        self.round_count += 1  # 增加回合数
+    def layout_key(self):
+        """决定固定布局的参数，变化时重建点击索引"""
+        return (self.player1_board.x, self.player1_board.y, self.player2_board.x, self.player2_board.y,
+                tuple(self.game_button.rect), len(self.disks), PIECE_SIZE, DISK_SIZE)
+
+    def build_hit_index(self):
+        """把按钮、圆盘棋子位置、准备区各行和扣分区格子放入网格索引"""
+        index = GridIndex(WINDOW_WIDTH, WINDOW_HEIGHT)
+        for player, board in ((1, self.player1_board), (2, self.player2_board)):
+            index.add(board.prep_rect, HitTarget(BOARD, player))
+            for row in range(5):
+                # 准备区右对齐
+                row_width = (row + 1) * PIECE_SIZE
+                index.add(pygame.Rect(board.x + 5 * PIECE_SIZE - row_width, board.y + row * PIECE_SIZE,
+                                      row_width, PIECE_SIZE), HitTarget(PREP, player, row))
+            for i in range(7):
+                index.add(pygame.Rect(board.x + i * PIECE_SIZE, board.y + 200, PIECE_SIZE, PIECE_SIZE),
+                          HitTarget(FLOOR_TARGET, player, i))
+        for i in range(len(self.disks)):
+            x, y = self.disk_position(i)
+            for j in range(4):
+                index.add(pygame.Rect(x + (j % 2) * PIECE_SIZE, y + (j // 2) * PIECE_SIZE, PIECE_SIZE, PIECE_SIZE),
+                          HitTarget(DISK, i, j))
+        index.add(self.game_button.rect, HitTarget(BUTTON))
+        self.hit_index = index
+        self._layout_key = self.layout_key()
+
+    def build_center_index(self):
+        """待定区的每个颜色桶在区间表中占一段"""
+        table = IntervalTable(950, PIECE_SIZE)
+        current_y = 100
+        if self.waiting_area.first_piece is not None:
+            table.add(current_y, PIECE_SIZE, HitTarget(CENTER_TARGET, FIRST_TOKEN))
+            current_y += PIECE_SIZE
+        for n, (color, pieces) in enumerate(self.waiting_area.groups()):
+            table.add(current_y, len(pieces) * PIECE_SIZE, HitTarget(CENTER_TARGET, COLOR_IDS[color], n))
+            # 不同颜色之间留一点间隔
+            current_y += len(pieces) * PIECE_SIZE + 5
+        self.center_index = table
+
+    def hit_test(self, pos) -> Optional[HitTarget]:
+        """把屏幕位置映射到点击目标"""
+        if self.hit_index is None or self._layout_key != self.layout_key():
+            self.build_hit_index()
+        target = self.hit_index.lookup(pos)
+        if target is None:
+            if self.center_index is None:
+                self.build_center_index()
+            target = self.center_index.lookup(pos)
+        return target
         
     def get_disk_pieces(self, pos) -> Tuple[List[Piece], int]:
         """获取点击位置所在圆盘的所有同色棋子"""
-        for i, disk in enumerate(self.disks):
-            disk_x = 600 + (i % 3) * (DISK_SIZE + 20)
-            disk_y = 100 + (i // 3) * (DISK_SIZE + 20)
-            disk_rect = pygame.Rect(disk_x, disk_y, DISK_SIZE, DISK_SIZE)
-            
-            if disk_rect.collidepoint(pos):
-                # 找到被点击的棋子
-                for piece in disk:
-                    piece_x = disk_x + (disk.index(piece) % 2) * PIECE_SIZE
-                    piece_y = disk_y + (disk.index(piece) // 2) * PIECE_SIZE
-                    if piece.rect.collidepoint(pos):
-                        # 返回该圆盘中所有相同颜色的棋子
-                        same_color_pieces = [p for p in disk if p.color == piece.color]
-                        return same_color_pieces, i
+        target = self.hit_test(pos)
+        if target and target.kind == DISK and target.slot < len(self.disks[target.index]):
+            disk = self.disks[target.index]
+            color = disk[target.slot].color
+            # 返回该圆盘中所有相同颜色的棋子
+            return [p for p in disk if p.color == color], target.index
         return [], -1
 
     def get_waiting_area_pieces(self, pos) -> List[Piece]:
-        """获取点击位置所在待定区的所有同色棋子"""
-        waiting_x = 950
-        current_y = 100
-        
-        # 先手棋子不能被直接选择
-        if self.first_piece in self.waiting_area:
-            current_y += PIECE_SIZE  # 跳过先手棋子的位置
-        
-        # 检查其他棋子
-        colors = {piece.color for piece in self.waiting_area if not piece.is_first}
-        for color in colors:
-            same_color_pieces = [p for p in self.waiting_area if p.color == color and not p.is_first]
-            for piece in same_color_pieces:
-                piece_rect = pygame.Rect(waiting_x, current_y, PIECE_SIZE, PIECE_SIZE)
-                if piece_rect.collidepoint(pos):
-                    return same_color_pieces
-                current_y += PIECE_SIZE
-            if same_color_pieces:
-                current_y += 5
-                
+        """获取点击位置所在待定区的所有同色棋子（先手棋子不能被直接选择）"""
+        target = self.hit_test(pos)
+        if target and target.kind == CENTER_TARGET and target.index != FIRST_TOKEN:
+            return self.waiting_area.color_pieces(COLORS[target.index])
+        return []
+
+    def hover_rects(self) -> List[pygame.Rect]:
+        """鼠标悬停处可以点击的目标：可选择的棋子组，或已选棋子时当前玩家的准备区行和扣分区"""
+        if self.state != GameState.RUNNING or self.is_ai_turn():
+            return []
+        target = self.hit_test(self.mouse_pos)
+        if target is None:
+            return []
+        if target.kind == DISK:
+            disk = self.disks[target.index]
+            if target.slot >= len(disk):
+                return []
+            x, y = self.disk_position(target.index)
+            color = disk[target.slot].color
+            return [pygame.Rect(x + (j % 2) * PIECE_SIZE, y + (j // 2) * PIECE_SIZE, PIECE_SIZE, PIECE_SIZE)
+                    for j, piece in enumerate(disk) if piece.color == color]
+        if target.kind == CENTER_TARGET and target.index != FIRST_TOKEN:
+            return [self.center_index.span(target)]
+        if self.selected_color and target.index == self.current_player:
+            board = self.player1_board if self.current_player == 1 else self.player2_board
+            if target.kind == PREP:
+                row_width = (target.slot + 1) * PIECE_SIZE
+                return [pygame.Rect(board.x + 5 * PIECE_SIZE - row_width, board.y + target.slot * PIECE_SIZE,
+                                    row_width, PIECE_SIZE)]
+            if target.kind == FLOOR_TARGET:
+                return [pygame.Rect(board.x, board.y + 200, 7 * PIECE_SIZE, PIECE_SIZE)]
         return []
 
+    def hover_rect(self) -> pygame.Rect:
+        rects = [rect.inflate(6, 6) for rect in self.hover_rects()]
+        return rects[0].unionall(rects[1:]) if rects else pygame.Rect(0, 0, 0, 0)
+
+    def draw_hover(self, screen: pygame.Surface):
+        for rect in self.hover_rects():
+            pygame.draw.rect(screen, HOVER, rect.inflate(6, 6), 2)
+
+    def active_score_animations(self) -> List[dict]:
+        """去掉已经结束的分数动画"""
+        current_time = pygame.time.get_ticks()
+        self.score_animations = [anim for anim in self.score_animations
+                                 if current_time - anim['start_time'] < 1000]
+        return self.score_animations
+    
+    def score_animation_key(self):
+        """动画进行中每一帧都不同"""
+        if not self.active_score_animations():
+            return None
+        return pygame.time.get_ticks(), len(self.score_animations)
+    
+    def score_animation_rect(self) -> pygame.Rect:
+        """所有分数动画（包括向上飘动的范围）的外接矩形"""
+        rects = [pygame.Rect(anim['x'], anim['y'] - 20, 50, 50) for anim in self.score_animations]
+        return rects[0].unionall(rects[1:]) if rects else pygame.Rect(0, 0, 0, 0)
+    
     def draw_score_animations(self):
         """绘制分数动画"""
         current_time = pygame.time.get_ticks()
-        font = pygame.font.Font(None, 36)
         
         for anim in self.score_animations[:]:
             if current_time - anim['start_time'] < 1000:  # 显示1秒
@@ -497,8 +782,8 @@ class Game:
                     text = str(anim['score'])
                     color = (255, 0, 0)  # 红色表示扣分
                 
-                # 渲染文本
-                text_surface = font.render(text, True, color)
+                # 渲染文本（缓存的文字是共享的，设置透明度前先复制）
+                text_surface = render_text(text, 36, color).copy()
                 text_surface.set_alpha(int(alpha))
                 
                 # 计算位置
@@ -514,7 +799,6 @@ class Game:
         if self.state != GameState.RUNNING:
             return
             
-        font = pygame.font.Font(None, 24)
         hints = []
         
         if not self.selected_color:
@@ -525,31 +809,33 @@ class Game:
             
         y = 400  # 提示文字的起始y坐标
         for hint in hints:
-            text_surface = font.render(hint, True, BLACK)
+            text_surface = render_text(hint, 24, BLACK)
             text_rect = text_surface.get_rect(left=600, top=y)
             self.screen.blit(text_surface, text_rect)
             y += 25
             
+    def draw_info_panel(self, screen: pygame.Surface):
+        """信息栏：操作提示和游戏信息"""
+        self.draw_hints()
+        self.draw_game_info()
+        
     def draw_game_info(self):
         """绘制游戏信息"""
-        info_font = pygame.font.Font(None, 36)
-        small_font = pygame.font.Font(None, 24)
-        
         # 在屏幕右侧显示游戏信息
         y = 450
         spacing = 30
         
         # 显示回合数
         if self.state == GameState.INIT:
-            text = info_font.render("Round:", True, BLACK)  # 游戏开始前只显示"Round:"
+            text = render_text("Round:", 36, BLACK)  # 游戏开始前只显示"Round:"
         else:
-            text = info_font.render(f"Round: {self.round_count}", True, BLACK)  # 游戏开始后显示具体回合数
+            text = render_text(f"Round: {self.round_count}", 36, BLACK)  # 游戏开始后显示具体回合数
         self.screen.blit(text, (600, y))
         y += spacing
         
         # 显示棋子池和废棋堆信息
-        pool_text = info_font.render(f"Pieces in Pool: {len(self.piece_pool)}", True, BLACK)
-        waste_text = info_font.render(f"Pieces in Waste: {len(self.waste_pool)}", True, BLACK)
+        pool_text = render_text(f"Pieces in Pool: {len(self.piece_pool)}", 36, BLACK)
+        waste_text = render_text(f"Pieces in Waste: {len(self.waste_pool)}", 36, BLACK)
         self.screen.blit(pool_text, (600, y))
         y += spacing
         self.screen.blit(waste_text, (600, y))
@@ -557,7 +843,7 @@ class Game:
         
         # 显示当前玩家
         if self.state == GameState.RUNNING:
-            text = info_font.render(f"Current: Player {self.current_player}", True, BLACK)
+            text = render_text(f"Current: Player {self.current_player}", 36, BLACK)
             self.screen.blit(text, (600, y))
             y += spacing
         
@@ -567,68 +853,71 @@ class Game:
                 hint = "Click on disk or waiting area to select pieces"
             else:
                 hint = "Click on your board to place pieces"
-            text = small_font.render(hint, True, BLACK)
+            text = render_text(hint, 24, BLACK)
             self.screen.blit(text, (600, y))
-
-    def draw(self):
-        self.screen.fill(BACKGROUND)
-        
-        # 绘制玩家板
-        self.player1_board.draw(self.screen)
-        self.player2_board.draw(self.screen)
-        
-        # 绘制圆盘
-        for i, disk in enumerate(self.disks):
-            x = 600 + (i % 3) * (DISK_SIZE + 20)
-            y = 100 + (i // 3) * (DISK_SIZE + 20)
-            pygame.draw.circle(self.screen, GRAY, (x + DISK_SIZE//2, y + DISK_SIZE//2), DISK_SIZE//2, 2)
-            
-            for j, piece in enumerate(disk):
-                piece_x = x + (j % 2) * PIECE_SIZE
-                piece_y = y + (j // 2) * PIECE_SIZE
-                piece.draw(self.screen, piece_x, piece_y)
         
-        # 修改待定区的绘制，按颜色分组
+        # 回放进度和速度
+        if self.state == GameState.REPLAY:
+            text = render_text(f"Replay: move {self.replay_index}/{len(self.replay)}", 36, BLACK)
+            self.screen.blit(text, (600, y))
+            y += spacing
+            status = f"Speed: {self.replay_speed:g} moves/s" + ("" if self.replay_playing else " (paused)")
+            self.screen.blit(render_text(status, 24, BLACK), (600, y))
+
+    def disk_layer(self) -> pygame.Surface:
+        """圆盘底图只渲染一次，配色变化时重建"""
+        key = (BACKGROUND, GRAY, DISK_SIZE)
+        if self._disk_layer_key != key:
+            self._disk_layer = pygame.Surface((DISK_SIZE, DISK_SIZE))
+            self._disk_layer.fill(BACKGROUND)
+            pygame.draw.circle(self._disk_layer, GRAY, (DISK_SIZE//2, DISK_SIZE//2), DISK_SIZE//2, 2)
+            self._disk_layer_key = key
+        return self._disk_layer
+    
+    def draw_disk(self, screen: pygame.Surface, i: int):
+        """绘制一个圆盘及其中的棋子"""
+        x, y = self.disk_position(i)
+        screen.blit(self.disk_layer(), (x, y))
+        
+        for j, piece in enumerate(self.disks[i]):
+            piece_x = x + (j % 2) * PIECE_SIZE
+            piece_y = y + (j // 2) * PIECE_SIZE
+            piece.draw(screen, piece_x, piece_y)
+    
+    def draw_waiting_area(self, screen: pygame.Surface):
+        # 待定区按颜色桶的顺序绘制（与点击检测的区间表一致）
         waiting_x = 950
-        colors = {piece.color for piece in self.waiting_area}  # 获取所有不同的颜色
         current_y = 100  # 从圆盘的高度开始显示
         
         # 先绘制先手棋子（如果在待定区）
-        if self.first_piece in self.waiting_area:
-            self.first_piece.draw(self.screen, waiting_x, current_y)
+        if self.waiting_area.first_piece is not None:
+            self.waiting_area.first_piece.draw(screen, waiting_x, current_y)
             current_y += PIECE_SIZE
         
         # 按颜色分组绘制其他棋子
-        for color in colors:
-            same_color_pieces = [p for p in self.waiting_area if p.color == color and not p.is_first]
+        for color, same_color_pieces in self.waiting_area.buckets.items():
             for piece in same_color_pieces:
-                piece.draw(self.screen, waiting_x, current_y)
+                piece.draw(screen, waiting_x, current_y)
                 current_y += PIECE_SIZE
             # 不同颜色之间留一点间隔
             if same_color_pieces:
                 current_y += 5
-        
+    
+    def draw(self) -> bool:
+        """只重绘状态发生变化的区域，并只提交这些矩形。返回是否更新了屏幕"""
         # 根据游戏状态更新按钮文本和状态
         if self.state == GameState.INIT:
             self.game_button.text = "Start Game"
         else:
             self.game_button.text = "Restart"
         self.game_button.enabled = True  # 按钮始终可用
-        self.game_button.draw(self.screen)
         
-        # 添加游戏状态提示
-        self.draw_game_info()
-        
-        # 绘制分数动画
-        self.draw_score_animations()
-        
-        # 添加提示的绘制
-        self.draw_hints()
-        
-        # 添加错误消息的绘制
-        self.draw_error_message()
-        
-        pygame.display.flip()
+        with self.profiler.section("draw"):
+            dirty_rects = self.renderer.render()
+            if dirty_rects:
+                with self.profiler.section("display update"):
+                    pygame.display.update(dirty_rects)
+        return bool(dirty_rects)
     
     def clear_selection(self):
         """清除所有选择状态"""
@@ -644,18 +933,9 @@ class Game:
         
     def is_valid_board_area(self, pos, current_player) -> bool:
         """检查点击位置是否在当前玩家的有效区域内"""
-        board = self.player1_board if current_player == 1 else self.player2_board
-        
-        # 检查是否在准备区范围内
-        prep_width = 5 * PIECE_SIZE
-        prep_height = 5 * PIECE_SIZE
-        prep_rect = pygame.Rect(board.x, board.y, prep_width, prep_height)
-        
-        # 检查是否在扣分区范围内
-        penalty_width = 7 * PIECE_SIZE
-        penalty_rect = pygame.Rect(board.x, board.y + 200, penalty_width, PIECE_SIZE)
-        
-        return prep_rect.collidepoint(pos) or penalty_rect.collidepoint(pos)
+        # 准备区范围内（包括空白处）或扣分区
+        target = self.hit_test(pos)
+        return bool(target) and target.kind in (BOARD, PREP, FLOOR_TARGET) and target.index == current_player
 
     def check_game_end(self) -> bool:
         """检查游戏是否结束"""
@@ -664,7 +944,11 @@ class Game:
                 self.player2_board.has_complete_row())
     
     def show_game_result(self):
-        """显示游戏结果"""
+        """进入结束状态，结果覆盖层由渲染器绘制，点击任意位置开始新游戏"""
+        self.state = GameState.END
+    
+    def draw_game_result(self, screen: pygame.Surface):
+        """绘制游戏结果"""
         # 确定获胜者
         winner = None
         if self.player1_board.score > self.player2_board.score:
@@ -673,20 +957,18 @@ class Game:
             winner = "Player 2"
         
         # 显示结果
-        font = pygame.font.Font(None, 48)
         if winner:
             text = f"{winner} Wins!"
         else:
             text = "Game Draw!"
-        text_surface = font.render(text, True, BLACK)
+        text_surface = render_text(text, 48, BLACK)
         text_rect = text_surface.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//2))
         
-        # 显示分数
-        score_font = pygame.font.Font(None, 36)
-        score1_text = f"Player 1: {self.player1_board.score}"
-        score2_text = f"Player 2: {self.player2_board.score}"
-        score1_surface = score_font.render(score1_text, True, BLACK)
-        score2_surface = score_font.render(score2_text, True, BLACK)
+        # 显示分数（已包含奖励分）和奖励分明细
+        score1_text = f"Player 1: {self.player1_board.score} ({self.bonus_text(self.player1_board.end_game_bonus())})"
+        score2_text = f"Player 2: {self.player2_board.score} ({self.bonus_text(self.player2_board.end_game_bonus())})"
+        score1_surface = render_text(score1_text, 36, BLACK)
+        score2_surface = render_text(score2_text, 36, BLACK)
         score1_rect = score1_surface.get_rect(centerx=WINDOW_WIDTH//2, 
                                             top=text_rect.bottom + 20)
         score2_rect = score2_surface.get_rect(centerx=WINDOW_WIDTH//2, 
@@ -696,13 +978,12 @@ class Game:
         overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
         overlay.fill((255, 255, 255))
         overlay.set_alpha(200)
-        self.screen.blit(overlay, (0, 0))
-        self.screen.blit(text_surface, text_rect)
-        self.screen.blit(score1_surface, score1_rect)
-        self.screen.blit(score2_surface, score2_rect)
+        screen.blit(overlay, (0, 0))
+        screen.blit(text_surface, text_rect)
+        screen.blit(score1_surface, score1_rect)
+        screen.blit(score2_surface, score2_rect)
         
         # 添加更多游戏统计信息
-        stats_font = pygame.font.Font(None, 24)
         stats_texts = [
             f"Total Rounds: {self.round_count}",
             f"Player 1 Penalties: {sum(1 for p in self.player1_board.penalty_area if p)}",
@@ -713,109 +994,109 @@ class Game:
         
         y = score2_rect.bottom + 20
         for text in stats_texts:
-            text_surface = stats_font.render(text, True, BLACK)
+            text_surface = render_text(text, 24, BLACK)
             text_rect = text_surface.get_rect(centerx=WINDOW_WIDTH//2, top=y)
-            self.screen.blit(text_surface, text_rect)
+            screen.blit(text_surface, text_rect)
             y += 25
-        
-        pygame.display.flip()
-        
-        # 等待点击继续
-        waiting = True
-        while waiting:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    return
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    waiting = False
-        
-        # 重新开始游戏
-        self.__init__()
 
     def calculate_scores(self):
-        self.state = GameState.SCORING
-        game_will_end = False
-        
-        for board in [self.player1_board, self.player2_board]:
-            print(f"\n开始计算 {board.player_name} 的分数")
-            self.show_error_message(f"Scoring {board.player_name}'s board...")
-            pygame.time.wait(1000)
+        """结算本回合：引擎一次性算出所有结算事件，界面通过时间线按顺序播放"""
+        with self.profiler.section("calculate_scores"):
+            self.state = GameState.SCORING
+            events = self.engine.score_round()
+            timeline = self.timeline
+            # 每一步相对上一步的等待时间（毫秒）
+            delay = 0
+        
+            for player, board in enumerate([self.player1_board, self.player2_board]):
+                print(f"\n开始计算 {board.player_name} 的分数")
+                board_events = [event for event in events if event.player == player]
+                timeline.add(delay, lambda board=board: self.show_error_message(f"Scoring {board.player_name}'s board..."))
+                delay = 1000
             
-            # 先处理准备区
-            for row in range(5):
-                if all(piece for piece in board.prep_area[row]):
-                    self.show_error_message(f"Processing row {row + 1}")
-                    pygame.time.wait(500)
-                    
-                    score_positions, waste_pieces = board.score_row(row)
-                    # 将棋子加入废棋堆
-                    self.waste_pool.extend(waste_pieces)
-                    
-                    for row_pos, col_pos, score in score_positions:
-                        # 显示每个位置的得分动画
-                        self.score_animations.append({
-                            'score': score,
-                            'x': board.x + 200 + col_pos * PIECE_SIZE,
-                            'y': board.y + row_pos * PIECE_SIZE,
-                            'start_time': pygame.time.get_ticks()
-                        })
-                        board.score += score
-                        
-                        # 等待动画显示
-                        start_time = pygame.time.get_ticks()
-                        while pygame.time.get_ticks() - start_time < 500:
-                            self.draw()
-                            pygame.event.pump()
-                        
-                        # 每放置一个棋子就检查是否有完整的一行
-                        if board.has_complete_row():
-                            game_will_end = True
-                            self.show_error_message(f"{board.player_name} completed a row!")
-                            pygame.time.wait(1000)
+                # 先处理准备区
+                wall = board.wall_mask
+                for event in board_events:
+                    if event.kind != WALL_EVENT:
+                        continue
+                    timeline.add(delay, lambda event=event: self.show_error_message(f"Processing row {event.row + 1}"))
+                    timeline.add(500, lambda board=board, event=event: self.apply_wall_event(board, event))
+                    delay = 500  # 等待动画显示
+                
+                    # 每放置一个棋子就检查是否有完整的一行
+                    had_complete_row = has_complete_row(wall)
+                    wall |= cell_bit(event.row, event.col)
+                    if has_complete_row(wall) and not had_complete_row:
+                        timeline.add(delay, lambda board=board: self.show_error_message(f"{board.player_name} completed a row!"))
+                        delay = 1000
             
-            # 再处理扣分区
-            self.show_error_message(f"Processing penalty area")
-            pygame.time.wait(500)
-            for i, piece in enumerate(board.penalty_area):
-                if piece:
-                    # 计算扣分
-                    penalty_score = board.penalty_values[i]
-                    self.score_animations.append({
-                        'score': penalty_score,
-                        'x': board.x + i * PIECE_SIZE,
-                        'y': board.y + 200,
-                        'start_time': pygame.time.get_ticks()
-                    })
-                    board.score += penalty_score
-                    
-                    # 将棋子移入废棋堆，但先手棋子除外
-                    if not piece.is_first:
-                        self.waste_pool.append(piece)
-                    else:
-                        # 先手棋子放回待定区
-                        if piece not in self.waiting_area:
-                            self.waiting_area.append(piece)
-                    board.penalty_area[i] = None
-                    
-                    # 等待动画显示
-                    start_time = pygame.time.get_ticks()
-                    while pygame.time.get_ticks() - start_time < 300:
-                        self.draw()
-                        pygame.event.pump()
-        
-        # 等待所有动画完成
-        while self.score_animations:
-            self.draw()
-            pygame.event.pump()
+                # 再处理扣分区
+                timeline.add(delay, lambda: self.show_error_message("Processing penalty area"))
+                delay = 500
+                for event in board_events:
+                    if event.kind != PENALTY_EVENT:
+                        continue
+                    timeline.add(delay, lambda board=board, event=event: self.apply_penalty_event(board, event))
+                    delay = 300
+        
+            # 游戏结束时双方的奖励分
+            for event in events:
+                if event.kind != BONUS_EVENT:
+                    continue
+                board = self.player1_board if event.player == 0 else self.player2_board
+                timeline.add(delay, lambda board=board: self.show_error_message(
+                    f"{board.player_name} bonus: {self.bonus_text(board.end_game_bonus())}"))
+                timeline.add(1000, lambda board=board, event=event: self.apply_bonus_event(board, event))
+                delay = 1000
+        
+            # 等待所有动画完成
+            timeline.add(max(delay, 1000), self.finish_scoring)
+    
+    def add_score_animation(self, score: int, x: int, y: int):
+        """添加一个向上飘动的分数（instant 模式下不显示）"""
+        if self.instant:
+            return
+        self.score_animations.append({
+            'score': score,
+            'x': x,
+            'y': y,
+            'start_time': pygame.time.get_ticks()
+        })
+    
+    def apply_wall_event(self, board: "PlayerBoard", event):
+        """播放一个准备区上墙事件"""
+        board.place_on_wall(event.row, event.col, Piece(COLORS[event.color]))
+        board.prep_area[event.row] = [None] * (event.row + 1)
+        # 显示每个位置的得分动画
+        self.add_score_animation(event.score, board.x + 200 + event.col * PIECE_SIZE, board.y + event.row * PIECE_SIZE)
+        board.score += event.score
+    
+    def apply_penalty_event(self, board: "PlayerBoard", event):
+        """播放一个扣分事件"""
+        self.add_score_animation(event.score, board.x + event.col * PIECE_SIZE, board.y + 200)
+        board.score += event.score
+        board.penalty_area[event.col] = None
+    
+    def apply_bonus_event(self, board: "PlayerBoard", event):
+        """播放游戏结束的奖励分"""
+        self.add_score_animation(event.score, board.x + 200 + 2 * PIECE_SIZE, board.y - 30)
+        board.score += event.score
+    
+    @staticmethod
+    def bonus_text(bonus: EndGameBonus) -> str:
+        row_points, column_points, color_points = bonus.points
+        return f"rows +{row_points}, columns +{column_points}, colors +{color_points}"
+    
+    def finish_scoring(self):
+        """动画播放完毕：同步引擎状态，结束游戏或开始新回合"""
+        self.sync_from_engine()
         
         # 结算完成后显示废弃堆统计
         print("\n结算后废弃堆统计:")
         self.print_waste_pool_stats()
         
         # 在所有结算完成后再结束游戏
-        if game_will_end:
-            self.state = GameState.END
+        if self.engine.game_over:
             self.show_game_result()
         else:
             self.state = GameState.RUNNING
@@ -828,32 +1109,67 @@ class Game:
             'start_time': pygame.time.get_ticks()
         }
         
-    def draw_error_message(self):
-        """绘制错误消息"""
+    def active_error_message(self) -> Optional[str]:
+        """正在显示的错误消息，超过2秒后清除"""
         if hasattr(self, 'error_message'):
             current_time = pygame.time.get_ticks()
             if current_time - self.error_message['start_time'] < 2000:  # 显示2秒
-                font = pygame.font.Font(None, 36)
-                text_surface = font.render(self.error_message['text'], True, (255, 0, 0))
-                text_rect = text_surface.get_rect(centerx=WINDOW_WIDTH//2, top=10)
-                self.screen.blit(text_surface, text_rect)
-            else:
-                del self.error_message
+                return self.error_message['text']
+            del self.error_message
+        return None
+        
+    def draw_error_message(self):
+        """绘制错误消息"""
+        text = self.active_error_message()
+        if text:
+            text_surface = render_text(text, 36, (255, 0, 0))
+            text_rect = text_surface.get_rect(centerx=WINDOW_WIDTH//2, top=10)
+            self.screen.blit(text_surface, text_rect)
                 
+    def profiler_rect(self) -> pygame.Rect:
+        """性能统计层在左下角的空白处"""
+        if self.profiler.enabled and self.profiler.visible:
+            return pygame.Rect(0, 640, 420, 160)
+        return pygame.Rect(0, 0, 0, 0)
+    
+    def profiler_key(self):
+        """统计层每秒刷新一次"""
+        if not (self.profiler.enabled and self.profiler.visible):
+            return None
+        return pygame.time.get_ticks() // 1000
+    
+    def draw_profiler(self, screen: pygame.Surface):
+        """绘制性能统计（数字每次都不同，不放入文字缓存）"""
+        rect = self.profiler_rect()
+        overlay = pygame.Surface(rect.size)
+        overlay.fill((40, 40, 40))
+        overlay.set_alpha(220)
+        screen.blit(overlay, rect.topleft)
+        font = assets.get_font(18)
+        columns = (rect.x + 8, rect.x + 220, rect.x + 290, rect.x + 360)
+        y = rect.y + 6
+        for row in self.profiler.overlay_rows():
+            for x, cell in zip(columns, row):
+                screen.blit(font.render(cell, True, (230, 230, 230)), (x, y))
+            y += 15
+    
     def handle_click(self, pos):
         """处理鼠标点击事件"""
+        if self.state == GameState.END:
+            # 结果画面：点击任意位置开始新游戏
+            self.restart()
+            return
+            
         if self.game_button.is_clicked(pos):
             if self.state == GameState.INIT:
                 self.state = GameState.RUNNING
                 self.start_new_round()
             else:
-                self.__init__()  # 重新初始化游戏
+                self.restart()  # 重新初始化游戏
             return
             
-        if self.state != GameState.RUNNING:
+        if self.state != GameState.RUNNING or self.is_ai_turn():
             return
-            
-        current_board = self.player1_board if self.current_player == 1 else self.player2_board
         
         # 尝试选择新的棋子（即使已经选择了其他棋子）
         # 从圆盘选择
@@ -878,113 +1194,280 @@ class Game:
         # 如果已经选中了棋子，且点击的不是新的棋子，则处理放置逻辑
         if self.selected_color:
             # 检查是否点击了当前玩家的有效区域
+            clicked = self.hit_test(pos)
             if not self.is_valid_board_area(pos, self.current_player):
                 self.show_error_message("Invalid area!")
                 return
             
             # 获取选中的棋子
-            selected_pieces = []
-            if self.selected_disk_index != -1:
-                disk = self.disks[self.selected_disk_index]
-                selected_pieces = [p for p in disk if p.color == self.selected_color]
-            else:
-                selected_pieces = [p for p in self.waiting_area if p.color == self.selected_color and not p.is_first]
-            
-            if not selected_pieces:
+            source = self.selected_disk_index if self.selected_disk_index != -1 else CENTER
+            color = COLOR_IDS[self.selected_color]
+            if not self.engine.count_tiles(source, color):
                 return
             
-            # 检查是否是第一次从待定区选择并放置棋子
-            is_first_waiting_area_placement = (
-                not self.first_player_decided and 
-                self.first_piece in self.waiting_area and 
-                self.selected_disk_index == -1  # 确保是从待定区选的
-            )
-            
-            # 获取点击位置
-            row, col = current_board.get_prep_area_position(pos)
-            penalty_area_clicked = (
-                current_board.x <= pos[0] <= current_board.x + 7 * PIECE_SIZE and
-                current_board.y + 200 <= pos[1] <= current_board.y + 200 + PIECE_SIZE
-            )
-            
             # 处理放置
-            placement_successful = False
-            
-            if penalty_area_clicked:
+            target = None
+            if clicked.kind == FLOOR_TARGET:
                 # 直接放入扣分区
-                for piece in selected_pieces:
-                    for j in range(7):
-                        if not current_board.penalty_area[j]:
-                            current_board.penalty_area[j] = piece
-                            break
-                placement_successful = True
-                
-            elif row != -1:  # 如果点击了准备区
-                if not current_board.can_place_pieces(row, self.selected_color):
-                    if any(piece for piece in current_board.prep_area[row] if piece and piece.color != self.selected_color):
+                target = FLOOR
+            elif clicked.kind == PREP:  # 如果点击了准备区
+                row = clicked.slot
+                player_state = self.engine.players[self.current_player - 1]
+                if not player_state.can_place_pieces(row, color):
+                    if player_state.prep_counts[row] and player_state.prep_colors[row] != color:
                         self.show_error_message("This row already has different color pieces!")
-                    elif any(piece for piece in current_board.scoring_area[row] if piece and piece.color == self.selected_color):
+                    else:
                         self.show_error_message("This color already exists in scoring area!")
                     return
-                # 放入准备区
-                overflow_pieces = current_board.place_pieces(selected_pieces, row)
-                # 处理溢出的棋子
-                for piece in overflow_pieces:
-                    for j in range(7):
-                        if not current_board.penalty_area[j]:
-                            current_board.penalty_area[j] = piece
-                            break
-                placement_successful = True
+                target = row
             
-            if placement_successful:
-                if self.selected_disk_index != -1:
-                    # 从圆盘选择的情况：剩余棋子移到待定区
-                    disk = self.disks[self.selected_disk_index]
-                    remaining_pieces = [p for p in disk if p.color != self.selected_color]
-                    self.waiting_area.extend(remaining_pieces)
-                    self.disks[self.selected_disk_index].clear()
-                else:
-                    # 从待定区选择的情况
-                    # 如果是第一次从待定区选择并成功放置，自动获得先手棋子
-                    if not self.first_player_decided and self.first_piece in self.waiting_area:
-                        self.first_player_decided = True
-                        # 自动将先手棋子放入当前玩家的扣分区
-                        for j in range(7):
-                            if not current_board.penalty_area[j]:
-                                current_board.penalty_area[j] = self.first_piece
-                                self.waiting_area.remove(self.first_piece)
-                                self.show_error_message(f"{current_board.player_name} got the first player token!")
-                                pygame.time.wait(1000)
-                                break
-                    # 移除选中的棋子
-                    self.waiting_area = [p for p in self.waiting_area if p.color != self.selected_color or p.is_first]
-                
-                # 检查是否需要结算
-                if not self.waiting_area and all(not disk for disk in self.disks):
-                    self.show_error_message("Round End - Starting Scoring...")
-                    pygame.time.wait(1000)  # 给用户一个视觉提示
-                    self.state = GameState.SCORING
-                    self.calculate_scores()
-                else:
-                    self.current_player = 3 - self.current_player
+            if target is not None:
+                self.play_move(source, color, target)
             
             # 清除选择状态
             self.clear_selection()
             return
     
+    def play_move(self, source: int, color: int, target: int):
+        """执行一步并处理先手棋子提示和回合结算"""
+        current_board = self.player1_board if self.current_player == 1 else self.player2_board
+        # 溢出的棋子和先手棋子由引擎放入扣分区
+        result = self.engine.play(source, color, target)
+        self.sync_from_engine()
+        if result.took_first_token:
+            self.show_error_message(f"{current_board.player_name} got the first player token!")
+        
+        # 检查是否需要结算（结算后的新回合开始时再记录快照）
+        if not self.engine.is_round_over():
+            self.history.record(self.engine)
+        else:
+            self.show_error_message("Round End - Starting Scoring...")
+            self.state = GameState.SCORING
+            # 给用户一个视觉提示后开始结算，期间界面照常刷新
+            self.timeline.add(1000, self.calculate_scores)
+    
+    def can_rewind(self) -> bool:
+        """只有在等待玩家走棋时才能悔棋或重做（结算动画期间不行）"""
+        return self.state == GameState.RUNNING and not self.timeline.busy
+    
+    def restore(self, snapshot):
+        """恢复到某个快照对应的局面"""
+        self.engine = restore_snapshot(snapshot)
+        self.clear_selection()
+        self.sync_from_engine()
+    
+    def undo(self):
+        """悔棋：回到上一个由人类玩家走棋的局面"""
+        if not self.can_rewind():
+            return
+        snapshot = self.history.undo()
+        while snapshot and self.ai_seat == snapshot.current_player + 1 and self.history.can_undo():
+            snapshot = self.history.undo()
+        if snapshot is None:
+            self.show_error_message("Nothing to undo!")
+            return
+        self.restore(snapshot)
+        self.show_error_message("Undo")
+    
+    def redo(self):
+        """重做被撤销的步骤（连同电脑玩家的走法）"""
+        if not self.can_rewind():
+            return
+        snapshot = self.history.redo()
+        while snapshot and self.ai_seat == snapshot.current_player + 1 and self.history.can_redo():
+            snapshot = self.history.redo()
+        if snapshot is None:
+            self.show_error_message("Nothing to redo!")
+            return
+        self.restore(snapshot)
+        self.show_error_message("Redo")
+    
+    def restart(self):
+        """重新初始化游戏（回放模式下从头回放）。继续使用原来的搜索线程，还在进行的搜索结果会被丢弃"""
+        executor = self.ai_executor
+        self.__init__(self.ai_seat, self.ai_player, self.instant, self.replay, self.replay_speed, self.profiler)
+        self.ai_executor = executor
+    
+    def seek_replay(self, index: int):
+        """显示回放中第 index 步之前的局面，最后一步之后显示最后一回合结算后的局面"""
+        replay = self.replay
+        index = max(0, min(index, len(replay)))
+        if index == self.replay_index:
+            return
+        if self.replay_index < index and replay.round_of(index) == replay.round_of(self.replay_index):
+            # 同一回合内向前：在当前局面上继续走
+            for i in range(self.replay_index, index):
+                self.engine.play(*replay.move(i))
+        else:
+            self.engine = replay.position(index)
+        if index == len(replay) and self.engine.is_round_over():
+            self.engine.score_round()
+        self.replay_index = index
+        self.sync_from_engine()
+    
+    def play_replay(self):
+        """从当前步数开始按 replay_speed 播放"""
+        self.replay_playing = self.replay_index < len(self.replay)
+        self.replay_anchor = (pygame.time.get_ticks(), self.replay_index)
+    
+    def update_replay(self):
+        """根据经过的时间推进回放（跳过多步时直接定位，不逐帧播放）"""
+        if self.state != GameState.REPLAY or not self.replay_playing:
+            return
+        start_time, start_index = self.replay_anchor
+        elapsed = pygame.time.get_ticks() - start_time
+        self.seek_replay(start_index + int(elapsed * self.replay_speed / 1000))
+        if self.replay_index >= len(self.replay):
+            self.replay_playing = False
+    
+    def handle_replay_key(self, key):
+        """空格暂停/继续，左右方向键单步，上下方向键加速/减速"""
+        if key == pygame.K_SPACE:
+            if self.replay_playing:
+                self.replay_playing = False
+            else:
+                if self.replay_index >= len(self.replay):
+                    self.seek_replay(0)
+                self.play_replay()
+        elif key in (pygame.K_LEFT, pygame.K_RIGHT):
+            self.replay_playing = False
+            self.seek_replay(self.replay_index + (1 if key == pygame.K_RIGHT else -1))
+        elif key in (pygame.K_UP, pygame.K_DOWN):
+            self.replay_speed = min(max(self.replay_speed * (2 if key == pygame.K_UP else 0.5), 0.25), 256)
+            if self.replay_playing:
+                self.play_replay()
+    
+    def is_ai_turn(self) -> bool:
+        return self.state == GameState.RUNNING and self.ai_seat == self.current_player
+    
+    def start_ai_search(self):
+        """在后台线程中开始电脑玩家的搜索（使用引擎的副本）"""
+        self.show_error_message(f"Player {self.current_player} is thinking...")
+        engine = self.engine
+        self.ai_search_position = (engine, engine.key)
+        self.ai_search = self.ai_executor.submit(search_move, self.ai_player, engine.copy())
+        self.ai_search.add_done_callback(notify_ai_move_ready)
+    
+    def update_ai_move(self):
+        """轮到电脑玩家时开始搜索；搜索完成后走这一步，局面已经改变（悔棋、重新开始）时丢弃结果"""
+        search = self.ai_search
+        if search is None:
+            if self.is_ai_turn():
+                self.start_ai_search()
+            return
+        if not search.done():
+            return
+        self.ai_search = None
+        move, start, end = search.result()
+        if self.profiler.enabled:
+            self.profiler.record("ai move", start, end)
+        engine, key = self.ai_search_position
+        if self.is_ai_turn() and self.engine is engine and engine.key == key:
+            self.clear_selection()
+            self.play_move(move.source, move.color, move.target)
+        else:
+            self.update_ai_move()
+    
+    def play_ai_move(self):
+        """电脑玩家思考并走一步，等待搜索完成（主循环中使用不阻塞的 update_ai_move）"""
+        if self.ai_search is None:
+            self.start_ai_search()
+        self.ai_search.result()
+        self.update_ai_move()
+    
+    def is_animating(self) -> bool:
+        """是否有需要按帧率刷新的内容（结算时间线、分数动画、消息）或电脑玩家要开始搜索。
+        电脑玩家思考时不需要：搜索完成后 AI_MOVE_READY 事件会唤醒空闲等待"""
+        return (self.timeline.busy or bool(self.active_score_animations())
+                or self.active_error_message() is not None or self.replay_playing
+                or (self.is_ai_turn() and self.ai_search is None))
+    
+    def handle_event(self, event) -> bool:
+        """处理一个事件，返回 False 表示退出"""
+        if event.type == pygame.QUIT:
+            return False
+            
+        if event.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN):
+            self.profiler.input_received()
+        
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            self.mouse_pos = event.pos
+            with self.profiler.section("handle_click"):
+                self.handle_click(event.pos)
+        
+        # F3 显示/隐藏性能统计（需要 --profile）
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3 and self.profiler.enabled:
+            self.profiler.visible = not self.profiler.visible
+        
+        # Ctrl+Z 悔棋，Ctrl+Y 或 Ctrl+Shift+Z 重做
+        if event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL:
+            if event.key == pygame.K_z and not event.mod & pygame.KMOD_SHIFT:
+                self.undo()
+            elif event.key in (pygame.K_y, pygame.K_z):
+                self.redo()
+        
+        if event.type == pygame.KEYDOWN and self.state == GameState.REPLAY:
+            self.handle_replay_key(event.key)
+        
+        # 悬停高亮在下一次绘制时更新
+        if event.type == pygame.MOUSEMOTION:
+            self.mouse_pos = event.pos
+        
+        # 窗口被遮挡后恢复时需要整屏重绘
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self.renderer.invalidate()
+        return True
+    
     def run(self):
+        clock = pygame.time.Clock()
+        profiler = self.profiler
+        stats = FrameStats()
         running = True
         while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                    
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    self.handle_click(event.pos)
-                    
-            self.draw()
+            if self.is_animating():
+                # 有动画时限制帧率
+                with profiler.section("frame wait"):
+                    clock.tick(FPS)
+                events = pygame.event.get()
+            else:
+                # 空闲时阻塞等待事件，超时后再检查一次
+                with profiler.section("idle wait"):
+                    first = pygame.event.wait(IDLE_TIMEOUT)
+                if first.type == pygame.NOEVENT:
+                    stats.idle_wakeups += 1
+                    events = []
+                else:
+                    events = [first] + pygame.event.get()
+            
+            stats.begin()
+            with profiler.section("events"):
+                for event in events:
+                    running = self.handle_event(event) and running
+            
+            # 执行到期的结算步骤，推进回放
+            with profiler.section("timeline"):
+                self.timeline.update()
+                self.update_replay()
+            
+            # 开始电脑玩家的搜索，或者走已经搜索完的一步
+            self.update_ai_move()
             
+            presented = self.draw()
+            profiler.frame_done(presented)
+            stats.end(presented)
+            
+        print(stats.report())
+        if profiler.enabled:
+            print(profiler.summary())
+            if profiler.trace_path:
+                profiler.export_chrome_trace(profiler.trace_path)
+                print(f"Trace written to {profiler.trace_path}")
+        if self.ai_player:
+            # 等待还在进行的搜索结束后再关闭电脑玩家
+            self.ai_executor.shutdown(cancel_futures=True)
+            self.ai_player.close()
         pygame.quit()
+        assets.clear()
 
     def print_waste_pool_stats(self):
         """打印废弃堆中各颜色棋子的数量统计"""
@@ -1042,5 +1525,42 @@ def debug_print_score(row: int, score_positions: List[Tuple[int, int, int]]):
     print("="*50 + "\n")
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(description="花砖物语")
+    parser.add_argument("--ai", type=int, choices=[1, 2], help="由电脑控制的玩家")
+    parser.add_argument("--ai-type", choices=["mcts", "alphabeta", "pipe"], default="mcts",
+                        help="电脑的搜索算法：mcts、回合内 alpha-beta 或外部进程（见 pipebot.py）")
+    parser.add_argument("--ai-time", type=float, default=1.0, help="电脑每步的思考时间（秒）")
+    parser.add_argument("--ai-playouts", type=int, help="电脑每步的模拟次数上限")
+    parser.add_argument("--ai-workers", type=int, default=1, help="电脑根并行搜索的进程数")
+    parser.add_argument("--ai-depth", type=int, default=64, help="alpha-beta 的最大搜索深度")
+    parser.add_argument("--ai-command", help="外部电脑玩家的启动命令（--ai-type pipe）")
+    parser.add_argument("--ai-endgame", type=int, metavar="N", help="桌面剩余棋子不超过 N 颗时电脑改用精确求解")
+    parser.add_argument("--instant", action="store_true", help="跳过结算动画，立即应用结算结果")
+    parser.add_argument("--profile", action="store_true", help="记录主循环各阶段的耗时并显示统计（F3 显示/隐藏）")
+    parser.add_argument("--trace", metavar="FILE", help="退出时把性能记录导出为 Chrome trace JSON（包含 --profile）")
+    parser.add_argument("--replay", help="回放对局记录文件（见 tournament.py --replays）")
+    parser.add_argument("--replay-game", type=int, default=0, help="回放记录文件中的第几局（从0开始）")
+    parser.add_argument("--replay-speed", type=float, default=REPLAY_SPEED, help="回放速度（每秒步数）")
+    args = parser.parse_args()
+    
+    replay = None
+    if args.replay:
+        replays = load_replays(args.replay)
+        if not 0 <= args.replay_game < len(replays):
+            parser.error(f"{args.replay} contains {len(replays)} games")
+        replay = replays[args.replay_game]
+    
+    ai_player = None
+    if args.ai and args.ai_type == "pipe":
+        if not args.ai_command:
+            parser.error("--ai-type pipe needs --ai-command")
+        ai_player = PipeBot(args.ai_command)
+    elif args.ai and args.ai_type == "alphabeta":
+        ai_player = AlphaBetaPlayer(time_limit=args.ai_time, max_depth=args.ai_depth)
+    elif args.ai:
+        ai_player = MCTSPlayer(time_limit=args.ai_time, playouts=args.ai_playouts, workers=args.ai_workers)
+    if ai_player is not None and args.ai_endgame:
+        ai_player = EndgamePlayer(ai_player, args.ai_endgame)
+    profiler = Profiler(enabled=args.profile or bool(args.trace), trace_path=args.trace)
+    game = Game(args.ai, ai_player, args.instant, replay, args.replay_speed, profiler)
     game.run() 
\ No newline at end of file
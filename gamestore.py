@@ -0,0 +1,361 @@
+"""
+基于内存映射的对局数据库
+
+对局记录（见 replay.py）导入后保存为两个只追加的定长记录文件，通过 mmap 直接作为
+NumPy 结构化数组读取，查询时不需要把记录转换成 Python 对象：
+
+    positions.bin   每个需要走棋的局面一条记录（POSITION_DTYPE），同一局的局面连续存放
+    games.bin       每局一条结果记录（GAME_DTYPE），记录该局局面的起始位置和数量
+    bots.txt        电脑玩家描述，行号就是记录中的玩家编号
+
+二级索引（index/ 目录下的 .npy 文件）按键排序保存行号，用二分查找定位：
+玩家编号、最终分数、回合数、扣分区棋子数（按局）以及回合（按局面）。
+数据库增长后索引在下一次查询时增量更新。
+
+同一时间只能有一个进程写入；写入顺序是先局面后结果，中途崩溃留下的多余局面在下次打开时截掉。
+
+用法：
+    python gamestore.py ingest games.db games.azr
+    python gamestore.py query games.db --round 3 --min-floor 5 --bot greedy
+"""
+import argparse
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from engine import NUM_COLORS, NUM_DISKS, NUM_ROWS, PENALTY_EVENT
+from replay import Replay, load_replays, unpack_state
+
+MAGIC = b"AZST"
+VERSION = 1
+# 魔数、版本、文件类型、记录长度、保留
+HEADER = struct.Struct("<4sHHII")
+POSITIONS_KIND = 0
+GAMES_KIND = 1
+
+POSITION_DTYPE = np.dtype([
+    ("game", "<u4"),
+    ("ply", "<u2"),                           # 本局的第几步（从0开始）
+    ("round", "u1"),
+    ("to_move", "u1"),                        # 轮到的玩家
+    ("move", "u1"),                           # 这个局面下走的一步，编码见 replay.encode_move
+    ("first_token_in_center", "u1"),
+    ("bag", "u1", NUM_COLORS),
+    ("discard", "u1", NUM_COLORS),
+    ("disks", "u1", (NUM_DISKS, NUM_COLORS)),
+    ("center", "u1", NUM_COLORS),
+    ("score", "<i2", 2),
+    ("wall", "<u4", 2),
+    ("floor", "u1", 2),                       # 扣分区的棋子数（包括先手棋子）
+    ("prep_colors", "i1", (2, NUM_ROWS)),
+    ("prep_counts", "u1", (2, NUM_ROWS)),
+])
+
+GAME_DTYPE = np.dtype([
+    ("seed", "<i8"),
+    ("bots", "<u2", 2),                       # 两个座位的玩家编号
+    ("scores", "<i2", 2),
+    ("winner", "i1"),                         # -1 表示平局
+    ("rounds", "u1"),
+    ("penalties", "u1", 2),                   # 整局进入扣分区的棋子数
+    ("penalty_points", "<i2", 2),
+    ("first_position", "<u8"),
+    ("num_positions", "<u2"),
+])
+
+# 索引名 -> (文件, 字段)。按局的索引中每个座位一项，行号是局的编号
+INDEXES = {
+    "bot": ("games", "bots"),
+    "score": ("games", "scores"),
+    "rounds": ("games", "rounds"),
+    "penalties": ("games", "penalties"),
+    "round": ("positions", "round"),
+}
+
+# 顺序扫描局面时每块的记录数
+SCAN_CHUNK = 1 << 20
+
+
+def _open_records(path: str, kind: int, dtype: np.dtype) -> int:
+    """创建或检查记录文件，返回完整记录的数量"""
+    if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, kind, dtype.itemsize, 0))
+        return 0
+    with open(path, "rb") as f:
+        magic, version, file_kind, itemsize, _ = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or file_kind != kind or itemsize != dtype.itemsize:
+        raise ValueError(f"{path} is not a compatible record file")
+    return (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+
+
+def _map(path: str, dtype: np.dtype, count: int) -> np.ndarray:
+    """把记录文件映射为只读的结构化数组（不复制）"""
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=HEADER.size, shape=(count,))
+
+
+def game_records(replay: Replay):
+    """把一局对局展开为 (局面记录数组, 结果字段)，每个需要走棋的局面一条记录"""
+    positions = []
+    penalties = [0, 0]
+    penalty_points = [0, 0]
+    ply = 0
+    ends = replay.round_starts[1:] + [len(replay)]
+    engine = None
+    for keyframe, start, end in zip(replay.keyframes, replay.round_starts, ends):
+        engine = unpack_state(replay.data, keyframe, replay.names)
+        for code in replay.moves[start:end]:
+            boards = engine.players
+            positions.append((
+                0, ply, engine.round_count, engine.current_player, code, engine.first_token_in_center,
+                engine.bag, engine.discard, engine.disks, engine.center,
+                [board.score for board in boards], [board.wall for board in boards],
+                [len(board.floor) for board in boards],
+                [board.prep_colors for board in boards], [board.prep_counts for board in boards],
+            ))
+            engine.play(*replay.move(ply))
+            ply += 1
+        if engine.is_round_over():
+            for event in engine.score_round():
+                if event.kind == PENALTY_EVENT:
+                    penalties[event.player] += 1
+                    penalty_points[event.player] += event.score
+
+    if replay.result is not None:
+        scores, rounds = list(replay.result[:2]), replay.result[2]
+    else:
+        scores = [board.score for board in engine.players] if engine else [0, 0]
+        rounds = len(replay.keyframes)
+    winner = -1 if scores[0] == scores[1] else int(scores[1] > scores[0])
+    result = dict(seed=replay.seed or 0, scores=scores, winner=winner, rounds=rounds,
+                  penalties=penalties, penalty_points=penalty_points)
+    return np.array(positions, dtype=POSITION_DTYPE), result
+
+
+class GameStore:
+    """只追加的对局数据库，positions 和 games 是映射到文件的结构化数组"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.join(path, "index"), exist_ok=True)
+        self.positions_path = os.path.join(path, "positions.bin")
+        self.games_path = os.path.join(path, "games.bin")
+        self.bots_path = os.path.join(path, "bots.txt")
+        self.bots: List[str] = []
+        if os.path.exists(self.bots_path):
+            with open(self.bots_path, encoding="utf-8") as f:
+                self.bots = [line.rstrip("\n") for line in f]
+        self.bot_ids: Dict[str, int] = {name: i for i, name in enumerate(self.bots)}
+        self._recover()
+        self.refresh()
+
+    def _recover(self):
+        """截掉写了一半的记录和没有结果记录的局面"""
+        num_games = _open_records(self.games_path, GAMES_KIND, GAME_DTYPE)
+        num_positions = _open_records(self.positions_path, POSITIONS_KIND, POSITION_DTYPE)
+        if num_games:
+            last = _map(self.games_path, GAME_DTYPE, num_games)[-1]
+            expected = int(last["first_position"]) + int(last["num_positions"])
+            del last
+        else:
+            expected = 0
+        if num_positions < expected:
+            raise ValueError(f"{self.positions_path} is missing positions")
+        for path, dtype, count in ((self.games_path, GAME_DTYPE, num_games),
+                                   (self.positions_path, POSITION_DTYPE, expected)):
+            size = HEADER.size + count * dtype.itemsize
+            if os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+    def refresh(self):
+        """重新映射文件（其他进程追加记录后调用）"""
+        num_games = _open_records(self.games_path, GAMES_KIND, GAME_DTYPE)
+        self.games = _map(self.games_path, GAME_DTYPE, num_games)
+        if num_games:
+            num_positions = int(self.games[-1]["first_position"]) + int(self.games[-1]["num_positions"])
+        else:
+            num_positions = 0
+        self.positions = _map(self.positions_path, POSITION_DTYPE, num_positions)
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def bot_id(self, name: str, create: bool = False) -> Optional[int]:
+        if name not in self.bot_ids and create:
+            with open(self.bots_path, "a", encoding="utf-8") as f:
+                f.write(name.replace("\n", " ") + "\n")
+            self.bot_ids[name] = len(self.bots)
+            self.bots.append(name)
+        return self.bot_ids.get(name)
+
+    # ------------------------------------------------------------------
+    # 写入
+
+    def add_replays(self, replays: Sequence[Replay]) -> int:
+        """导入对局记录，返回导入的局数"""
+        first_game = len(self.games)
+        first_position = len(self.positions)
+        games = np.zeros(len(replays), dtype=GAME_DTYPE)
+        with open(self.positions_path, "ab") as out:
+            for i, replay in enumerate(replays):
+                positions, result = game_records(replay)
+                positions["game"] = first_game + i
+                out.write(positions.tobytes())
+                record = games[i]
+                for name, value in result.items():
+                    record[name] = value
+                record["bots"] = [self.bot_id(name, create=True) for name in replay.names]
+                record["first_position"] = first_position
+                record["num_positions"] = len(positions)
+                first_position += len(positions)
+        with open(self.games_path, "ab") as out:
+            out.write(games.tobytes())
+        self.refresh()
+        return len(replays)
+
+    # ------------------------------------------------------------------
+    # 索引
+
+    def _index_files(self, name: str):
+        base = os.path.join(self.path, "index", name)
+        return base + ".keys.npy", base + ".rows.npy"
+
+    def index(self, name: str):
+        """返回 (排序后的键, 对应的行号)，数据库增长后先合并新增的记录"""
+        table, field = INDEXES[name]
+        records = self.games if table == "games" else self.positions
+        keys_path, rows_path = self._index_files(name)
+        columns = 1 if records.dtype[field].shape == () else records.dtype[field].shape[0]
+        if os.path.exists(rows_path):
+            keys = np.load(keys_path, mmap_mode="r")
+            rows = np.load(rows_path, mmap_mode="r")
+        else:
+            keys = np.zeros(0, dtype=records.dtype[field].base)
+            rows = np.zeros(0, dtype=np.int64)
+        covered = len(rows) // columns
+        if covered > len(records):
+            raise ValueError(f"Index {name} is newer than the store")
+        if covered < len(records):
+            new_keys = np.asarray(records[field][covered:]).reshape(-1)
+            new_rows = np.repeat(np.arange(covered, len(records), dtype=np.int64), columns)
+            # 只排序新增的一段，再按二分查找的位置插入已有的有序索引（一次线性合并）。
+            # 新行号都比已有的大，插在相同的键之后，同一个键的行号仍然升序
+            order = np.argsort(new_keys, kind="stable")
+            new_keys, new_rows = new_keys[order], new_rows[order]
+            at = np.searchsorted(keys, new_keys, side="right")
+            keys = np.insert(keys, at, new_keys)
+            rows = np.insert(rows, at, new_rows)
+            for path, values in ((keys_path, keys), (rows_path, rows)):
+                # 先写临时文件再替换，已经映射的旧索引不受影响
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, values)
+                os.replace(path + ".tmp", path)
+        return keys, rows
+
+    def lookup(self, name: str, low, high=None) -> np.ndarray:
+        """键在 [low, high] 之间的行号（去重并排序），high 省略时只匹配 low"""
+        keys, rows = self.index(name)
+        start = np.searchsorted(keys, low, side="left")
+        end = np.searchsorted(keys, low if high is None else high, side="right")
+        table, field = INDEXES[name]
+        if high is None and table == "positions":
+            # 同一个键的行号按稳定排序保持升序，每行只有一项
+            return np.array(rows[start:end])
+        return np.unique(rows[start:end])
+
+    # ------------------------------------------------------------------
+    # 查询
+
+    def games_with_bot(self, name: str) -> np.ndarray:
+        bot = self.bot_id(name)
+        return np.zeros(0, dtype=np.int64) if bot is None else self.lookup("bot", bot)
+
+    def game_positions(self, games: np.ndarray) -> np.ndarray:
+        """若干局的全部局面的行号"""
+        if not len(games):
+            return np.zeros(0, dtype=np.int64)
+        starts = self.games["first_position"][games].astype(np.int64)
+        counts = self.games["num_positions"][games].astype(np.int64)
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return offsets + np.arange(counts.sum(), dtype=np.int64)
+
+    def scan(self, predicate, rows: Optional[np.ndarray] = None, chunk: int = SCAN_CHUNK) -> Iterator[np.ndarray]:
+        """按块筛选局面，predicate 接收一块结构化数组、返回布尔数组，逐块产生满足条件的行号"""
+        if rows is None:
+            for start in range(0, len(self.positions), chunk):
+                block = self.positions[start:start + chunk]
+                yield np.flatnonzero(predicate(block)) + start
+        else:
+            for start in range(0, len(rows), chunk):
+                part = rows[start:start + chunk]
+                yield part[predicate(self.positions[part])]
+
+    def find_positions(self, round: Optional[int] = None, min_floor: Optional[int] = None,
+                       player: Optional[int] = None, games: Optional[np.ndarray] = None) -> np.ndarray:
+        """满足条件的局面行号。min_floor 检查 player（省略时任意一方）扣分区的棋子数"""
+        rows = None
+        if round is not None:
+            rows = self.lookup("round", round)
+        if games is not None:
+            in_games = self.game_positions(games)
+            rows = in_games if rows is None else np.intersect1d(rows, in_games, assume_unique=True)
+
+        def predicate(block):
+            mask = np.ones(len(block), dtype=bool)
+            if min_floor is not None:
+                floor = block["floor"]
+                mask &= (floor[:, player] if player is not None else floor.max(axis=1)) >= min_floor
+            return mask
+
+        parts = list(self.scan(predicate, rows))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对局数据库")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="导入对局记录文件（tournament.py --replays）")
+    ingest.add_argument("store")
+    ingest.add_argument("replays", nargs="+")
+    query = commands.add_parser("query", help="查询局面和对局")
+    query.add_argument("store")
+    query.add_argument("--bot", help="只看有这个电脑玩家参加的对局")
+    query.add_argument("--min-score", type=int, help="任意一方最终分数不低于此值的对局")
+    query.add_argument("--rounds", type=int, help="回合数等于此值的对局")
+    query.add_argument("--min-penalties", type=int, help="任意一方整局扣分区棋子数不低于此值的对局")
+    query.add_argument("--round", type=int, help="局面所在的回合")
+    query.add_argument("--min-floor", type=int, help="任意一方扣分区棋子数不低于此值的局面")
+    args = parser.parse_args()
+
+    store = GameStore(args.store)
+    if args.command == "ingest":
+        for path in args.replays:
+            count = store.add_replays(load_replays(path))
+            print(f"{path}: {count} games")
+        print(f"{len(store)} games, {len(store.positions)} positions")
+        return
+
+    games = None
+    filters = [
+        (args.bot, lambda: store.games_with_bot(args.bot)),
+        (args.min_score, lambda: store.lookup("score", args.min_score, np.iinfo(np.int16).max)),
+        (args.rounds, lambda: store.lookup("rounds", args.rounds)),
+        (args.min_penalties, lambda: store.lookup("penalties", args.min_penalties, np.iinfo(np.uint8).max)),
+    ]
+    for value, find in filters:
+        if value is not None:
+            found = find()
+            games = found if games is None else np.intersect1d(games, found, assume_unique=True)
+    if games is not None:
+        print(f"{len(games)} games")
+    if args.round is not None or args.min_floor is not None:
+        rows = store.find_positions(args.round, args.min_floor, games=games)
+        print(f"{len(rows)} positions in {len(np.unique(store.positions['game'][rows]))} games")
+
+
+if __name__ == "__main__":
+    main()
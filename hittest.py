@@ -0,0 +1,90 @@
+"""
+点击检测索引
+
+界面布局固定的部分（按钮、圆盘上的棋子位置、准备区各行、扣分区格子）在布局变化时
+放入均匀网格：每个网格单元只记录与它相交的少数几个矩形，查询时直接定位单元，与目标数量无关。
+待定区的布局随棋子数量变化，使用按 y 坐标排序的区间表，内容变化时重建。
+"""
+from bisect import bisect_right
+from typing import List, NamedTuple, Optional, Tuple
+
+import pygame
+
+# 目标类型
+BUTTON = "button"
+DISK = "disk"
+CENTER = "center"
+PREP = "prep"
+FLOOR = "floor"
+BOARD = "board"     # 玩家板上准备区的空白处（有效区域，但不是具体的行）
+
+
+class HitTarget(NamedTuple):
+    """点击目标。DISK: (圆盘, 位置)；CENTER: (颜色编号, 组序号)；PREP: (玩家, 行)；FLOOR: (玩家, 格子)"""
+    kind: str
+    index: int = 0
+    slot: int = 0
+
+
+class GridIndex:
+    """固定布局的均匀网格索引，后加入的矩形在上层"""
+
+    def __init__(self, width: int, height: int, cell: int = 16):
+        self.width = width
+        self.height = height
+        self.cell = cell
+        self.columns = (width + cell - 1) // cell
+        rows = (height + cell - 1) // cell
+        self.cells: List[List[Tuple[pygame.Rect, HitTarget]]] = [[] for _ in range(self.columns * rows)]
+
+    def add(self, rect: pygame.Rect, target: HitTarget):
+        cell = self.cell
+        clipped = rect.clip(pygame.Rect(0, 0, self.width, self.height))
+        if not clipped.width or not clipped.height:
+            return
+        for row in range(clipped.top // cell, (clipped.bottom - 1) // cell + 1):
+            for col in range(clipped.left // cell, (clipped.right - 1) // cell + 1):
+                # 插入到开头，查询时先遇到上层的矩形
+                self.cells[row * self.columns + col].insert(0, (rect, target))
+
+    def lookup(self, pos) -> Optional[HitTarget]:
+        x, y = pos
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        for rect, target in self.cells[(y // self.cell) * self.columns + x // self.cell]:
+            if rect.collidepoint(x, y):
+                return target
+        return None
+
+
+class IntervalTable:
+    """一列纵向排列的目标（待定区），按起始 y 坐标二分查找"""
+
+    def __init__(self, x: int, width: int):
+        self.x = x
+        self.width = width
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.targets: List[HitTarget] = []
+
+    def add(self, top: int, height: int, target: HitTarget):
+        """按 y 从小到大加入区间"""
+        self.starts.append(top)
+        self.ends.append(top + height)
+        self.targets.append(target)
+
+    def span(self, target: HitTarget) -> Optional[pygame.Rect]:
+        """某个目标占据的矩形"""
+        for start, end, other in zip(self.starts, self.ends, self.targets):
+            if other == target:
+                return pygame.Rect(self.x, start, self.width, end - start)
+        return None
+
+    def lookup(self, pos) -> Optional[HitTarget]:
+        x, y = pos
+        if not self.x <= x < self.x + self.width:
+            return None
+        i = bisect_right(self.starts, y) - 1
+        if i >= 0 and y < self.ends[i]:
+            return self.targets[i]
+        return None
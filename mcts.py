@@ -0,0 +1,216 @@
+"""
+蒙特卡洛树搜索（MCTS）电脑玩家
+
+每步可以限制思考时间或模拟次数。回合结束时的发牌是随机事件：
+树中对应一个机会节点，每次经过时从棋子池中抽取一种发牌结果，
+最多保留 max_outcomes 种，之后在已有结果中随机选择。
+
+workers > 1 时使用根并行：多个进程各自独立建树，最后合并根节点各走法的访问次数。
+"""
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from engine import AzulEngine
+from moves import Move, generate_moves
+
+# 随机模拟的回合上限，防止异常局面无法结束
+MAX_ROLLOUT_ROUNDS = 30
+
+
+class Node:
+    """搜索树节点。player 为走出 move 的玩家，机会节点的 player 为 None"""
+    __slots__ = ("move", "player", "deal", "children", "untried", "outcomes", "visits", "value")
+
+    def __init__(self, move: Optional[Move] = None, player: Optional[int] = None,
+                 deal: Optional[Tuple[Tuple[int, ...], ...]] = None):
+        self.move = move
+        self.player = player
+        self.deal = deal                    # 机会节点的发牌结果
+        self.children: List["Node"] = []
+        self.untried: Optional[List[Move]] = None
+        self.outcomes: Dict[tuple, "Node"] = {}   # 本节点之后回合结束时的发牌结果
+        self.visits = 0
+        self.value = 0.0
+
+
+def rollout_move(state: AzulEngine, rng: random.Random) -> Move:
+    """随机模拟的走法：尽量选择不会溢出到扣分区的走法"""
+    moves = generate_moves(state)
+    good = [move for move in moves if not move.overflow]
+    return rng.choice(good or moves)
+
+
+def reward(winner: Optional[int], player: int) -> float:
+    """对局结果对某个玩家的收益：胜1，平0.5，负0"""
+    if winner is None:
+        return 0.5
+    return 1.0 if winner == player else 0.0
+
+
+class MCTSSearch:
+    """单棵搜索树"""
+
+    def __init__(self, root_state: AzulEngine, exploration: float = 1.4,
+                 max_outcomes: int = 8, seed: Optional[int] = None):
+        self.root_state = root_state
+        self.root = Node()
+        self.exploration = exploration
+        self.max_outcomes = max_outcomes
+        self.rng = random.Random(seed)
+        self.playouts = 0
+
+    def run(self, time_limit: Optional[float] = None, playouts: Optional[int] = None):
+        """搜索直到用完时间或模拟次数"""
+        if time_limit is None and playouts is None:
+            raise ValueError("Need a time limit or a playout budget")
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        while playouts is None or self.playouts < playouts:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            self.playout()
+
+    def playout(self):
+        """一次完整的选择、扩展、模拟和回传"""
+        state = self.root_state.copy()
+        # 使用搜索自己的随机数，不影响真实对局的发牌
+        state.rng = self.rng
+        node = self.root
+        path = [node]
+
+        while not state.game_over:
+            if state.is_round_over():
+                state.score_round()
+                if state.game_over:
+                    break
+                node = self.chance_child(node, state)
+                path.append(node)
+                continue
+            if node.untried is None:
+                node.untried = generate_moves(state)
+                self.rng.shuffle(node.untried)
+            if node.untried:
+                # 扩展
+                move = node.untried.pop()
+                child = Node(move, state.current_player)
+                state._play(move.source, move.color, move.target)
+                node.children.append(child)
+                path.append(child)
+                break
+            node = self.select(node)
+            state._play(node.move.source, node.move.color, node.move.target)
+            path.append(node)
+
+        winner = self.rollout(state)
+        for visited in path:
+            visited.visits += 1
+            if visited.player is not None:
+                visited.value += reward(winner, visited.player)
+        self.playouts += 1
+
+    def select(self, node: Node) -> Node:
+        """UCT选择"""
+        log_visits = math.log(node.visits)
+        best = None
+        best_score = -1.0
+        for child in node.children:
+            score = child.value / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    def chance_child(self, node: Node, state: AzulEngine) -> Node:
+        """回合结束后的发牌：抽取新结果或在已有结果中随机选择"""
+        if len(node.outcomes) < self.max_outcomes:
+            state.start_new_round()
+            deal = tuple(tuple(disk) for disk in state.disks)
+            child = node.outcomes.get(deal)
+            if child is None:
+                child = node.outcomes[deal] = Node(deal=deal)
+            return child
+        child = self.rng.choice(list(node.outcomes.values()))
+        state.start_new_round(child.deal)
+        return child
+
+    def rollout(self, state: AzulEngine) -> Optional[int]:
+        """随机模拟到对局结束，返回获胜玩家"""
+        rng = self.rng
+        while not state.game_over and state.round_count <= MAX_ROLLOUT_ROUNDS:
+            if state.is_round_over():
+                state.finish_round()
+                continue
+            move = rollout_move(state, rng)
+            state._play(move.source, move.color, move.target)
+        return state.winner()
+
+    def visit_counts(self) -> Dict[Tuple[int, int, int], int]:
+        """根节点各走法的访问次数，键为 (来源, 颜色, 目标)"""
+        return {child.move[:3]: child.visits for child in self.root.children}
+
+
+def _search_worker(state: AzulEngine, time_limit: Optional[float], playouts: Optional[int],
+                   exploration: float, max_outcomes: int, seed: int) -> Dict[Tuple[int, int, int], int]:
+    """进程池中运行的一棵独立搜索树"""
+    search = MCTSSearch(state, exploration, max_outcomes, seed)
+    search.run(time_limit, playouts)
+    return search.visit_counts()
+
+
+class MCTSPlayer:
+    """使用MCTS选择走法的电脑玩家
+
+    参数:
+        time_limit (float): 每步思考时间（秒），None 表示只按模拟次数限制
+        playouts (int): 每步（每个进程）的模拟次数，None 表示只按时间限制
+        workers (int): 根并行的进程数，1 表示在当前进程中搜索
+    """
+
+    def __init__(self, time_limit: Optional[float] = 1.0, playouts: Optional[int] = None,
+                 workers: int = 1, exploration: float = 1.4, max_outcomes: int = 8,
+                 seed: Optional[int] = None):
+        self.time_limit = time_limit
+        self.playouts = playouts
+        self.workers = workers
+        self.exploration = exploration
+        self.max_outcomes = max_outcomes
+        self.rng = random.Random(seed)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.last_visits: Dict[Tuple[int, int, int], int] = {}
+
+    def choose_move(self, engine: AzulEngine) -> Move:
+        """为当前玩家选择一步走法"""
+        moves = generate_moves(engine)
+        if len(moves) == 1:
+            return moves[0]
+
+        state = engine.copy()
+        state.rng = random.Random()
+        seeds = [self.rng.getrandbits(32) for _ in range(self.workers)]
+        if self.workers == 1:
+            visits = _search_worker(state, self.time_limit, self.playouts,
+                                    self.exploration, self.max_outcomes, seeds[0])
+        else:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers)
+            futures = [self.executor.submit(_search_worker, state, self.time_limit, self.playouts,
+                                            self.exploration, self.max_outcomes, seed)
+                       for seed in seeds]
+            visits = {}
+            for future in futures:
+                for key, count in future.result().items():
+                    visits[key] = visits.get(key, 0) + count
+
+        self.last_visits = visits
+        by_key = {move[:3]: move for move in moves}
+        if not visits:
+            return self.rng.choice(moves)
+        best = max(visits, key=lambda key: visits[key])
+        return by_key[best]
+
+    def close(self):
+        """关闭进程池"""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,73 @@
+"""
+合法走法生成
+
+一步走法是 (来源, 颜色, 目标)：来源是圆盘序号或 CENTER，目标是准备区的行或 FLOOR。
+准备区的可选颜色来自 PlayerState.allowed，它在放置和结算时增量更新，
+所以生成走法时不需要再检查准备区和结算区。
+
+放入已满的准备区行和直接放入扣分区结果相同，play() 两种都接受，generate_moves 只生成后者；
+检查外部走法（服务器、管道电脑玩家）时先用 canonical_move 换成后者再和 generate_moves 比较。
+"""
+from typing import List, NamedTuple, Tuple
+
+from engine import AzulEngine, CENTER, FLOOR, NUM_COLORS, NUM_DISKS, NUM_ROWS
+
+
+class Move(NamedTuple):
+    """一步走法及其结果"""
+    source: int     # 圆盘序号或 CENTER
+    color: int
+    target: int     # 准备区行号或 FLOOR
+    count: int      # 拿到的棋子数
+    overflow: int   # 进入扣分区的棋子数
+
+
+# 跳过 NamedTuple 的 Python 层构造函数，直接构造元组
+_new_move = tuple.__new__
+
+
+def generate_moves(engine: AzulEngine) -> List[Move]:
+    """列出当前玩家的所有合法走法
+
+    放入已满的准备区行和直接放入扣分区结果相同，只生成后者。
+    """
+    board = engine.players[engine.current_player]
+    allowed = board.allowed
+    prep_counts = board.prep_counts
+
+    # 每种颜色可以放入的行及空格数
+    targets = [[] for _ in range(NUM_COLORS)]
+    for row in range(NUM_ROWS):
+        mask = allowed[row]
+        if mask:
+            free = row + 1 - prep_counts[row]
+            for color in range(NUM_COLORS):
+                if mask >> color & 1:
+                    targets[color].append((row, free))
+
+    moves = []
+    sources = [(disk_index, engine.disks[disk_index]) for disk_index in range(NUM_DISKS)]
+    sources.append((CENTER, engine.center))
+    for source, counts in sources:
+        for color in range(NUM_COLORS):
+            count = counts[color]
+            if not count:
+                continue
+            for row, free in targets[color]:
+                moves.append(_new_move(Move, (source, color, row, count, count - free if count > free else 0)))
+            moves.append(_new_move(Move, (source, color, FLOOR, count, count)))
+    return moves
+
+
+def canonical_move(engine: AzulEngine, source: int, color: int, target: int) -> Tuple[int, int, int]:
+    """放入当前玩家已满的同色准备区行的走法换成放入扣分区的走法，其他走法不变"""
+    if 0 <= target < NUM_ROWS:
+        board = engine.players[engine.current_player]
+        if board.prep_counts[target] == target + 1 and board.prep_colors[target] == color:
+            return source, color, FLOOR
+    return source, color, target
+
+
+def apply_move(engine: AzulEngine, move: Move):
+    """执行走法"""
+    return engine.play(move.source, move.color, move.target)
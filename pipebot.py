@@ -0,0 +1,256 @@
+"""
+外部电脑玩家的管道协议
+
+外部进程通过标准输入/输出按行通信（类似 UCI）。主机发送局面和合法走法，电脑玩家回复走法：
+
+    主机                                    电脑玩家
+    azul                                    id name <名字>
+                                            azulok
+    isready                                 readyok
+    newgame
+    position <局面> moves <走法> ...
+    go                                      bestmove <走法>
+    batch <n>
+    <编号> <局面> <走法> ...                （共 n 行）
+                                            bestmove <编号> <走法>（共 n 行，与请求的顺序相同）
+    quit
+
+局面是 replay.py 的关键帧（KEYFRAME 结构，包含双方棋盘和桌面）的十六进制文本，
+Python 电脑玩家可以用 replay.unpack_state 直接恢复引擎。
+走法是三个字符：来源（圆盘 0-4 或待定区 c）、颜色（B Y R K W）、目标（准备区 1-5 或扣分区 f），
+例如 2R3 表示从 2 号圆盘拿走红色放入第 3 行。
+
+批量模式一次发送多个局面，一个常驻的电脑玩家进程可以同时为很多局走棋，
+不需要为每一步往返一次或启动进程。
+
+用法：
+    python pipebot.py serve greedy                        把内置电脑玩家包装成管道电脑玩家
+    python tournament.py "pipe:python pipebot.py serve greedy" random --workers 1
+    python pipebot.py batch "python pipebot.py serve greedy" --games 200
+"""
+import argparse
+import shlex
+import subprocess
+import sys
+import time
+from typing import List, Optional, Sequence, TextIO, Tuple
+
+from engine import AzulEngine, CENTER, FLOOR, MAX_ROUNDS, NUM_DISKS
+from moves import Move, canonical_move, generate_moves
+from replay import pack_state, unpack_state
+
+COLOR_LETTERS = "BYRKW"
+CENTER_LETTER = "c"
+FLOOR_LETTER = "f"
+NAMES = ("Player 1", "Player 2")
+
+
+def format_move(source: int, color: int, target: int) -> str:
+    return ((CENTER_LETTER if source == CENTER else str(source)) + COLOR_LETTERS[color]
+            + (FLOOR_LETTER if target == FLOOR else str(target + 1)))
+
+
+def parse_move(text: str):
+    """返回 (来源, 颜色, 目标)，格式错误时抛出 ValueError"""
+    if len(text) != 3 or text[1] not in COLOR_LETTERS:
+        raise ValueError(f"Bad move: {text!r}")
+    source = CENTER if text[0] == CENTER_LETTER else int(text[0])
+    target = FLOOR if text[2] == FLOOR_LETTER else int(text[2]) - 1
+    if not (source == CENTER or 0 <= source < NUM_DISKS) or not 0 <= target <= FLOOR:
+        raise ValueError(f"Bad move: {text!r}")
+    return source, COLOR_LETTERS.index(text[1]), target
+
+
+def format_position(engine: AzulEngine) -> str:
+    return pack_state(engine).hex()
+
+
+def parse_position(text: str) -> AzulEngine:
+    return unpack_state(bytes.fromhex(text), 0, NAMES)
+
+
+def position_line(engine: AzulEngine, moves: Sequence[Move]) -> str:
+    """<局面> <走法> ..."""
+    return " ".join([format_position(engine)] + [format_move(m.source, m.color, m.target) for m in moves])
+
+
+class PipeBot:
+    """通过管道与外部进程通信的电脑玩家，和内置电脑玩家一样有 choose_move 和 close"""
+
+    def __init__(self, command: str):
+        self.command = command
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1)
+        self.name = command
+        self.send("azul")
+        while True:
+            line = self.read()
+            if line.startswith("id name "):
+                self.name = line[len("id name "):]
+            elif line == "azulok":
+                break
+        self.send("newgame")
+
+    def send(self, line: str):
+        self.process.stdin.write(line + "\n")
+
+    def read(self) -> str:
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            raise ConnectionError(f"Bot exited: {self.command}")
+        return line.rstrip("\n")
+
+    def _legal(self, engine: AzulEngine, moves: List[Move], text: str) -> Move:
+        move = canonical_move(engine, *parse_move(text))
+        for legal in moves:
+            if (legal.source, legal.color, legal.target) == move:
+                return legal
+        raise ValueError(f"Illegal move from {self.name}: {text}")
+
+    def choose_move(self, engine: AzulEngine) -> Move:
+        moves = generate_moves(engine)
+        self.send(f"position {format_position(engine)} moves "
+                  + " ".join(format_move(m.source, m.color, m.target) for m in moves))
+        self.send("go")
+        while True:
+            words = self.read().split()
+            if words and words[0] == "bestmove":
+                return self._legal(engine, moves, words[1])
+
+    def choose_moves(self, engines: Sequence[AzulEngine]) -> List[Move]:
+        """批量模式：一条消息发送所有局面，按顺序返回走法"""
+        all_moves = [generate_moves(engine) for engine in engines]
+        lines = [f"batch {len(engines)}"]
+        for i, (engine, moves) in enumerate(zip(engines, all_moves)):
+            lines.append(f"{i} " + position_line(engine, moves))
+        self.send("\n".join(lines))
+        answers: List[Optional[Move]] = [None] * len(engines)
+        received = 0
+        while received < len(engines):
+            words = self.read().split()
+            if len(words) == 3 and words[0] == "bestmove":
+                i = int(words[1])
+                answers[i] = self._legal(engines[i], all_moves[i], words[2])
+                received += 1
+        return answers
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.send("quit")
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+def serve(bot, name: str, input: TextIO = sys.stdin, output: TextIO = sys.stdout):
+    """电脑玩家一侧：读取主机的命令，用 bot.choose_move 回答"""
+    def reply(line: str):
+        output.write(line + "\n")
+
+    def choose(position: str) -> str:
+        # 内置电脑玩家自己生成走法，不需要主机给出的走法列表
+        move = bot.choose_move(parse_position(position))
+        return format_move(move.source, move.color, move.target)
+
+    position = None
+    for line in input:
+        words = line.split()
+        if not words:
+            continue
+        command = words[0]
+        if command == "azul":
+            reply(f"id name {name}")
+            reply("azulok")
+        elif command == "isready":
+            reply("readyok")
+        elif command == "position":
+            position = words[1]
+        elif command == "go" and position is not None:
+            reply("bestmove " + choose(position))
+        elif command == "batch":
+            requests = [next(input).split() for _ in range(int(words[1]))]
+            for request in requests:
+                reply(f"bestmove {request[0]} " + choose(request[1]))
+        elif command == "quit":
+            break
+        output.flush()
+
+
+def play_batch(command: str, opponent: str, games: int, seed: int = 0) -> List[Tuple[int, int, bool]]:
+    """一个管道电脑玩家同时和 games 局的对手对局（交替座位），每一步把所有局的局面批量发送。
+    返回每局 (管道电脑玩家的分数, 对手的分数, 是否因超过 MAX_ROUNDS 回合而中止)"""
+    from bots import make_bot
+
+    pipe = PipeBot(command)
+    opponents = [make_bot(opponent, seed + i) for i in range(games)]
+    engines = [AzulEngine(seed + i // 2) for i in range(games)]
+    pipe_seats = [i % 2 for i in range(games)]
+    for engine in engines:
+        engine.start_new_round()
+    try:
+        while True:
+            live = [i for i, engine in enumerate(engines)
+                    if not engine.game_over and engine.round_count <= MAX_ROUNDS]
+            if not live:
+                break
+            # 先让对手走到轮到管道电脑玩家，再一次性请求所有局的走法
+            waiting = []
+            for i in live:
+                engine = engines[i]
+                if engine.current_player != pipe_seats[i]:
+                    move = opponents[i].choose_move(engine)
+                    engine.play(move.source, move.color, move.target)
+                else:
+                    waiting.append(i)
+            if waiting:
+                for i, move in zip(waiting, pipe.choose_moves([engines[i] for i in waiting])):
+                    engines[i].play(move.source, move.color, move.target)
+            for i in live:
+                if engines[i].is_round_over():
+                    engines[i].finish_round()
+    finally:
+        pipe.close()
+        for bot in opponents:
+            bot.close()
+    return [(engine.players[seat].score, engine.players[1 - seat].score, not engine.game_over)
+            for engine, seat in zip(engines, pipe_seats)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="外部电脑玩家的管道协议")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="把内置电脑玩家包装成管道电脑玩家")
+    serve_parser.add_argument("bot", help="电脑玩家描述，见 bots.py")
+    serve_parser.add_argument("--seed", type=int)
+    batch_parser = commands.add_parser("batch", help="批量模式下让管道电脑玩家同时下很多局")
+    batch_parser.add_argument("bot_command", help="启动管道电脑玩家的命令")
+    batch_parser.add_argument("--opponent", default="random")
+    batch_parser.add_argument("--games", type=int, default=100)
+    batch_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from bots import make_bot
+        bot = make_bot(args.bot, args.seed)
+        try:
+            serve(bot, args.bot)
+        finally:
+            bot.close()
+        return
+
+    started = time.perf_counter()
+    scores = play_batch(args.bot_command, args.opponent, args.games, args.seed)
+    # 中止的对局按平局计算
+    wins = sum(own > other and not capped for own, other, capped in scores)
+    draws = sum(own == other or capped for own, other, capped in scores)
+    capped = sum(capped for _, _, capped in scores)
+    print(f"{args.games} games in {time.perf_counter() - started:.1f}s: "
+          f"{wins} wins, {draws} draws, {len(scores) - wins - draws} losses against {args.opponent}"
+          + (f" ({capped} stopped after {MAX_ROUNDS} rounds)" if capped else ""))
+
+
+if __name__ == "__main__":
+    main()
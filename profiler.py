@@ -0,0 +1,146 @@
+"""
+主循环的性能剖析
+
+Profiler.section(name) 返回一个上下文管理器，记录这一段代码的耗时：
+每个阶段保存调用次数、总时间和最近若干次的耗时，所有区段同时记录为 Chrome 的
+trace event（about:tracing 或 https://ui.perfetto.dev 可以打开导出的 JSON）。
+输入到画面的延迟是从读到鼠标/键盘事件到下一次把画面提交到屏幕的时间。
+
+关闭时 section 返回一个共享的空上下文管理器，只有一次属性检查和一次空的 with 的开销。
+"""
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# 每个阶段保留的最近耗时数，用于显示最近的平均值和最大值
+RECENT = 120
+# 最多保留的 trace 事件数（超过后丢弃最早的）
+TRACE_LIMIT = 200000
+
+
+class _NullSection:
+    """关闭时使用的空区段"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SECTION = _NullSection()
+
+
+class _Section:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class PhaseStats:
+    """一个阶段的计数器（纳秒）"""
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.recent: Deque[int] = deque(maxlen=RECENT)
+
+    def add(self, duration: int):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        self.recent.append(duration)
+
+
+class Profiler:
+    """按阶段计时，记录输入到画面的延迟，导出 Chrome trace"""
+
+    def __init__(self, enabled: bool = True, trace_path: Optional[str] = None, trace_limit: int = TRACE_LIMIT):
+        self.enabled = enabled
+        self.trace_path = trace_path    # 退出时导出 trace 的文件
+        self.visible = enabled          # 是否显示屏幕上的统计层
+        self.phases: Dict[str, PhaseStats] = {}
+        self.origin = time.perf_counter_ns()
+        # (名字, 开始, 持续时间, 线程)，时间为纳秒
+        self.trace: Deque[Tuple[str, int, int, int]] = deque(maxlen=trace_limit)
+        self.pending_input: Optional[int] = None
+        self.latencies: Deque[int] = deque(maxlen=RECENT)
+        self.frames = 0
+
+    def section(self, name: str):
+        return _Section(self, name) if self.enabled else NULL_SECTION
+
+    def record(self, name: str, start: int, end: int):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        stats.add(end - start)
+        self.trace.append((name, start, end - start, 1))
+
+    def input_received(self):
+        """读到一个输入事件。同一帧之前的多个输入按最早的一个计算"""
+        if self.enabled and self.pending_input is None:
+            self.pending_input = time.perf_counter_ns()
+
+    def frame_done(self, presented: bool):
+        """主循环的一次迭代结束。没有提交画面时输入继续等待，延迟算到下一次提交的帧"""
+        if not self.enabled or not presented:
+            return
+        self.frames += 1
+        if self.pending_input is not None:
+            now = time.perf_counter_ns()
+            self.latencies.append(now - self.pending_input)
+            self.trace.append(("input to frame", self.pending_input, now - self.pending_input, 2))
+            self.pending_input = None
+
+    def overlay_rows(self, limit: int = 8) -> List[Tuple[str, ...]]:
+        """屏幕统计层的表格：最近耗时最多的阶段（不含等待）和输入延迟"""
+        rows = [("phase", "calls", "avg ms", "max ms")]
+        busiest = sorted(((name, stats) for name, stats in self.phases.items() if not name.endswith("wait")),
+                         key=lambda item: -sum(item[1].recent))[:limit]
+        for name, stats in busiest:
+            recent = stats.recent
+            rows.append((name, str(stats.count), f"{sum(recent) / len(recent) / 1e6:.2f}",
+                         f"{max(recent) / 1e6:.2f}"))
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            rows.append(("input to frame", "", f"{latencies[len(latencies) // 2] / 1e6:.2f}",
+                         f"{latencies[-1] / 1e6:.2f}"))
+        return rows
+
+    def summary(self) -> str:
+        """所有阶段的累计统计，按总时间排序"""
+        lines = [f"{'phase':<24}{'calls':>8}{'total ms':>10}{'avg ms':>9}{'max ms':>9}"]
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1].total):
+            lines.append(f"{name:<24}{stats.count:>8}{stats.total / 1e6:>10.1f}"
+                         f"{stats.total / stats.count / 1e6:>9.3f}{stats.max / 1e6:>9.2f}")
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            lines.append(f"input to frame (last {len(latencies)}): median "
+                         f"{latencies[len(latencies) // 2] / 1e6:.2f}ms, max {latencies[-1] / 1e6:.2f}ms")
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, path: str):
+        """写出 Chrome trace event JSON（"X" 完整事件，时间单位微秒）"""
+        events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                  for tid, name in ((1, "main loop"), (2, "input latency"))]
+        for name, start, duration, tid in self.trace:
+            events.append({"name": name, "ph": "X", "pid": 1, "tid": tid, "cat": "game",
+                           "ts": (start - self.origin) / 1000, "dur": duration / 1000})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,146 @@
+"""
+脏矩形渲染
+
+界面被划分为若干区域（玩家板的准备区、结算区、扣分区、每个圆盘、待定区、信息栏、动画层等）。
+每个区域提供一个"状态键"函数和一个绘制函数：每帧只比较状态键，
+键发生变化的区域才会重绘，并且只把这些矩形提交给 pygame.display.update。
+
+重绘某个矩形时先用背景色清空，再按注册顺序重绘所有与它相交的区域（通过裁剪限制在矩形内），
+所以区域之间有重叠时绘制结果与整屏重绘相同。
+"""
+import time
+from collections import deque
+from typing import Callable, Hashable, List, Optional, Union
+
+import pygame
+
+RectSource = Union[pygame.Rect, Callable[[], pygame.Rect]]
+
+
+class Region:
+    """一个可独立重绘的屏幕区域。rect 可以是固定矩形，也可以是返回当前矩形的函数（例如动画层）"""
+    __slots__ = ("name", "rect_source", "key", "draw", "last_key", "last_rect", "phase")
+
+    def __init__(self, name: str, rect: RectSource, key: Callable[[], Hashable],
+                 draw: Callable[[pygame.Surface], None], phase: Optional[str] = None):
+        self.name = name
+        self.phase = "draw " + (phase or name)    # 性能剖析中的阶段名，同类区域可以合并
+        self.rect_source = rect
+        self.key = key
+        self.draw = draw
+        self.last_key = None
+        self.last_rect: Optional[pygame.Rect] = None
+
+    def current_rect(self) -> pygame.Rect:
+        rect = self.rect_source
+        return rect() if callable(rect) else rect
+
+
+class RetainedRenderer:
+    """记录每个区域上一次绘制时的状态键，只重绘发生变化的区域"""
+
+    def __init__(self, screen: pygame.Surface, background):
+        self.screen = screen
+        self.background = background
+        self.regions: List[Region] = []
+        self.full_redraw = True
+        self.frames = 0
+        self.redrawn_regions = 0
+        self.profiler = None        # 设置后按区域的 phase 记录绘制时间（见 profiler.py）
+
+    def add(self, name: str, rect: RectSource, key: Callable[[], Hashable],
+            draw: Callable[[pygame.Surface], None], phase: Optional[str] = None) -> Region:
+        """注册区域，后注册的区域画在上层"""
+        region = Region(name, rect, key, draw, phase)
+        self.regions.append(region)
+        return region
+
+    def draw_region(self, region: Region):
+        self.redrawn_regions += 1
+        if self.profiler is None or not self.profiler.enabled:
+            region.draw(self.screen)
+            return
+        with self.profiler.section(region.phase):
+            region.draw(self.screen)
+
+    def invalidate(self, name: Optional[str] = None):
+        """强制重绘某个区域，不指定名字时重绘整个屏幕"""
+        if name is None:
+            self.full_redraw = True
+            return
+        for region in self.regions:
+            if region.name == name:
+                region.last_key = None
+                region.last_rect = None
+
+    def render(self) -> List[pygame.Rect]:
+        """重绘变化的区域，返回需要提交到屏幕的矩形列表（没有变化时为空）"""
+        self.frames += 1
+        screen = self.screen
+        if self.full_redraw:
+            self.full_redraw = False
+            screen.fill(self.background)
+            for region in self.regions:
+                region.last_key = region.key()
+                region.last_rect = region.current_rect()
+                # 空矩形表示区域当前不显示（例如没有动画时的动画层）
+                if region.last_rect.width and region.last_rect.height:
+                    self.draw_region(region)
+            return [screen.get_rect()]
+
+        dirty: List[pygame.Rect] = []
+        rects = []
+        for region in self.regions:
+            key = region.key()
+            rect = region.current_rect()
+            rects.append(rect)
+            if key == region.last_key and rect == region.last_rect:
+                continue
+            # 区域移动或缩小时，旧位置也要清除（空矩形不参与合并）
+            areas = [area for area in (rect, region.last_rect) if area and area.width and area.height]
+            if areas:
+                dirty.append(areas[0].unionall(areas[1:]))
+            region.last_key = key
+            region.last_rect = rect
+        if not dirty:
+            return dirty
+
+        for area in dirty:
+            screen.set_clip(area)
+            screen.fill(self.background, area)
+            for region, rect in zip(self.regions, rects):
+                if rect.colliderect(area):
+                    self.draw_region(region)
+        screen.set_clip(None)
+        return dirty
+
+
+class FrameStats:
+    """主循环的帧时间统计：每帧的处理时间（事件、时间线和绘制），以及实际提交到屏幕的帧数"""
+
+    def __init__(self, window: int = 1000):
+        self.frame_times = deque(maxlen=window)   # 最近若干帧的处理时间（秒）
+        self.frames = 0
+        self.presented = 0
+        self.idle_wakeups = 0
+        self.started = time.perf_counter()
+        self._frame_start = 0.0
+
+    def begin(self):
+        self._frame_start = time.perf_counter()
+
+    def end(self, presented: bool):
+        self.frame_times.append(time.perf_counter() - self._frame_start)
+        self.frames += 1
+        self.presented += presented
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        if not self.frame_times:
+            return "No frames"
+        times = sorted(self.frame_times)
+        mean = sum(times) / len(times)
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        return (f"{self.frames} frames ({self.presented} presented, {self.idle_wakeups} idle wakeups) "
+                f"in {elapsed:.1f}s, {self.frames / elapsed:.1f} loops/s; "
+                f"frame time mean {1000 * mean:.2f}ms, p95 {1000 * p95:.2f}ms, max {1000 * times[-1]:.2f}ms")
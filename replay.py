@@ -0,0 +1,225 @@
+"""
+紧凑的二进制对局记录
+
+一局对局的格式（小端）：
+
+    头部      "AZRP"、版本、标志、种子（8字节）、两个玩家名（长度 + UTF-8）
+    关键帧    0xF0 + 固定长度的完整状态，每回合发牌后写一次（即包含本回合的发牌）
+    走法      每步 1 个字节：(来源 * 5 + 颜色) * 6 + 目标，来源 5 表示待定区，目标 5 表示扣分区
+    结束      0xFF + 双方最终分数和回合数
+
+走法字节都小于 180，和标记字节不会混淆；关键帧长度固定，扫描时直接跳过。
+一个文件可以连续存放任意多局。头部 "AZRP" 的字节也都小于 180，所以读走法时要显式查找它：
+"A" 和 "R" 都是从第3个圆盘拿棋子，同一回合里不可能出现，因此走法中不会有 "AZRP"。
+上一局没有结束标记（写入中断）时在下一局的头部结束。读取某一步的局面时，从该回合的关键帧恢复状态再向前走几步。
+"""
+import mmap
+import random
+import re
+import struct
+from bisect import bisect_right
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from engine import AzulEngine, CENTER, FLOOR_SIZE, NUM_COLORS, NUM_DISKS, PlayerState
+
+MAGIC = b"AZRP"
+VERSION = 1
+HEADER = struct.Struct("<4sBBq")
+HAS_SEED = 1
+
+NUM_MOVE_CODES = 6 * NUM_COLORS * 6
+ROUND_TAG = 0xF0
+END_TAG = 0xFF
+
+# 棋子池、废棋堆、5个圆盘、待定区、标志位、回合数，然后每个玩家：
+# 准备区颜色和数量、结算区掩码、扣分区长度和内容、分数
+KEYFRAME = struct.Struct("<5B5B25B5BBH" + "5b5BIB7Bh" * 2)
+END = struct.Struct("<hhB")
+
+_MOVE_RUN = re.compile(rb"[\x00-\xb3]*")
+
+
+def encode_move(source: int, color: int, target: int) -> int:
+    """把一步走法压缩成一个字节"""
+    source_index = NUM_DISKS if source == CENTER else source
+    return (source_index * NUM_COLORS + color) * 6 + target
+
+
+def decode_move(code: int) -> Tuple[int, int, int]:
+    """返回 (来源, 颜色, 目标)"""
+    rest, target = divmod(code, 6)
+    source_index, color = divmod(rest, NUM_COLORS)
+    return (CENTER if source_index == NUM_DISKS else source_index), color, target
+
+
+def pack_state(engine: AzulEngine) -> bytes:
+    """关键帧：引擎的完整状态"""
+    flags = (engine.first_token_in_center | engine.first_player_decided << 1
+             | engine.next_first_player << 2 | engine.current_player << 3 | engine.game_over << 4)
+    values = [*engine.bag, *engine.discard]
+    for disk in engine.disks:
+        values.extend(disk)
+    values.extend(engine.center)
+    values.extend((flags, engine.round_count))
+    for board in engine.players:
+        values.extend(board.prep_colors)
+        values.extend(board.prep_counts)
+        values.append(board.wall)
+        values.append(len(board.floor))
+        values.extend(board.floor)
+        values.extend([0] * (FLOOR_SIZE - len(board.floor)))
+        values.append(board.score)
+    return KEYFRAME.pack(*values)
+
+
+def unpack_state(data, offset: int, names: Sequence[str]) -> AzulEngine:
+    """从关键帧恢复引擎（哈希和可放置颜色集合重新计算）"""
+    values = KEYFRAME.unpack_from(data, offset)
+    engine = AzulEngine.__new__(AzulEngine)
+    engine.rng = random.Random()
+    engine.bag = list(values[0:5])
+    engine.discard = list(values[5:10])
+    engine.disks = [list(values[10 + 5 * i:15 + 5 * i]) for i in range(NUM_DISKS)]
+    engine.center = list(values[35:40])
+    flags = values[40]
+    engine.first_token_in_center = bool(flags & 1)
+    engine.first_player_decided = bool(flags & 2)
+    engine.next_first_player = flags >> 2 & 1
+    engine.current_player = flags >> 3 & 1
+    engine.game_over = bool(flags & 16)
+    engine.round_count = values[41]
+    engine.tiles_on_table = sum(engine.center) + sum(sum(disk) for disk in engine.disks)
+    engine.players = []
+    i = 42
+    for seat, name in enumerate(names):
+        board = PlayerState(name, seat)
+        board.prep_colors = list(values[i:i + 5])
+        board.prep_counts = list(values[i + 5:i + 10])
+        board.wall = values[i + 10]
+        board.floor = list(values[i + 12:i + 12 + values[i + 11]])
+        board.score = values[i + 19]
+        board.refresh_allowed()
+        engine.players.append(board)
+        i += 20
+    engine.rehash()
+    return engine
+
+
+class ReplayWriter:
+    """记录一局对局"""
+
+    def __init__(self, seed: Optional[int] = None, names: Sequence[str] = ("Player 1", "Player 2")):
+        self.buffer = bytearray(HEADER.pack(MAGIC, VERSION, HAS_SEED if seed is not None else 0, seed or 0))
+        for name in names:
+            encoded = name.encode("utf-8")[:255]
+            self.buffer.append(len(encoded))
+            self.buffer += encoded
+
+    def round(self, engine: AzulEngine):
+        """发牌后写入关键帧"""
+        self.buffer.append(ROUND_TAG)
+        self.buffer += pack_state(engine)
+
+    def move(self, source: int, color: int, target: int):
+        self.buffer.append(encode_move(source, color, target))
+
+    def end(self, engine: AzulEngine):
+        self.buffer.append(END_TAG)
+        self.buffer += END.pack(engine.players[0].score, engine.players[1].score, engine.round_count)
+
+    def getvalue(self) -> bytes:
+        return bytes(self.buffer)
+
+
+class Replay:
+    """一局对局的记录。moves 是全部走法字节，round_starts[r] 是第 r 个关键帧之后第一步的序号"""
+
+    def __init__(self, data, seed: Optional[int], names: Tuple[str, ...]):
+        self.data = data
+        self.seed = seed
+        self.names = names
+        self.keyframes: List[int] = []
+        self.round_starts: List[int] = []
+        self.moves = bytearray()
+        self.result: Optional[Tuple[int, int, int]] = None   # (分数1, 分数2, 回合数)
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    @classmethod
+    def parse(cls, data, offset: int = 0) -> Tuple["Replay", int]:
+        """解析从 offset 开始的一局，返回 (记录, 下一局的起始位置)"""
+        if len(data) - offset < HEADER.size:
+            raise ValueError(f"Not a replay at offset {offset}")
+        magic, version, flags, seed = HEADER.unpack_from(data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a replay at offset {offset}")
+        pos = offset + HEADER.size
+        names = []
+        for _ in range(2):
+            length = data[pos]
+            names.append(bytes(data[pos + 1:pos + 1 + length]).decode("utf-8"))
+            pos += 1 + length
+        replay = cls(data, seed if flags & HAS_SEED else None, tuple(names))
+
+        size = len(data)
+        while pos < size:
+            tag = data[pos]
+            if tag == ROUND_TAG:
+                replay.keyframes.append(pos + 1)
+                replay.round_starts.append(len(replay.moves))
+                pos += 1 + KEYFRAME.size
+            elif tag == END_TAG:
+                if pos + 1 + END.size <= size:
+                    replay.result = END.unpack_from(data, pos + 1)
+                pos += 1 + END.size
+                break
+            elif tag < NUM_MOVE_CODES:
+                end = _MOVE_RUN.match(data, pos).end()
+                # 下一局的头部（上一局没有写结束标记）
+                header = data.find(MAGIC, pos, end)
+                replay.moves += data[pos:end if header < 0 else header]
+                if header >= 0:
+                    pos = header
+                    break
+                pos = end
+            else:
+                raise ValueError(f"Bad byte 0x{tag:02x} in replay at offset {pos}")
+        if pos > size:
+            raise ValueError(f"Replay at offset {offset} is truncated")
+        return replay, pos
+
+    def move(self, index: int) -> Tuple[int, int, int]:
+        return decode_move(self.moves[index])
+
+    def round_of(self, index: int) -> int:
+        """第 index 步之前的局面所在的回合（关键帧序号）"""
+        return max(0, bisect_right(self.round_starts, index) - 1)
+
+    def position(self, index: int) -> AzulEngine:
+        """第 index 步之前的局面（index == len 时为最后的局面）：从最近的关键帧向前走"""
+        if not self.keyframes:
+            raise ValueError("Replay has no rounds")
+        index = max(0, min(index, len(self.moves)))
+        r = self.round_of(index)
+        engine = unpack_state(self.data, self.keyframes[r], self.names)
+        for code in self.moves[self.round_starts[r]:index]:
+            engine.play(*decode_move(code))
+        return engine
+
+
+def iter_replays(data) -> Iterator[Replay]:
+    """依次解析数据中的每一局"""
+    pos = 0
+    while pos < len(data):
+        replay, pos = Replay.parse(data, pos)
+        yield replay
+
+
+def load_replays(path: str) -> List[Replay]:
+    """用 mmap 读取记录文件中的全部对局"""
+    with open(path, "rb") as f:
+        if not f.seek(0, 2):
+            return []
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return list(iter_replays(data))
@@ -0,0 +1,587 @@
+"""
+多局对战服务器（asyncio）
+
+一个进程同时运行大量互相独立的对局，规则由 engine.py 负责。每局在自己的任务中运行，
+某一局出错只会结束这一局。协议是 TCP 上每行一条 JSON 消息：
+
+客户端 -> 服务器
+    {"type": "join", "role": "player"}                          与下一个加入的玩家对战
+    {"type": "join", "role": "player", "opponent": "greedy"}    与电脑玩家对战（描述见 bots.py）
+    {"type": "join", "role": "spectator", "match": 3}
+    {"type": "move", "source": 0, "color": 2, "target": 1}      source -1 为待定区，target 5 为扣分区
+
+服务器 -> 客户端
+    {"type": "waiting", "match": 3}
+    {"type": "start", "match": 3, "seat": 0, "version": 0, "state": {...}}   完整状态，只发一次
+    {"type": "diff", "version": 5, "move": [s, c, t], "changes": {...}}       每走一步
+    {"type": "diff", "version": 6, "events": [...], "changes": {...}}         回合结算和发牌
+    {"type": "update", "version": 9, "changes": {...}}   观众：定时合并多步的变化
+    {"type": "end", "scores": [.., ..], "winner": 0, "reason": "finished"}
+    {"type": "error", "message": "..."}
+
+状态是扁平的字段表（见 state_fields），changes 只包含变化的字段，客户端用 dict.update 合并。
+字段由共享结构的快照（snapshot.py）生成，未变化的部分直接共享。
+
+背压：每个连接的发送队列有上限，由单独的任务写入并等待 drain。玩家的队列满了说明客户端
+不再读取，断开连接；观众的队列满了就丢弃这一批，下一批改发完整状态。每局的走法队列也有上限，
+队列满时停止读取这个连接，TCP 窗口会让客户端慢下来。
+
+用法：
+    python server.py --port 8765
+    python server.py --loadtest 1000 --bot-share 0.5     本机回环客户端压力测试
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from bots import make_bot
+from engine import AzulEngine, MAX_ROUNDS
+from moves import canonical_move, generate_moves
+from snapshot import BoardNode, GameSnapshot, RowNode, restore_snapshot, take_snapshot
+
+# 每个连接最多排队的待发送消息数
+MAX_PENDING = 256
+# 每局最多排队的走法数
+MATCH_INBOX = 16
+# 观众更新的合并间隔（秒）
+SPECTATOR_INTERVAL = 0.1
+# 单条消息的最大长度
+MAX_LINE = 1 << 16
+# 延迟统计保留的样本数
+LATENCY_SAMPLES = 100000
+
+
+def state_fields(snapshot: GameSnapshot) -> dict:
+    """快照转换为扁平的字段表"""
+    fields = {
+        "bag": snapshot.bag,
+        "discard": snapshot.discard,
+        "center": snapshot.center,
+        "first_token_in_center": snapshot.first_token_in_center,
+        "first_player_decided": snapshot.first_player_decided,
+        "next_first_player": snapshot.next_first_player,
+        "current_player": snapshot.current_player,
+        "round": snapshot.round_count,
+        "game_over": snapshot.game_over,
+    }
+    for i, disk in enumerate(snapshot.disks):
+        fields[f"disk{i}"] = disk
+    for board in snapshot.players:
+        prefix = f"p{board.seat}."
+        fields[prefix + "rows"] = board.rows
+        fields[prefix + "wall"] = board.wall
+        fields[prefix + "floor"] = board.floor
+        fields[prefix + "score"] = board.score
+    return fields
+
+
+def state_diff(old: dict, new: dict) -> dict:
+    """变化的字段（共享的节点用 is 直接跳过）"""
+    return {key: value for key, value in new.items()
+            if not (old.get(key) is value or old.get(key) == value)}
+
+
+def engine_from_fields(fields: dict, names=("Player 1", "Player 2")) -> AzulEngine:
+    """根据字段表（JSON 解码后）重建引擎，客户端用来生成合法走法"""
+    players = tuple(
+        BoardNode(name, seat, 0, tuple(RowNode(*row) for row in fields[f"p{seat}.rows"]),
+                  fields[f"p{seat}.wall"], tuple(fields[f"p{seat}.floor"]), fields[f"p{seat}.score"])
+        for seat, name in enumerate(names))
+    snapshot = GameSnapshot(
+        tuple(fields["bag"]), tuple(fields["discard"]),
+        tuple(tuple(fields[f"disk{i}"]) for i in range(len(fields["bag"]))),
+        tuple(fields["center"]), fields["first_token_in_center"], fields["first_player_decided"],
+        fields["next_first_player"], fields["current_player"], fields["round"], fields["game_over"],
+        0, players, random.Random().getstate())
+    engine = restore_snapshot(snapshot)
+    engine.rehash()
+    return engine
+
+
+def encode(message: dict) -> bytes:
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class ServerStats:
+    """吞吐量和延迟统计。延迟是从读到一步走法到双方的消息进入发送队列的时间"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.moves = 0
+        self.messages = 0
+        self.bytes = 0
+        self.matches_started = 0
+        self.matches_finished = 0
+        self.matches_failed = 0
+        self.dropped_batches = 0
+        self.slow_disconnects = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def report(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        lines = [
+            f"{elapsed:.1f}s, matches {self.matches_started} started / {self.matches_finished} finished"
+            f" / {self.matches_failed} failed",
+            f"{self.moves} moves ({self.moves / elapsed:.0f}/s), {self.messages} messages "
+            f"({self.messages / elapsed:.0f}/s, {self.bytes / elapsed / 1024:.0f} KiB/s)",
+            f"dropped spectator batches {self.dropped_batches}, slow clients disconnected {self.slow_disconnects}",
+        ]
+        if self.latencies:
+            samples = sorted(self.latencies)
+            pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+            lines.append(f"move latency p50 {pick(0.5):.2f}ms p95 {pick(0.95):.2f}ms "
+                         f"p99 {pick(0.99):.2f}ms max {samples[-1] * 1000:.2f}ms")
+        return "\n".join(lines)
+
+
+class Connection:
+    """一个客户端连接，发送队列由单独的任务写入 socket"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, stats: ServerStats):
+        self.reader = reader
+        self.writer = writer
+        self.stats = stats
+        self.queue: asyncio.Queue = asyncio.Queue(MAX_PENDING)
+        self.match: Optional["Match"] = None
+        self.seat: Optional[int] = None
+        self.needs_resync = False    # 观众丢过更新，下次发送完整状态
+        self.closed = False
+        self.writer_task = asyncio.ensure_future(self.write_loop())
+
+    def send(self, message: dict) -> bool:
+        """放入发送队列，队列已满时返回 False"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(encode(message))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def write_loop(self):
+        try:
+            while True:
+                data = await self.queue.get()
+                if data is None:
+                    break
+                self.writer.write(data)
+                self.stats.messages += 1
+                self.stats.bytes += len(data)
+                await self.writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.closed = True
+            self.writer.close()
+
+    def close(self):
+        """发完已经排队的消息后关闭"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            self.writer_task.cancel()
+            self.writer.close()
+
+
+class Match:
+    """一局对局。两个座位是连接或电脑玩家，走法经过 inbox 进入对局任务"""
+
+    def __init__(self, match_id: int, seed: int, stats: ServerStats):
+        self.id = match_id
+        self.stats = stats
+        self.engine = AzulEngine(seed)
+        self.seed = seed
+        self.seats: List[object] = [None, None]
+        self.spectators: Set[Connection] = set()
+        self.inbox: asyncio.Queue = asyncio.Queue(MATCH_INBOX)
+        self.ready = asyncio.Event()
+        self.snapshot: Optional[GameSnapshot] = None
+        self.fields: dict = {}
+        self.version = 0
+        self.pending: dict = {}          # 还没有发给观众的变化
+        self.finished = False
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def is_open(self) -> bool:
+        return not self.ready.is_set() and None in self.seats
+
+    def add_player(self, seat_value) -> int:
+        seat = self.seats.index(None)
+        self.seats[seat] = seat_value
+        if None not in self.seats:
+            self.ready.set()
+        return seat
+
+    def connections(self) -> List[Connection]:
+        return [seat for seat in self.seats if isinstance(seat, Connection)]
+
+    def publish(self, **extra):
+        """把当前局面的变化发给双方玩家，观众的变化合并到下一批"""
+        snapshot = take_snapshot(self.engine, self.snapshot)
+        fields = state_fields(snapshot)
+        changes = state_diff(self.fields, fields)
+        self.snapshot, self.fields = snapshot, fields
+        self.version += 1
+        message = dict(type="diff", version=self.version, changes=changes, **extra)
+        for connection in self.connections():
+            if not connection.send(message):
+                self.stats.slow_disconnects += 1
+                connection.close()
+                raise ConnectionError("Player is not reading updates")
+        self.pending.update(changes)
+
+    def flush_spectators(self):
+        """把合并后的变化发给观众"""
+        if not self.pending or not self.spectators:
+            self.pending.clear()
+            return
+        update = dict(type="update", match=self.id, version=self.version, changes=self.pending)
+        for spectator in list(self.spectators):
+            if spectator.closed:
+                self.spectators.discard(spectator)
+                continue
+            message = update
+            if spectator.needs_resync:
+                message = dict(update, changes=self.fields, full=True)
+            if spectator.send(message):
+                spectator.needs_resync = False
+            else:
+                spectator.needs_resync = True
+                self.stats.dropped_batches += 1
+        self.pending = {}
+
+    def add_spectator(self, connection: Connection):
+        connection.match = self
+        self.spectators.add(connection)
+        connection.send(dict(type="start", match=self.id, seat=None, version=self.version, state=self.fields))
+
+    async def spectator_loop(self):
+        while not self.finished:
+            await asyncio.sleep(SPECTATOR_INTERVAL)
+            self.flush_spectators()
+
+    async def next_message(self, seat: int) -> Tuple[dict, float]:
+        """从 inbox 取当前玩家的下一条走法消息，返回 (消息, 收到的时间)。
+
+        不是当前玩家发来的走法回复 error 后丢弃，不会留到以后当作那个玩家的走法；
+        有玩家离开时抛出 ConnectionError。座位是电脑玩家时这个函数不会正常返回。
+        """
+        player = self.seats[seat]
+        while True:
+            connection, message, received = await self.inbox.get()
+            if message is None:
+                raise ConnectionError("Player left")
+            if connection is not player:
+                connection.send(dict(type="error", message="Not your turn"))
+                continue
+            return message, received
+
+    async def next_move(self, seat: int):
+        """等待当前玩家的合法走法，返回 ((来源, 颜色, 目标), 收到的时间)。
+
+        客户端的走法（放入已满的行换成放入扣分区，见 canonical_move）先和 generate_moves 的结果比对，
+        非法时回复 error，不修改引擎。电脑玩家思考期间照常处理 inbox。
+        """
+        player = self.seats[seat]
+        legal = {(move.source, move.color, move.target) for move in generate_moves(self.engine)}
+        if not isinstance(player, Connection):
+            search = asyncio.ensure_future(asyncio.to_thread(player.choose_move, self.engine.copy()))
+            listener = asyncio.ensure_future(self.next_message(seat))
+            try:
+                done, _ = await asyncio.wait((search, listener), return_when=asyncio.FIRST_COMPLETED)
+                if listener in done:
+                    listener.result()
+            finally:
+                listener.cancel()
+            move = search.result()
+            move = canonical_move(self.engine, move.source, move.color, move.target)
+            if move not in legal:
+                raise ValueError(f"Illegal move from bot: {move}")
+            return move, time.perf_counter()
+        while True:
+            message, received = await self.next_message(seat)
+            try:
+                move = canonical_move(self.engine, int(message["source"]), int(message["color"]),
+                                      int(message["target"]))
+            except (KeyError, TypeError, ValueError):
+                player.send(dict(type="error", message="Bad move message"))
+                continue
+            if move not in legal:
+                player.send(dict(type="error", message=f"Illegal move: {move}"))
+                continue
+            return move, received
+
+    async def run(self):
+        await self.ready.wait()
+        self.stats.matches_started += 1
+        spectators = asyncio.ensure_future(self.spectator_loop())
+        reason = "finished"
+        try:
+            engine = self.engine
+            engine.start_new_round()
+            self.snapshot = take_snapshot(engine)
+            self.fields = state_fields(self.snapshot)
+            # 开始前加入的观众在第一批更新中收到完整状态
+            self.pending.update(self.fields)
+            for seat, connection in enumerate(self.seats):
+                if isinstance(connection, Connection):
+                    connection.send(dict(type="start", match=self.id, seat=seat, version=0, state=self.fields))
+
+            while not engine.game_over and engine.round_count <= MAX_ROUNDS:
+                move, received = await self.next_move(engine.current_player)
+                engine.play(*move)
+                self.publish(move=move)
+                if engine.is_round_over():
+                    events = engine.finish_round()
+                    self.publish(events=[event._asdict() for event in events])
+                self.stats.moves += 1
+                self.stats.latencies.append(time.perf_counter() - received)
+            if not engine.game_over:
+                reason = "round limit"
+        except ConnectionError as error:
+            reason = str(error)
+        except Exception:
+            reason = "error"
+            raise
+        finally:
+            self.finished = True
+            spectators.cancel()
+            self.flush_spectators()
+            scores = [board.score for board in self.engine.players]
+            end = dict(type="end", match=self.id, scores=scores, winner=self.engine.winner(), reason=reason)
+            for connection in self.connections() + list(self.spectators):
+                connection.send(end)
+                connection.close()
+            for seat in self.seats:
+                if seat is not None and not isinstance(seat, Connection):
+                    seat.close()
+
+
+class MatchServer:
+    """管理连接和对局"""
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        self.stats = ServerStats()
+        self.matches: Dict[int, Match] = {}
+        self.open_match: Optional[Match] = None
+        self.next_id = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """开始监听，返回实际的端口"""
+        self.server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for match in list(self.matches.values()):
+            match.task.cancel()
+
+    def create_match(self) -> Match:
+        match = Match(self.next_id, self.seed + self.next_id, self.stats)
+        self.next_id += 1
+        self.matches[match.id] = match
+        match.task = asyncio.ensure_future(match.run())
+        match.task.add_done_callback(lambda task, match=match: self.match_done(match, task))
+        return match
+
+    def match_done(self, match: Match, task: asyncio.Task):
+        """对局任务结束：出错只影响这一局"""
+        self.matches.pop(match.id, None)
+        if self.open_match is match:
+            self.open_match = None
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            # 双方和观众已经收到 reason 为 error 的 end 消息
+            self.stats.matches_failed += 1
+            print(f"Match {match.id} failed: {error!r}")
+        else:
+            self.stats.matches_finished += 1
+
+    def join(self, connection: Connection, message: dict):
+        if connection.match is not None:
+            connection.send(dict(type="error", message="Already joined"))
+            return
+        if message.get("role") == "spectator":
+            match = self.matches.get(message.get("match"))
+            if match is None:
+                connection.send(dict(type="error", message="No such match"))
+            else:
+                match.add_spectator(connection)
+            return
+
+        opponent = message.get("opponent")
+        if opponent:
+            try:
+                bot = make_bot(str(opponent), self.seed + self.next_id)
+            except (ValueError, KeyError) as error:
+                connection.send(dict(type="error", message=str(error)))
+                return
+            match = self.create_match()
+            connection.match, connection.seat = match, match.add_player(connection)
+            match.add_player(bot)
+            return
+
+        match = self.open_match
+        if match is None or not match.is_open:
+            match = self.open_match = self.create_match()
+            connection.send(dict(type="waiting", match=match.id))
+        connection.match, connection.seat = match, match.add_player(connection)
+        if not match.is_open:
+            self.open_match = None
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = Connection(reader, writer, self.stats)
+        try:
+            while not connection.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                received = time.perf_counter()
+                try:
+                    message = json.loads(line)
+                    kind = message["type"]
+                except (ValueError, KeyError, TypeError):
+                    connection.send(dict(type="error", message="Bad message"))
+                    continue
+                if kind == "join":
+                    self.join(connection, message)
+                elif kind == "move" and connection.seat is not None and not connection.match.finished:
+                    # 对局任务处理不过来时在这里等待，不再读取这个连接
+                    await connection.match.inbox.put((connection, message, received))
+                else:
+                    connection.send(dict(type="error", message=f"Unexpected {kind} message"))
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            match = connection.match
+            if match is not None:
+                match.spectators.discard(connection)
+                if connection.seat is not None and not match.finished:
+                    if match.ready.is_set():
+                        await match.inbox.put((connection, None, time.perf_counter()))
+                    else:
+                        # 还没开始的对局直接取消
+                        match.task.cancel()
+            connection.close()
+
+
+async def play_client(host: str, port: int, opponent: Optional[str] = None, seed: int = 0,
+                      latencies: Optional[List[float]] = None) -> dict:
+    """回环测试用的客户端：随机走棋，用收到的变化维护局面并和服务器核对。返回 end 消息"""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+    join = dict(type="join", role="player")
+    if opponent:
+        join["opponent"] = opponent
+    writer.write(encode(join))
+    fields: dict = {}
+    seat = None
+    version = 0
+    sent_at = None
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("Server closed the connection")
+            message = json.loads(line)
+            kind = message["type"]
+            if kind == "start":
+                fields, seat, version = message["state"], message["seat"], message["version"]
+            elif kind == "diff":
+                if message["version"] != version + 1:
+                    raise AssertionError(f"Missed update {version + 1}")
+                version = message["version"]
+                fields.update(message["changes"])
+                if sent_at is not None and "move" in message and latencies is not None:
+                    latencies.append(time.perf_counter() - sent_at)
+                    sent_at = None
+            elif kind == "end":
+                return message
+            elif kind == "error":
+                raise AssertionError(message["message"])
+            else:
+                continue
+            if fields and fields["current_player"] == seat and not fields["game_over"]:
+                moves = generate_moves(engine_from_fields(fields))
+                if moves:
+                    move = rng.choice(moves)
+                    sent_at = time.perf_counter()
+                    writer.write(encode(dict(type="move", source=move.source, color=move.color,
+                                             target=move.target)))
+                    await writer.drain()
+    finally:
+        writer.close()
+
+
+async def loadtest(matches: int, bot_share: float = 0.5, seed: int = 0) -> ServerStats:
+    """在本进程启动服务器，用回环客户端同时下 matches 局"""
+    server = MatchServer(seed)
+    port = await server.start("127.0.0.1", 0)
+    latencies: List[float] = []
+    clients = []
+    for i in range(matches):
+        if i < matches * bot_share:
+            clients.append(play_client("127.0.0.1", port, "random", seed + i, latencies))
+        else:
+            clients.append(play_client("127.0.0.1", port, None, seed + 2 * i, latencies))
+            clients.append(play_client("127.0.0.1", port, None, seed + 2 * i + 1, latencies))
+    results = await asyncio.gather(*clients, return_exceptions=True)
+    await server.close()
+    errors = [result for result in results if isinstance(result, BaseException)]
+    print(server.stats.report())
+    if latencies:
+        latencies.sort()
+        print(f"client round trip p50 {latencies[len(latencies) // 2] * 1000:.2f}ms "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms")
+    if errors:
+        print(f"{len(errors)} clients failed, first: {errors[0]!r}")
+    return server.stats
+
+
+async def serve(host: str, port: int, seed: int, report_interval: float):
+    server = MatchServer(seed)
+    port = await server.start(host, port)
+    print(f"Listening on {host}:{port}")
+    try:
+        while True:
+            await asyncio.sleep(report_interval)
+            print(server.stats.report(), flush=True)
+    finally:
+        await server.close()
+        print(server.stats.report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多局对战服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0, help="第 i 局的发牌种子为 seed + i")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="统计报告的间隔（秒）")
+    parser.add_argument("--loadtest", type=int, metavar="MATCHES", help="用回环客户端同时下这么多局后退出")
+    parser.add_argument("--bot-share", type=float, default=0.5, help="压力测试中与电脑对战的比例")
+    args = parser.parse_args()
+    try:
+        if args.loadtest:
+            asyncio.run(loadtest(args.loadtest, args.bot_share, args.seed))
+        else:
+            asyncio.run(serve(args.host, args.port, args.seed, args.report_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+不可变的对局快照
+
+快照由嵌套的元组组成，和上一个快照相比没有变化的部分直接共享：
+玩家板没有变化（Zobrist 哈希和分数相同）时整块共享，否则逐行比较准备区，
+未变化的行节点继续共享；圆盘、棋子池等同理。因此每走一步保存一个快照的开销
+只与变化的部分有关，悔棋/重做和搜索分支都不需要深拷贝。
+
+随机数状态只在发牌时改变，同一回合内的快照共享同一份随机数状态，
+恢复快照后继续对局，之后的发牌与原来的对局一致。
+"""
+import random
+from typing import List, NamedTuple, Optional, Tuple
+
+from engine import AzulEngine, NUM_ROWS, PlayerState
+
+
+class RowNode(NamedTuple):
+    """准备区的一行"""
+    color: int
+    count: int
+
+
+class BoardNode(NamedTuple):
+    """一块玩家板"""
+    name: str
+    seat: int
+    hash: int
+    rows: Tuple[RowNode, ...]
+    wall: int
+    floor: Tuple[int, ...]
+    score: int
+
+
+class GameSnapshot(NamedTuple):
+    bag: Tuple[int, ...]
+    discard: Tuple[int, ...]
+    disks: Tuple[Tuple[int, ...], ...]
+    center: Tuple[int, ...]
+    first_token_in_center: bool
+    first_player_decided: bool
+    next_first_player: int
+    current_player: int
+    round_count: int
+    game_over: bool
+    table_hash: int
+    players: Tuple[BoardNode, ...]
+    rng_state: tuple
+
+
+def _shared(values: List[int], previous: Optional[Tuple[int, ...]]) -> Tuple[int, ...]:
+    """内容相同时返回上一个快照中的元组"""
+    current = tuple(values)
+    return previous if previous == current else current
+
+
+def _board_node(state: PlayerState, previous: Optional[BoardNode]) -> BoardNode:
+    if previous is not None and previous.hash == state.hash and previous.score == state.score:
+        return previous
+    rows = []
+    for row in range(NUM_ROWS):
+        color, count = state.prep_colors[row], state.prep_counts[row]
+        old = previous.rows[row] if previous is not None else None
+        rows.append(old if old is not None and old.color == color and old.count == count
+                    else RowNode(color, count))
+    floor = tuple(state.floor)
+    if previous is not None and previous.floor == floor:
+        floor = previous.floor
+    return BoardNode(state.name, state.seat, state.hash, tuple(rows), state.wall, floor, state.score)
+
+
+def take_snapshot(engine: AzulEngine, previous: Optional[GameSnapshot] = None) -> GameSnapshot:
+    """保存引擎状态，与 previous 相同的部分共享"""
+    if previous is None:
+        disks = tuple(tuple(disk) for disk in engine.disks)
+        players = tuple(_board_node(board, None) for board in engine.players)
+        bag, discard, center = tuple(engine.bag), tuple(engine.discard), tuple(engine.center)
+        rng_state = engine.rng.getstate()
+    else:
+        disks = tuple(_shared(disk, old) for disk, old in zip(engine.disks, previous.disks))
+        if disks == previous.disks:
+            disks = previous.disks
+        players = tuple(_board_node(board, old) for board, old in zip(engine.players, previous.players))
+        bag = _shared(engine.bag, previous.bag)
+        discard = _shared(engine.discard, previous.discard)
+        center = _shared(engine.center, previous.center)
+        # 同一回合内没有发牌，随机数状态不变
+        rng_state = previous.rng_state if previous.round_count == engine.round_count else engine.rng.getstate()
+    return GameSnapshot(bag, discard, disks, center, engine.first_token_in_center,
+                        engine.first_player_decided, engine.next_first_player, engine.current_player,
+                        engine.round_count, engine.game_over, engine.table_hash, players, rng_state)
+
+
+def restore_snapshot(snapshot: GameSnapshot) -> AzulEngine:
+    """根据快照创建一个新的引擎（拥有自己的随机数生成器）"""
+    engine = AzulEngine.__new__(AzulEngine)
+    engine.rng = random.Random()
+    engine.rng.setstate(snapshot.rng_state)
+    engine.players = []
+    for node in snapshot.players:
+        state = PlayerState.__new__(PlayerState)
+        state.name = node.name
+        state.seat = node.seat
+        state.prep_colors = [row.color for row in node.rows]
+        state.prep_counts = [row.count for row in node.rows]
+        state.wall = node.wall
+        state.floor = list(node.floor)
+        state.score = node.score
+        state.hash = node.hash
+        state.allowed = [0] * NUM_ROWS
+        state.refresh_allowed()
+        engine.players.append(state)
+    engine.bag = list(snapshot.bag)
+    engine.discard = list(snapshot.discard)
+    engine.disks = [list(disk) for disk in snapshot.disks]
+    engine.center = list(snapshot.center)
+    engine.tiles_on_table = sum(engine.center) + sum(sum(disk) for disk in engine.disks)
+    engine.first_token_in_center = snapshot.first_token_in_center
+    engine.first_player_decided = snapshot.first_player_decided
+    engine.next_first_player = snapshot.next_first_player
+    engine.current_player = snapshot.current_player
+    engine.round_count = snapshot.round_count
+    engine.game_over = snapshot.game_over
+    engine.table_hash = snapshot.table_hash
+    return engine
+
+
+class History:
+    """悔棋/重做栈，保存的是共享结构的快照"""
+
+    def __init__(self):
+        self.undo_stack: List[GameSnapshot] = []
+        self.redo_stack: List[GameSnapshot] = []
+
+    @property
+    def current(self) -> Optional[GameSnapshot]:
+        return self.undo_stack[-1] if self.undo_stack else None
+
+    def record(self, engine: AzulEngine):
+        """走完一步后记录新局面，之前撤销的步骤不能再重做"""
+        self.undo_stack.append(take_snapshot(engine, self.current))
+        self.redo_stack.clear()
+
+    def can_undo(self) -> bool:
+        return len(self.undo_stack) > 1
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def undo(self) -> Optional[GameSnapshot]:
+        """回到上一个局面，返回该局面的快照"""
+        if not self.can_undo():
+            return None
+        self.redo_stack.append(self.undo_stack.pop())
+        return self.undo_stack[-1]
+
+    def redo(self) -> Optional[GameSnapshot]:
+        if not self.redo_stack:
+            return None
+        self.undo_stack.append(self.redo_stack.pop())
+        return self.undo_stack[-1]
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+# 模块都在仓库根目录下
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 界面测试不打开真正的窗口
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+
+def state_of(engine) -> tuple:
+    """比较用的完整引擎状态（复制所有列表，之后修改引擎不影响结果）"""
+    boards = tuple((board.prep_colors[:], board.prep_counts[:], board.wall, board.floor[:], board.score)
+                   for board in engine.players)
+    return (engine.bag[:], engine.discard[:], [disk[:] for disk in engine.disks], engine.center[:],
+            engine.tiles_on_table, engine.first_token_in_center, engine.first_player_decided,
+            engine.next_first_player, engine.current_player, engine.round_count, engine.game_over,
+            engine.key, boards)
+
+
+class FakeClock:
+    """代替 pygame.time.get_ticks 的可控时钟（毫秒）"""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self) -> int:
+        return self.now
+
+    def advance(self, ms: int):
+        self.now += ms
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import pygame
+    fake = FakeClock()
+    monkeypatch.setattr(pygame.time, "get_ticks", fake)
+    monkeypatch.setattr(pygame.time, "wait", lambda ms: None)
+    return fake
@@ -0,0 +1,56 @@
+import random
+
+from alphabeta import AlphaBetaPlayer, AlphaBetaSearch, evaluate
+from engine import AzulEngine
+from moves import generate_moves
+
+
+def random_position(seed: int, tiles: int) -> AzulEngine:
+    """第一回合随机走到桌面剩余不超过 tiles 颗棋子"""
+    rng = random.Random(seed)
+    engine = AzulEngine(seed)
+    engine.start_new_round()
+    while engine.tiles_on_table > tiles:
+        move = rng.choice(generate_moves(engine))
+        engine.play(move.source, move.color, move.target)
+    return engine
+
+
+def minimax(engine, depth: int) -> int:
+    """不剪枝的定深搜索，叶子用 evaluate"""
+    if engine.is_round_over() or depth == 0:
+        return evaluate(engine)
+    player = engine.current_player
+    best = None
+    for move in generate_moves(engine):
+        child = engine.copy()
+        child.play(move.source, move.color, move.target)
+        value = minimax(child, depth - 1) if child.current_player == player else -minimax(child, depth - 1)
+        best = value if best is None else max(best, value)
+    return best
+
+
+def test_full_search_matches_minimax():
+    for seed in range(15):
+        engine = random_position(seed, 6)
+        if engine.is_round_over():
+            continue
+        move, value = AlphaBetaSearch().search(engine)
+        assert value == minimax(engine, 99)
+        assert move in generate_moves(engine)
+
+
+def test_depth_limited_search_matches_minimax():
+    for seed in range(5):
+        engine = random_position(seed, 12)
+        for depth in (1, 2):
+            search = AlphaBetaSearch(max_depth=depth)
+            _, value = search.search(engine)
+            assert search.completed_depth == depth
+            assert value == minimax(engine, depth)
+
+
+def test_player_is_reproducible_without_time_limit():
+    engine = random_position(3, 14)
+    moves = [AlphaBetaPlayer(time_limit=None, max_depth=3).choose_move(engine) for _ in range(2)]
+    assert moves[0] == moves[1] and moves[0] in generate_moves(engine)
@@ -0,0 +1,41 @@
+import pygame
+
+from assets import TileAtlas, clear, get_font, render_text
+
+COLORS = [(100, 140, 255), (255, 230, 150)]
+
+
+def setup_module():
+    pygame.init()
+
+
+def test_fonts_and_text_are_shared():
+    clear()
+    assert get_font(24) is get_font(24) and get_font(24) is not get_font(36)
+    first = render_text("Score: 5", 24, (0, 0, 0))
+    assert render_text("Score: 5", 24, (0, 0, 0)) is first
+    assert render_text("Score: 5", 24, (255, 0, 0)) is not first
+    assert render_text.cache_info().hits == 1
+    clear()
+    assert render_text("Score: 5", 24, (0, 0, 0)) is not first
+
+
+def test_tile_atlas_preloads_every_variant():
+    atlas = TileAtlas(30, (100, 100, 100))
+    atlas.preload(COLORS)
+    assert len(atlas.sprites) == len(COLORS) * 4
+    sprite = atlas.sprite(COLORS[0], False, True)
+    assert sprite is atlas.sprite(COLORS[0], False, True)
+    assert sprite.get_size() == (34, 34)
+    # 选中的高亮画在边距里，没有选中时边距透明
+    assert atlas.sprite(COLORS[0], False, False).get_at((17, 1)).a == 0
+    assert sprite.get_at((17, 1))[:3] == (255, 255, 0)
+
+
+def test_blit_offsets_by_margin():
+    atlas = TileAtlas(30, (100, 100, 100))
+    screen = pygame.Surface((60, 60))
+    screen.fill((0, 0, 0))
+    atlas.blit(screen, 10, 10, COLORS[1], False, False)
+    assert screen.get_at((25, 25))[:3] == COLORS[1]
+    assert screen.get_at((5, 5))[:3] == (0, 0, 0)
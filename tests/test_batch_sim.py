@@ -0,0 +1,88 @@
+import random
+
+import numpy as np
+
+from batch_sim import NUM_SOURCES, NUM_TARGETS, BatchSimulator, move_arrays
+from conftest import state_of
+from engine import AzulEngine, CENTER, NUM_COLORS, NUM_DISKS
+from moves import generate_moves
+
+
+def legal_set(mask: np.ndarray) -> set:
+    return {(CENTER if source == NUM_DISKS else int(source), int(color), int(target))
+            for source, color, target in zip(*np.nonzero(mask))}
+
+
+def test_lockstep_with_engine():
+    rng = random.Random(0)
+    engines = [AzulEngine(seed) for seed in range(40)]
+    for engine in engines:
+        engine.start_new_round()
+    rounds = 0
+    while not all(engine.game_over for engine in engines):
+        sim = BatchSimulator.from_engines(engines)
+        while sim.active().any():
+            legal = sim.legal_mask()
+            assert legal.shape[1:] == (NUM_SOURCES, NUM_COLORS, NUM_TARGETS)
+            moves = []
+            for i, engine in enumerate(engines):
+                generated = generate_moves(engine) if sim.active()[i] else []
+                assert legal_set(legal[i]) == {(m.source, m.color, m.target) for m in generated}
+                moves.append(rng.choice(generated) if generated else None)
+            active = np.array([move is not None for move in moves])
+            playing = [move for move in moves if move is not None]
+            source, color, target = move_arrays(playing)
+            full = [np.zeros(len(engines), dtype=values.dtype) for values in (source, color, target)]
+            for values, part in zip(full, (source, color, target)):
+                values[active] = part
+            sim.step(*full, mask=active)
+            for i, move in enumerate(moves):
+                if move is not None:
+                    engines[i].play(move.source, move.color, move.target)
+                assert state_of(sim.to_engine(i)) == state_of(engines[i])
+        sim.score_round()
+        for i, engine in enumerate(engines):
+            if not engine.game_over:
+                engine.score_round()
+            assert state_of(sim.to_engine(i)) == state_of(engine)
+            if not engine.game_over:
+                engine.start_new_round()
+        rounds += 1
+    assert rounds >= 5
+
+
+def test_random_batch_finishes():
+    sim = BatchSimulator(64, seed=1)
+    scores = sim.play_random()
+    assert scores.shape == (64, 2)
+    assert sim.game_over.all()
+    # 每种颜色的棋子总数不变
+    wall = sim.wall.reshape(64, 2, 5, 5)
+    totals = sim.bag.sum(axis=1) + sim.discard.sum(axis=1) + wall.sum(axis=(1, 2, 3))
+    assert (totals + (sim.prep_counts.sum(axis=(1, 2))) == 100).all()
+
+
+def test_final_round_bonuses_match_engine():
+    rng = random.Random(1)
+    engines = []
+    for seed in range(200):
+        engine = AzulEngine(seed)
+        engine.start_new_round()
+        while True:
+            moves = generate_moves(engine)
+            move = rng.choice([m for m in moves if not m.overflow] or moves)
+            engine.play(move.source, move.color, move.target)
+            if not engine.is_round_over():
+                continue
+            scored = engine.copy()
+            scored.score_round()
+            if scored.game_over:
+                engines.append(engine)
+                break
+            engine.finish_round()
+    sim = BatchSimulator.from_engines(engines)
+    sim.score_round()
+    assert sim.game_over.all()
+    for i, engine in enumerate(engines):
+        engine.score_round()
+        assert sim.score[i].tolist() == [board.score for board in engine.players]
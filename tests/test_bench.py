@@ -0,0 +1,52 @@
+import json
+import sys
+
+import pytest
+
+import bench
+
+
+def results(**best):
+    return {"results": {name: {"best_ns": value, "median_ns": value, "ops": 1, "repeat": 1}
+                        for name, value in best.items()}}
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = results(deal=100.0, playout=100.0, hit_test=100.0)
+    current = results(deal=115.0, playout=105.0, hit_test=80.0, draw_idle=10.0)
+    lines, regressions = bench.compare(baseline, current, 0.10)
+    assert regressions == ["deal"]
+    report = dict(zip([line.split()[0] for line in lines[1:]], lines[1:]))
+    assert report["deal"].endswith("REGRESSION")
+    assert report["hit_test"].endswith("faster")
+    assert report["draw_idle"].endswith("new")
+    assert "REGRESSION" not in report["playout"] and "faster" not in report["playout"]
+
+
+@pytest.mark.parametrize("name", list(bench.CASES))
+def test_every_case_runs(name, clock):
+    result = bench.measure(name, 0, 1)
+    assert result["ops"] > 0 and result["repeat"] == 1
+    assert 0 <= result["best_ns"] <= result["median_ns"]
+
+
+def test_main_writes_results_and_exits_on_regression(tmp_path, monkeypatch):
+    out = tmp_path / "current.json"
+    monkeypatch.setattr(sys, "argv", ["bench.py", "deal", "--repeat", "1", "--out", str(out)])
+    bench.main()
+    saved = json.loads(out.read_text(encoding="utf-8"))
+    assert list(saved["results"]) == ["deal"] and saved["seed"] == 0
+
+    # 基准快得多时，当前结果算作退化
+    saved["results"]["deal"]["best_ns"] /= 100
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(saved), encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["bench.py", "deal", "--repeat", "1", "--compare", str(baseline)])
+    with pytest.raises(SystemExit) as exit_info:
+        bench.main()
+    assert exit_info.value.code == 1
+
+    monkeypatch.setattr(sys, "argv", ["bench.py", "no_such_case"])
+    with pytest.raises(SystemExit) as exit_info:
+        bench.main()
+    assert exit_info.value.code == 2
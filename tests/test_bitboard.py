@@ -0,0 +1,77 @@
+import random
+
+from bitboard import (COLOR_BONUS, COLUMN_BONUS, ROW_BONUS, WALL_SIZE, adjacency_score, bonus_score,
+                      cell_bit, column_bits, complete_colors, complete_columns, complete_rows,
+                      has_complete_row, is_color_complete, is_column_full, is_row_full, placement_score,
+                      row_bits)
+
+
+def random_masks(count: int = 2000, seed: int = 0):
+    rng = random.Random(seed)
+    # 不同的填充密度，让整行、整列都能出现
+    return [sum(1 << cell for cell in range(25) if rng.random() < density)
+            for density in (0.2, 0.5, 0.8, 0.95) for _ in range(count // 4)]
+
+
+def filled(mask: int, row: int, col: int) -> bool:
+    return bool(mask >> (row * WALL_SIZE + col) & 1)
+
+
+def line_count_score(cells) -> int:
+    count = sum(cells)
+    return count if count >= 2 else 0
+
+
+def run_length(cells, pos: int) -> int:
+    if not cells[pos]:
+        return 0
+    start = end = pos
+    while start > 0 and cells[start - 1]:
+        start -= 1
+    while end < WALL_SIZE - 1 and cells[end + 1]:
+        end += 1
+    return end - start + 1
+
+
+def test_row_and_column_gather():
+    for mask in random_masks():
+        for i in range(WALL_SIZE):
+            assert row_bits(mask, i) == sum(filled(mask, i, col) << col for col in range(WALL_SIZE))
+            assert column_bits(mask, i) == sum(filled(mask, row, i) << row for row in range(WALL_SIZE))
+
+
+def test_scores_match_naive_loops():
+    for mask in random_masks():
+        for row in range(WALL_SIZE):
+            for col in range(WALL_SIZE):
+                placed = mask | cell_bit(row, col)
+                horizontal = [filled(placed, row, c) for c in range(WALL_SIZE)]
+                vertical = [filled(placed, r, col) for r in range(WALL_SIZE)]
+                expected = line_count_score(horizontal) + line_count_score(vertical)
+                assert placement_score(placed, row, col) == (expected or 1)
+                runs = [run_length(horizontal, col), run_length(vertical, row)]
+                expected = sum(length for length in runs if length >= 2)
+                assert adjacency_score(placed, row, col) == (expected or 1)
+
+
+def test_full_lines_match_naive_loops():
+    for mask in random_masks():
+        rows = [all(filled(mask, row, col) for col in range(WALL_SIZE)) for row in range(WALL_SIZE)]
+        columns = [all(filled(mask, row, col) for row in range(WALL_SIZE)) for col in range(WALL_SIZE)]
+        colors = [all(filled(mask, row, (row + color) % WALL_SIZE) for row in range(WALL_SIZE))
+                  for color in range(WALL_SIZE)]
+        assert [is_row_full(mask, i) for i in range(WALL_SIZE)] == rows
+        assert [is_column_full(mask, i) for i in range(WALL_SIZE)] == columns
+        assert [is_color_complete(mask, i) for i in range(WALL_SIZE)] == colors
+        assert has_complete_row(mask) == any(rows)
+
+
+def test_bonus_counts_match_naive_loops():
+    for mask in random_masks() + [0, (1 << 25) - 1]:
+        rows = sum(all(filled(mask, row, col) for col in range(WALL_SIZE)) for row in range(WALL_SIZE))
+        columns = sum(all(filled(mask, row, col) for row in range(WALL_SIZE)) for col in range(WALL_SIZE))
+        colors = sum(all(filled(mask, row, (row + color) % WALL_SIZE) for row in range(WALL_SIZE))
+                     for color in range(WALL_SIZE))
+        assert (complete_rows(mask), complete_columns(mask), complete_colors(mask)) == (rows, columns, colors)
+        assert bonus_score(mask) == rows * ROW_BONUS + columns * COLUMN_BONUS + colors * COLOR_BONUS
+    assert bonus_score((1 << 25) - 1) == 5 * 2 + 5 * 7 + 5 * 10
@@ -0,0 +1,56 @@
+import random
+
+from bots import make_bot
+from endgame import EndgamePlayer, EndgameSolver, enumerate_value, random_position
+from engine import AzulEngine
+from moves import generate_moves
+
+
+def later_position(seed: int, tiles: int) -> AzulEngine:
+    """随机走到第2到4回合桌面剩余不超过 tiles 颗棋子的局面（走法包括大量扣分）"""
+    rng = random.Random(seed)
+    engine = AzulEngine(seed)
+    engine.start_new_round()
+    target_round = 2 + seed % 3
+    while not (engine.round_count >= target_round and engine.tiles_on_table <= tiles):
+        move = rng.choice(generate_moves(engine))
+        engine.play(move.source, move.color, move.target)
+        if engine.is_round_over():
+            engine.finish_round()
+            if engine.game_over:
+                return None
+    return engine
+
+
+def test_solver_matches_enumeration():
+    positions = [random_position(seed, tiles) for seed in range(20) for tiles in (5, 7)]
+    positions += [later_position(seed, 6) for seed in range(20)]
+    checked = 0
+    for engine in positions:
+        if engine is None or engine.is_round_over():
+            continue
+        solver = EndgameSolver()
+        move, value = solver.solve(engine)
+        assert value == enumerate_value(engine)
+        values = solver.move_values(engine)
+        assert max(v for _, v in values) == value
+        assert dict(values)[move] == value
+        checked += 1
+    assert checked > 40
+
+
+def test_endgame_player_switches_at_tile_limit():
+    player = make_bot("random:endgame=6", 0)
+    assert isinstance(player, EndgamePlayer) and player.max_tiles == 6
+    engine = random_position(4, 12)
+    try:
+        while not engine.is_round_over():
+            move = player.choose_move(engine)
+            if engine.tiles_on_table > 6:
+                assert player.last_value is None
+            else:
+                assert player.last_value == enumerate_value(engine)
+                assert player.solver.move_value(engine, move) == player.last_value
+            engine.play(move.source, move.color, move.target)
+    finally:
+        player.close()
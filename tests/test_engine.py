@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from conftest import state_of
+from engine import (AzulEngine, BONUS_EVENT, CENTER, FIRST_TOKEN, FLOOR, NUM_COLORS, NUM_DISKS,
+                    TILES_PER_COLOR)
+from moves import generate_moves
+
+
+def total_tiles(engine: AzulEngine) -> int:
+    """棋子池、废棋堆、桌面和双方棋盘上的棋子总数（不含先手棋子）"""
+    total = sum(engine.bag) + sum(engine.discard) + sum(engine.center)
+    total += sum(sum(disk) for disk in engine.disks)
+    for board in engine.players:
+        total += sum(board.prep_counts) + bin(board.wall).count("1")
+        total += sum(1 for tile in board.floor if tile != FIRST_TOKEN)
+    return total
+
+
+@pytest.mark.parametrize("move", [
+    (-2, 0, 0),             # 负数下标会指向第4个圆盘
+    (NUM_DISKS, 0, 0),
+    (0, -1, 0),             # 负数颜色会指向白色
+    (0, NUM_COLORS, 0),
+    (0, 0, -1),
+    (0, 0, FLOOR + 1),
+])
+def test_play_rejects_out_of_range(move):
+    engine = AzulEngine(seed=1)
+    engine.start_new_round()
+    before = state_of(engine)
+    with pytest.raises(ValueError):
+        engine.play(*move)
+    assert state_of(engine) == before
+
+
+def test_play_rejects_missing_color_and_full_row():
+    engine = AzulEngine(seed=1)
+    engine.start_new_round()
+    missing = next(color for color in range(NUM_COLORS) if engine.disks[0][color] == 0)
+    with pytest.raises(ValueError):
+        engine.play(0, missing, 0)
+    with pytest.raises(ValueError):
+        engine.play(CENTER, 0, 0)
+
+    color = next(color for color in range(NUM_COLORS) if engine.disks[0][color])
+    engine.play(0, color, 0)
+    engine.current_player = 0
+    other = next(c for c in range(NUM_COLORS) if c != color and engine.center[c])
+    before = state_of(engine)
+    with pytest.raises(ValueError):
+        engine.play(CENTER, other, 0)
+    assert state_of(engine) == before
+
+
+def test_random_games_conserve_tiles():
+    for seed in range(20):
+        rng = random.Random(seed)
+        engine = AzulEngine(seed)
+        engine.start_new_round()
+        while not engine.game_over:
+            move = rng.choice(generate_moves(engine))
+            engine.play(move.source, move.color, move.target)
+            assert total_tiles(engine) == NUM_COLORS * TILES_PER_COLOR
+            if engine.is_round_over():
+                engine.finish_round()
+                assert total_tiles(engine) == NUM_COLORS * TILES_PER_COLOR
+        assert engine.round_count >= 5
+
+
+def test_bonus_is_applied_once_when_the_game_ends():
+    for seed in range(20):
+        rng = random.Random(seed)
+        engine = AzulEngine(seed)
+        engine.start_new_round()
+        while True:
+            move = rng.choice(generate_moves(engine))
+            engine.play(move.source, move.color, move.target)
+            if not engine.is_round_over():
+                continue
+            before = [board.score for board in engine.players]
+            events = engine.score_round()
+            bonuses = [event for event in events if event.kind == BONUS_EVENT]
+            if not engine.game_over:
+                assert not bonuses
+                engine.start_new_round()
+                continue
+            for player, board in enumerate(engine.players):
+                bonus = board.end_game_bonus()
+                assert [event.score for event in bonuses if event.player == player] == (
+                    [bonus.total] if bonus.total else [])
+                assert board.score == before[player] + sum(event.score for event in events
+                                                           if event.player == player)
+            assert any(board.end_game_bonus().rows for board in engine.players)
+            break
+
+
+def test_copy_does_not_share_mutable_state():
+    engine = AzulEngine(7)
+    engine.start_new_round()
+    copy = engine.copy()
+    before = state_of(engine)
+    rng = random.Random(7)
+    while not copy.is_round_over():
+        move = rng.choice(generate_moves(copy))
+        copy.play(move.source, move.color, move.target)
+    copy.finish_round()
+    assert state_of(engine) == before
@@ -0,0 +1,182 @@
+import pygame
+
+import game as game_module
+from game import Game, PlayerBoard
+
+
+def test_static_board_layer_is_cached_until_layout_changes(clock):
+    Game()
+    board = PlayerBoard(50, 50, "Player 1")
+    layer = board.static_layer()
+    assert board.static_layer() is layer
+    board.penalty_values = [-2] * 7
+    changed = board.static_layer()
+    assert changed is not layer
+    board.x += 10
+    assert board.static_layer() is not changed
+
+
+def test_cached_board_matches_direct_drawing(clock):
+    Game()
+    board = PlayerBoard(50, 50, "Player 1")
+    cached = pygame.Surface((400, 300))
+    cached.fill(game_module.BACKGROUND)
+    board.draw_prep_area(cached)
+    board.draw_scoring_area(cached)
+    board.draw_penalty_area(cached)
+    # 同一块板放在别的位置时，静态层的内容只是整体平移
+    moved = PlayerBoard(10, 20, "Player 1")
+    other = pygame.Surface((400, 300))
+    other.fill(game_module.BACKGROUND)
+    moved.draw_prep_area(other)
+    moved.draw_scoring_area(other)
+    moved.draw_penalty_area(other)
+    area = pygame.Rect(50, 50, 350, 232)
+    assert (pygame.image.tostring(cached.subsurface(area), "RGB")
+            == pygame.image.tostring(other.subsurface(area.move(-40, -30)), "RGB"))
+
+
+def test_disk_layer_is_shared(clock):
+    game = Game()
+    assert game.disk_layer() is game.disk_layer()
+
+
+def test_idle_game_presents_nothing(clock):
+    game = Game()
+    assert game.draw()
+    game.handle_click(game.game_button.rect.center)
+    game.draw()
+    clock.advance(5000)
+    game.draw()
+    assert not game.is_animating()
+    assert not game.draw()
+    # 结算动画期间按帧率刷新，结束后恢复空闲
+    game.show_error_message("hello")
+    assert game.is_animating()
+    clock.advance(2500)
+    assert not game.is_animating()
+
+
+def test_run_exits_on_quit(clock):
+    game = Game(instant=True)
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+    game.run()
+    assert not pygame.get_init()
+
+
+def test_center_area_keeps_arrival_order():
+    from game import COLORS, GRAY, CenterArea, Piece
+    area = CenterArea()
+    token = Piece(GRAY, is_first=True)
+    area.add(token)
+    for color_id in (2, 0, 2, 4):
+        area.add(Piece(COLORS[color_id]))
+    assert [color for color, _ in area.groups()] == [COLORS[2], COLORS[0], COLORS[4]]
+    assert area.counts() == [1, 0, 2, 0, 1] and len(area) == 5 and token in area
+    assert len(area.take_color(COLORS[2])) == 2 and area.take_color(COLORS[3]) == []
+    # 同步引擎的数量：已有的桶保持原位置并保留原来的棋子，新颜色排在最后
+    kept = area.color_pieces(COLORS[0])[0]
+    area.sync_counts([3, 1, 0, 0, 1], None)
+    assert [color for color, _ in area.groups()] == [COLORS[0], COLORS[4], COLORS[1]]
+    assert area.color_pieces(COLORS[0])[0] is kept and area.counts() == [3, 1, 0, 0, 1]
+    assert token not in area and list(area)[0] is kept
+    area.sync_counts([1, 0, 0, 0, 0], token)
+    assert area.counts() == [1, 0, 0, 0, 0] and area.take_first_piece() is token
+
+
+def test_center_area_matches_engine_during_play(clock):
+    import random
+
+    from moves import generate_moves
+    game = Game(instant=True)
+    game.engine.rng = random.Random(2)
+    game.handle_click(game.game_button.rect.center)
+    rng = random.Random(2)
+    played = 0
+    for _ in range(60):
+        if game.state != game_module.GameState.RUNNING:
+            break
+        move = rng.choice(generate_moves(game.engine))
+        game.play_move(move.source, move.color, move.target)
+        assert game.waiting_area.counts() == game.engine.center
+        assert (game.first_piece in game.waiting_area) == game.engine.first_token_in_center
+        played += 1
+    assert played >= 15
+
+
+def test_layout_converts_back_to_the_same_engine_state(clock):
+    import random
+
+    from moves import generate_moves
+    game = Game(instant=True)
+    game.engine.rng = random.Random(4)
+    game.handle_click(game.game_button.rect.center)
+    rng = random.Random(4)
+    for _ in range(25):
+        if game.state != game_module.GameState.RUNNING:
+            break
+        engine = game.engine_from_layout()
+        assert engine.key == game.engine.key
+        assert (engine.bag, engine.discard, engine.disks, engine.center) == \
+            (game.engine.bag, game.engine.discard, game.engine.disks, game.engine.center)
+        move = rng.choice(generate_moves(game.engine))
+        game.play_move(move.source, move.color, move.target)
+
+
+class GatedPlayer:
+    """等到 gate 打开才返回第一个合法走法的电脑玩家"""
+
+    def __init__(self):
+        import threading
+        self.gate = threading.Event()
+
+    def choose_move(self, engine):
+        from moves import generate_moves
+        assert self.gate.wait(5)
+        return generate_moves(engine)[0]
+
+    def close(self):
+        self.gate.set()
+
+
+def test_ai_searches_without_blocking_the_window(clock):
+    import random
+
+    from moves import generate_moves
+    bot = GatedPlayer()
+    game = Game(ai_seat=2, ai_player=bot, instant=True)
+    game.engine.rng = random.Random(1)
+    game.handle_click(game.game_button.rect.center)
+    move = generate_moves(game.engine)[0]
+    game.play_move(move.source, move.color, move.target)
+    assert game.is_ai_turn() and game.is_animating()
+    before = game.engine.key
+
+    # 搜索在后台进行，界面继续绘制，思考期间不按帧率刷新
+    game.update_ai_move()
+    assert game.ai_search is not None and not game.ai_search.done()
+    game.draw()
+    clock.advance(2500)
+    assert not game.is_animating()
+    game.update_ai_move()
+    assert game.engine.key == before and game.is_ai_turn()
+
+    pygame.event.clear()
+    bot.gate.set()
+    game.ai_search.result()
+    assert pygame.event.get(game_module.AI_MOVE_READY)
+    game.update_ai_move()
+    assert not game.is_ai_turn() and game.engine.key != before
+
+    # 思考期间悔棋，搜索结果作废
+    bot.gate.clear()
+    move = generate_moves(game.engine)[0]
+    game.play_move(move.source, move.color, move.target)
+    game.update_ai_move()
+    game.undo()
+    undone = game.engine.key
+    bot.gate.set()
+    game.ai_search.result()
+    game.update_ai_move()
+    assert game.ai_search is None and game.engine.key == undone and not game.is_ai_turn()
+    game.ai_executor.shutdown()
@@ -0,0 +1,89 @@
+import os
+import random
+
+import numpy as np
+
+from engine import AzulEngine
+from gamestore import INDEXES, GameStore
+from moves import generate_moves
+from replay import Replay, ReplayWriter
+
+
+def random_replays(count: int, first_seed: int = 0):
+    replays = []
+    for seed in range(first_seed, first_seed + count):
+        rng = random.Random(seed)
+        engine = AzulEngine(seed)
+        names = ("random", "greedy") if seed % 2 else ("greedy", "other")
+        writer = ReplayWriter(seed, names)
+        engine.start_new_round()
+        while not engine.game_over:
+            writer.round(engine)
+            while not engine.is_round_over():
+                move = rng.choice(generate_moves(engine))
+                engine.play(move.source, move.color, move.target)
+                writer.move(move.source, move.color, move.target)
+            engine.finish_round()
+        writer.end(engine)
+        replays.append(Replay.parse(writer.getvalue())[0])
+    return replays
+
+
+def check_indexes(store: GameStore):
+    """增量合并的索引和从头稳定排序的结果一致"""
+    for name, (table, field) in INDEXES.items():
+        records = store.games if table == "games" else store.positions
+        values = np.asarray(records[field])
+        columns = 1 if values.ndim == 1 else values.shape[1]
+        all_keys = values.reshape(-1)
+        order = np.argsort(all_keys, kind="stable")
+        keys, rows = store.index(name)
+        assert np.array_equal(keys, all_keys[order]), name
+        assert np.array_equal(rows, order // columns), name
+
+
+def test_indexes_grow_incrementally(tmp_path):
+    path = str(tmp_path / "games.db")
+    replays = random_replays(12)
+    for start, end in ((0, 5), (5, 6), (6, 12)):
+        store = GameStore(path)
+        store.add_replays(replays[start:end])
+        check_indexes(store)
+    assert len(GameStore(path)) == 12
+
+
+def test_queries_match_brute_force(tmp_path):
+    store = GameStore(str(tmp_path / "games.db"))
+    store.add_replays(random_replays(10))
+    positions, games = np.array(store.positions), np.array(store.games)
+    rows = store.find_positions(round=3, min_floor=3)
+    assert np.array_equal(rows, np.flatnonzero((positions["round"] == 3) & (positions["floor"].max(1) >= 3)))
+    greedy = store.games_with_bot("greedy")
+    assert np.array_equal(greedy, np.flatnonzero((games["bots"] == store.bot_id("greedy")).any(1)))
+    assert np.array_equal(store.lookup("score", 20, 1000), np.flatnonzero(games["scores"].max(1) >= 20))
+    rows = store.find_positions(round=2, min_floor=2, player=1, games=greedy)
+    expected = (positions["round"] == 2) & (positions["floor"][:, 1] >= 2) & np.isin(positions["game"], greedy)
+    assert np.array_equal(rows, np.flatnonzero(expected))
+
+
+def test_crash_recovery(tmp_path):
+    path = str(tmp_path / "games.db")
+    store = GameStore(path)
+    store.add_replays(random_replays(4))
+    num_positions = len(store.positions)
+    sizes = [os.path.getsize(os.path.join(path, name)) for name in ("positions.bin", "games.bin")]
+    del store
+    # 写完局面、结果记录只写了一半时崩溃
+    with open(os.path.join(path, "positions.bin"), "ab") as f:
+        f.write(bytes(1000))
+    with open(os.path.join(path, "games.bin"), "ab") as f:
+        f.write(bytes(7))
+
+    store = GameStore(path)
+    assert len(store) == 4 and len(store.positions) == num_positions
+    assert [os.path.getsize(os.path.join(path, name)) for name in ("positions.bin", "games.bin")] == sizes
+    store.add_replays(random_replays(2, first_seed=4))
+    assert len(store) == 6
+    assert store.games["first_position"][4] == num_positions
+    assert np.array_equal(np.unique(store.positions["game"]), np.arange(6))
+    check_indexes(store)
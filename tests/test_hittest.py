@@ -0,0 +1,52 @@
+import random
+
+import pygame
+
+from hittest import BUTTON, CENTER, DISK, PREP, GridIndex, HitTarget, IntervalTable
+
+
+def test_grid_matches_linear_scan():
+    rng = random.Random(0)
+    rects = []
+    index = GridIndex(400, 300, cell=16)
+    for i in range(60):
+        rect = pygame.Rect(rng.randrange(-20, 400), rng.randrange(-20, 300), rng.randrange(1, 80), rng.randrange(1, 80))
+        target = HitTarget(DISK, i)
+        rects.append((rect, target))
+        index.add(rect, target)
+    for _ in range(5000):
+        pos = (rng.randrange(-10, 410), rng.randrange(-10, 310))
+        expected = None
+        if 0 <= pos[0] < 400 and 0 <= pos[1] < 300:
+            # 后加入的在上层
+            expected = next((target for rect, target in reversed(rects) if rect.collidepoint(pos)), None)
+        assert index.lookup(pos) == expected
+
+
+def test_interval_table():
+    table = IntervalTable(950, 30)
+    table.add(100, 30, HitTarget(CENTER, 5))
+    table.add(130, 60, HitTarget(CENTER, 2, 0))
+    table.add(195, 30, HitTarget(CENTER, 0, 1))
+    assert table.lookup((960, 100)) == HitTarget(CENTER, 5)
+    assert table.lookup((979, 189)) == HitTarget(CENTER, 2, 0)
+    assert table.lookup((960, 192)) is None          # 颜色之间的间隔
+    assert table.lookup((960, 99)) is None and table.lookup((960, 225)) is None
+    assert table.lookup((980, 150)) is None
+    assert table.span(HitTarget(CENTER, 0, 1)) == pygame.Rect(950, 195, 30, 30)
+    assert table.span(HitTarget(CENTER, 4)) is None
+
+
+def test_game_hit_targets(clock):
+    import game as game_module
+    game = game_module.Game()
+    assert game.hit_test(game.game_button.rect.center) == HitTarget(BUTTON)
+    board = game.player2_board
+    # 第3行右对齐，最左边的格子
+    assert game.hit_test((board.x + 2 * 30 + 1, board.y + 2 * 30 + 1)) == HitTarget(PREP, 2, 2)
+    assert game.hit_test((board.x + 1, board.y + 2 * 30 + 1)).kind == game_module.BOARD
+    x, y = game.disk_position(3)
+    assert game.hit_test((x + 31, y + 31)) == HitTarget(DISK, 3, 3)
+    # 布局变化后重建索引
+    game.player2_board.y += 10
+    assert game.hit_test((board.x + 2 * 30 + 1, board.y + 2 * 30 + 1)) == HitTarget(PREP, 2, 2)
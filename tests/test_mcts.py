@@ -0,0 +1,41 @@
+from engine import AzulEngine
+from mcts import MCTSPlayer, MCTSSearch
+from moves import generate_moves
+
+
+def started(seed: int) -> AzulEngine:
+    engine = AzulEngine(seed)
+    engine.start_new_round()
+    return engine
+
+
+def test_search_is_reproducible_with_a_seed():
+    engine = started(2)
+    players = [MCTSPlayer(time_limit=None, playouts=150, seed=7) for _ in range(2)]
+    moves = [player.choose_move(engine) for player in players]
+    assert moves[0] == moves[1] and players[0].last_visits == players[1].last_visits
+    assert moves[0] in generate_moves(engine)
+    assert sum(players[0].last_visits.values()) == 150
+    legal = {move[:3] for move in generate_moves(engine)}
+    assert set(players[0].last_visits) <= legal
+
+
+def test_search_does_not_touch_the_engine():
+    engine = started(3)
+    key, bag = engine.key, engine.bag[:]
+    search = MCTSSearch(engine, seed=1)
+    # 模拟会走过回合结束，经过发牌的机会节点
+    search.run(playouts=100)
+    assert engine.key == key and engine.bag == bag
+    assert sum(search.visit_counts().values()) == 100
+
+
+def test_root_parallel_merges_visits():
+    engine = started(4)
+    player = MCTSPlayer(time_limit=None, playouts=40, workers=2, seed=1)
+    try:
+        move = player.choose_move(engine)
+    finally:
+        player.close()
+    assert move in generate_moves(engine)
+    assert sum(player.last_visits.values()) == 80
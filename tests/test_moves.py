@@ -0,0 +1,46 @@
+import random
+
+from engine import AzulEngine, CENTER, FLOOR, NUM_COLORS, NUM_DISKS, NUM_ROWS
+from moves import canonical_move, generate_moves
+
+
+def brute_force_moves(engine: AzulEngine) -> dict:
+    """逐个尝试所有 (来源, 颜色, 目标)，返回能走的走法 -> (拿到的棋子数, 溢出数)。
+    放入已满的行的走法必须和 canonical_move 给出的放入扣分区的走法结果相同"""
+    moves = {}
+    for source in [CENTER, *range(NUM_DISKS)]:
+        for color in range(NUM_COLORS):
+            for target in range(NUM_ROWS + 1):
+                child = engine.copy()
+                try:
+                    result = child.play(source, color, target)
+                except ValueError:
+                    continue
+                canonical = canonical_move(engine, source, color, target)
+                if canonical != (source, color, target):
+                    assert canonical[2] == FLOOR and result.placed == 0
+                    floor = engine.copy()
+                    floor.play(*canonical)
+                    assert floor.key == child.key
+                    continue
+                moves[source, color, target] = (result.placed + result.overflow, result.overflow)
+    return moves
+
+
+def test_generate_moves_matches_brute_force():
+    checked = 0
+    for seed in range(15):
+        rng = random.Random(seed)
+        engine = AzulEngine(seed)
+        engine.start_new_round()
+        while not engine.game_over:
+            moves = generate_moves(engine)
+            generated = {(m.source, m.color, m.target): (m.count, m.overflow) for m in moves}
+            assert len(generated) == len(moves)
+            assert generated == brute_force_moves(engine)
+            checked += 1
+            move = rng.choice(moves)
+            engine.play(move.source, move.color, move.target)
+            if engine.is_round_over():
+                engine.finish_round()
+    assert checked > 500
@@ -0,0 +1,137 @@
+import io
+import os
+import random
+import shlex
+import sys
+
+import pytest
+
+from bots import make_bot
+from engine import AzulEngine, CENTER, FLOOR
+from moves import generate_moves
+from pipebot import PipeBot, format_move, format_position, parse_move, parse_position, serve
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def command(*args: str) -> str:
+    return " ".join(shlex.quote(arg) for arg in (sys.executable, *args))
+
+
+def started(seed: int, moves: int = 0) -> AzulEngine:
+    rng = random.Random(seed)
+    engine = AzulEngine(seed)
+    engine.start_new_round()
+    for _ in range(moves):
+        move = rng.choice(generate_moves(engine))
+        engine.play(move.source, move.color, move.target)
+    return engine
+
+
+def test_move_and_position_text_round_trip():
+    for source in (CENTER, 0, 4):
+        for color in range(5):
+            for target in range(FLOOR + 1):
+                assert parse_move(format_move(source, color, target)) == (source, color, target)
+    for text in ("", "0B", "5B1", "0X1", "0B0", "0B7", "0Bff"):
+        with pytest.raises(ValueError):
+            parse_move(text)
+    engine = started(3, moves=5)
+    assert parse_position(format_position(engine)).key == engine.key
+
+
+def test_serve_answers_single_and_batch_requests():
+    engines = [started(seed, moves=seed) for seed in range(3)]
+    lines = ["azul", "isready", "newgame", f"position {format_position(engines[0])} moves", "go", "batch 2"]
+    lines += [f"{i} {format_position(engine)}" for i, engine in enumerate(engines[1:])]
+    lines.append("quit")
+    output = io.StringIO()
+    serve(make_bot("greedy", 1), "greedy", io.StringIO("\n".join(lines) + "\n"), output)
+    replies = output.getvalue().splitlines()
+    assert replies[:3] == ["id name greedy", "azulok", "readyok"]
+    assert [reply.split()[:-1] for reply in replies[3:]] == [["bestmove"], ["bestmove", "0"], ["bestmove", "1"]]
+    for reply, engine in zip(replies[3:], engines):
+        move = parse_move(reply.split()[-1])
+        assert move in {(m.source, m.color, m.target) for m in generate_moves(engine)}
+
+
+def test_pipe_bot_matches_builtin_bot():
+    bot = PipeBot(command(os.path.join(ROOT, "pipebot.py"), "serve", "greedy", "--seed", "1"))
+    local = make_bot("greedy", 1)
+    try:
+        assert bot.name == "greedy"
+        engine = started(5)
+        for _ in range(10):
+            move = bot.choose_move(engine)
+            assert move == local.choose_move(engine)
+            engine.play(move.source, move.color, move.target)
+        engines = [started(seed, moves=seed % 4) for seed in range(20)]
+        moves = bot.choose_moves(engines)
+        for engine, move in zip(engines, moves):
+            assert move in generate_moves(engine)
+    finally:
+        bot.close()
+    assert bot.process.poll() is not None
+
+
+def test_illegal_and_missing_replies(tmp_path):
+    script = tmp_path / "bad_bot.py"
+    script.write_text(
+        "import sys\n"
+        "for line in sys.stdin:\n"
+        "    words = line.split()\n"
+        "    if words[0] == 'azul':\n"
+        "        print('azulok', flush=True)\n"
+        "    elif words[0] == 'go':\n"
+        "        print('bestmove 0Bf', flush=True)\n"
+        "    elif words[0] == 'batch':\n"
+        "        sys.exit()\n")
+    bot = PipeBot(command(str(script)))
+    engine = started(1)
+    engine.disks[0] = [0, 0, 4, 0, 0]
+    try:
+        with pytest.raises(ValueError):
+            bot.choose_move(engine)
+        with pytest.raises(ConnectionError):
+            bot.choose_moves([started(2)])
+    finally:
+        bot.close()
+
+
+class FloorPlayer:
+    """总是把棋子放进扣分区，永远完成不了一行"""
+
+    def __init__(self, command: str = ""):
+        pass
+
+    def choose_move(self, engine):
+        return next(move for move in generate_moves(engine) if move.target == FLOOR)
+
+    def choose_moves(self, engines):
+        return [self.choose_move(engine) for engine in engines]
+
+    def close(self):
+        pass
+
+
+def test_batch_stops_endless_games_at_round_limit(monkeypatch):
+    import bots
+    import pipebot
+    monkeypatch.setattr(pipebot, "PipeBot", FloorPlayer)
+    monkeypatch.setattr(bots, "make_bot", lambda spec, seed=None: FloorPlayer())
+    scores = pipebot.play_batch("floor", "floor", 2)
+    assert [capped for _, _, capped in scores] == [True, True]
+
+
+def test_reply_into_full_row_counts_as_floor_move():
+    engine = started(5)
+    color = next(color for color in range(5) if engine.disks[0][color])
+    board = engine.players[engine.current_player]
+    board.prep_colors[1], board.prep_counts[1] = color, 2
+    board.refresh_allowed()
+    bot = PipeBot.__new__(PipeBot)
+    bot.name = "test"
+    move = bot._legal(engine, generate_moves(engine), format_move(0, color, 1))
+    assert (move.source, move.color, move.target) == (0, color, FLOOR)
+    with pytest.raises(ValueError):
+        bot._legal(engine, generate_moves(engine), format_move(0, (color + 1) % 5, 1))
@@ -0,0 +1,42 @@
+import json
+import time
+
+from profiler import NULL_SECTION, Profiler
+
+
+def test_sections_and_trace_export(tmp_path):
+    profiler = Profiler()
+    for _ in range(3):
+        with profiler.section("draw"):
+            pass
+    assert profiler.phases["draw"].count == 3
+    path = tmp_path / "trace.json"
+    profiler.export_chrome_trace(str(path))
+    events = json.loads(path.read_text(encoding="utf-8"))["traceEvents"]
+    assert [event["name"] for event in events if event["ph"] == "X"] == ["draw"] * 3
+
+
+def test_input_waits_for_a_presented_frame():
+    profiler = Profiler()
+    profiler.input_received()
+    first_input = profiler.pending_input
+    profiler.input_received()
+    assert profiler.pending_input == first_input
+    # 没有提交画面的帧不结束这次输入
+    for _ in range(3):
+        profiler.frame_done(False)
+    assert profiler.pending_input == first_input and not profiler.latencies
+    time.sleep(0.002)
+    profiler.frame_done(True)
+    assert profiler.pending_input is None and profiler.frames == 1
+    assert len(profiler.latencies) == 1 and profiler.latencies[0] >= 2_000_000
+    profiler.frame_done(True)
+    assert len(profiler.latencies) == 1
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler(enabled=False)
+    assert profiler.section("draw") is NULL_SECTION
+    profiler.input_received()
+    profiler.frame_done(True)
+    assert not profiler.phases and not profiler.latencies and profiler.frames == 0
@@ -0,0 +1,96 @@
+import random
+
+import pygame
+
+from moves import generate_moves
+from render import FrameStats, RetainedRenderer
+
+
+def full_redraw(game) -> pygame.Surface:
+    """按注册顺序把所有区域画到新的画布上"""
+    import game as game_module
+    surface = pygame.Surface(game.screen.get_size())
+    surface.fill(game_module.BACKGROUND)
+    screen, game.screen = game.screen, surface
+    try:
+        for region in game.renderer.regions:
+            rect = region.current_rect()
+            if rect.width and rect.height:
+                region.draw(surface)
+    finally:
+        game.screen = screen
+    return surface
+
+
+def same_pixels(a: pygame.Surface, b: pygame.Surface) -> bool:
+    return pygame.image.tostring(a, "RGB") == pygame.image.tostring(b, "RGB")
+
+
+def test_only_changed_regions_are_redrawn():
+    screen = pygame.Surface((100, 50))
+    state = {"left": 0, "right": 0}
+    renderer = RetainedRenderer(screen, (0, 0, 0))
+    renderer.add("left", pygame.Rect(0, 0, 50, 50), lambda: state["left"],
+                 lambda surface: surface.fill((state["left"], 0, 0), (0, 0, 50, 50)))
+    renderer.add("right", pygame.Rect(50, 0, 50, 50), lambda: state["right"],
+                 lambda surface: surface.fill((0, state["right"], 0), (50, 0, 50, 50)))
+    assert renderer.render() == [screen.get_rect()]
+    assert renderer.render() == []
+    state["right"] = 200
+    before = renderer.redrawn_regions
+    assert renderer.render() == [pygame.Rect(50, 0, 50, 50)]
+    assert renderer.redrawn_regions == before + 1
+    assert screen.get_at((75, 25))[:3] == (0, 200, 0) and screen.get_at((25, 25))[:3] == (0, 0, 0)
+    renderer.invalidate("left")
+    assert renderer.render() == [pygame.Rect(0, 0, 50, 50)]
+
+
+def test_moving_region_clears_its_old_position():
+    screen = pygame.Surface((100, 50))
+    position = [0]
+    renderer = RetainedRenderer(screen, (0, 0, 0))
+    renderer.add("sprite", lambda: pygame.Rect(position[0], 0, 10, 10), lambda: position[0],
+                 lambda surface: surface.fill((255, 255, 255), (position[0], 0, 10, 10)))
+    renderer.render()
+    position[0] = 40
+    assert renderer.render() == [pygame.Rect(0, 0, 50, 10)]
+    assert screen.get_at((5, 5))[:3] == (0, 0, 0) and screen.get_at((45, 5))[:3] == (255, 255, 255)
+
+
+def test_game_dirty_rendering_matches_full_redraw(clock):
+    import game as game_module
+    game = game_module.Game()
+    game.draw()
+    game.handle_click(game.game_button.rect.center)
+    rng = random.Random(1)
+    moves = 0
+    while game.state == game_module.GameState.RUNNING and game.round_count <= 2:
+        move = rng.choice(generate_moves(game.engine))
+        if move.source != game_module.CENTER:
+            x, y = game.disk_position(move.source)
+            game.handle_click((x + 5, y + 5))
+            game.draw()
+            assert same_pixels(game.screen, full_redraw(game))
+        game.play_move(move.source, move.color, move.target)
+        game.clear_selection()
+        while game.timeline.busy:
+            clock.advance(500)
+            game.timeline.update()
+            game.draw()
+            assert same_pixels(game.screen, full_redraw(game))
+        game.draw()
+        assert same_pixels(game.screen, full_redraw(game))
+        moves += 1
+    assert moves >= 15
+    assert game.renderer.redrawn_regions < game.renderer.frames * len(game.renderer.regions) / 2
+
+
+def test_frame_stats_counts_presented_frames():
+    stats = FrameStats()
+    assert stats.report() == "No frames"
+    for presented in (True, False, True):
+        stats.begin()
+        stats.end(presented)
+    stats.idle_wakeups += 1
+    assert (stats.frames, stats.presented) == (3, 2)
+    assert stats.report().startswith("3 frames (2 presented, 1 idle wakeups)")
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from conftest import state_of
+from engine import AzulEngine
+from moves import generate_moves
+from replay import END, Replay, ReplayWriter, decode_move, encode_move, iter_replays, load_replays
+
+
+def record_game(seed: int):
+    """随机下一局，返回 (记录字节, 每步之前的局面和最后一回合结算前的局面, 最终引擎)"""
+    rng = random.Random(seed)
+    engine = AzulEngine(seed)
+    writer = ReplayWriter(seed, ("a", "b"))
+    states = []
+    engine.start_new_round()
+    while not engine.game_over:
+        writer.round(engine)
+        while not engine.is_round_over():
+            states.append(state_of(engine))
+            move = rng.choice(generate_moves(engine))
+            engine.play(move.source, move.color, move.target)
+            writer.move(move.source, move.color, move.target)
+        last = state_of(engine)
+        engine.finish_round()
+    writer.end(engine)
+    states.append(last)
+    return writer.getvalue(), states, engine
+
+
+def test_move_codes_round_trip():
+    for source in range(-1, 5):
+        for color in range(5):
+            for target in range(6):
+                code = encode_move(source, color, target)
+                assert code < 0xB4
+                assert decode_move(code) == (source, color, target)
+
+
+def test_round_trip_and_seek():
+    for seed in range(5):
+        data, states, engine = record_game(seed)
+        replay, end = Replay.parse(data)
+        assert end == len(data)
+        assert replay.seed == seed and replay.names == ("a", "b")
+        assert replay.result == (engine.players[0].score, engine.players[1].score, engine.round_count)
+        assert len(replay) + 1 == len(states)
+        # 倒序定位，每次都从关键帧恢复；最后一个是走完最后一步、还没有结算的局面
+        for index in reversed(range(len(states))):
+            assert state_of(replay.position(index)) == states[index]
+
+
+def test_several_games_in_one_file(tmp_path):
+    games = [record_game(seed) for seed in range(3)]
+    path = tmp_path / "games.azr"
+    path.write_bytes(b"".join(data for data, _, _ in games))
+    replays = load_replays(str(path))
+    assert [replay.seed for replay in replays] == [0, 1, 2]
+    assert [len(replay) + 1 for replay in replays] == [len(states) for _, states, _ in games]
+
+
+def test_game_without_end_marker_stops_at_next_header():
+    first, first_states, _ = record_game(0)
+    second, second_states, _ = record_game(1)
+    unterminated = first[:-1 - END.size]
+    replays = list(iter_replays(unterminated + second))
+    assert [replay.seed for replay in replays] == [0, 1]
+    assert replays[0].result is None and replays[1].result is not None
+    assert len(replays[0]) + 1 == len(first_states)
+    assert len(replays[1]) + 1 == len(second_states)
+    # 文件末尾写了一半的一局
+    replays = list(iter_replays(first + unterminated))
+    assert [replay.result is None for replay in replays] == [False, True]
+
+
+def test_garbage_is_rejected():
+    data, _, _ = record_game(0)
+    with pytest.raises(ValueError):
+        list(iter_replays(data + b"\xf5"))
+    with pytest.raises(ValueError):
+        Replay.parse(b"junk" + data)
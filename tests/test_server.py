@@ -0,0 +1,136 @@
+import asyncio
+import json
+
+from engine import CENTER, FLOOR
+from moves import generate_moves
+from server import MatchServer, encode, engine_from_fields, play_client
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict:
+    return json.loads(await asyncio.wait_for(reader.readline(), 5))
+
+
+def test_loopback_matches_agree_with_spectator():
+    async def main():
+        server = MatchServer(7)
+        port = await server.start()
+        first = asyncio.ensure_future(play_client("127.0.0.1", port, None, 1))
+        await asyncio.sleep(0.05)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(encode(dict(type="join", role="spectator", match=0)))
+        second = asyncio.ensure_future(play_client("127.0.0.1", port, None, 2))
+        fields = {}
+        while True:
+            message = await read_message(reader)
+            if message["type"] in ("start", "update"):
+                fields.update(message["state"] if "state" in message else message["changes"])
+            if message["type"] == "end":
+                break
+        ends = [await first, await second]
+        writer.close()
+        await server.close()
+        return fields, ends, server.stats
+
+    fields, ends, stats = asyncio.run(main())
+    scores = [board.score for board in engine_from_fields(fields).players]
+    assert ends[0]["reason"] == "finished"
+    assert scores == ends[0]["scores"] == ends[1]["scores"]
+    assert stats.matches_finished == 1
+
+
+def test_illegal_moves_are_rejected_without_changing_the_match():
+    async def main():
+        server = MatchServer(3)
+        port = await server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(encode(dict(type="join", role="player", opponent="random")))
+        start = await read_message(reader)
+        assert start["type"] == "start" and start["seat"] == 0
+        engine = next(iter(server.matches.values())).engine
+        before = engine.copy()
+        missing = next(color for color in range(5) if before.disks[0][color] == 0)
+        replies = []
+        for move in [dict(source=0, color=-1, target=0),     # 负数颜色会复制出白色棋子
+                     dict(source=-2, color=0, target=0),     # 负数下标会指向第4个圆盘
+                     dict(source=5, color=0, target=0),
+                     dict(source=0, color=0, target=FLOOR + 1),
+                     dict(source=0, color=missing, target=0),
+                     dict(source=CENTER, color=0, target=0),
+                     dict(source="x", color=0, target=0)]:
+            writer.write(encode(dict(type="move", **move)))
+            replies.append(await read_message(reader))
+            assert engine.key == before.key and engine.disks == before.disks
+            assert engine.center == before.center and engine.bag == before.bag
+        legal = generate_moves(engine_from_fields(start["state"]))[0]
+        writer.write(encode(dict(type="move", source=legal.source, color=legal.color, target=legal.target)))
+        diff = await read_message(reader)
+        writer.close()
+        await server.close()
+        return replies, diff, legal
+
+    replies, diff, legal = asyncio.run(main())
+    assert [reply["type"] for reply in replies] == ["error"] * 7
+    assert diff["type"] == "diff" and diff["move"] == [legal.source, legal.color, legal.target]
+
+
+def test_move_into_full_row_is_played_as_floor_move():
+    async def main():
+        server = MatchServer(3)
+        port = await server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(encode(dict(type="join", role="player", opponent="random")))
+        await read_message(reader)
+        engine = next(iter(server.matches.values())).engine
+        # 第1行已经放满了 1 号圆盘上的某种颜色，play() 接受放入这一行，全部溢出到扣分区
+        color = next(color for color in range(5) if engine.disks[1][color])
+        board = engine.players[0]
+        board.prep_colors[0], board.prep_counts[0] = color, 1
+        board.refresh_allowed()
+        board.rehash()
+        writer.write(encode(dict(type="move", source=1, color=color, target=0)))
+        diff = await read_message(reader)
+        writer.close()
+        await server.close()
+        return diff, color
+
+    diff, color = asyncio.run(main())
+    assert diff["type"] == "diff" and diff["move"] == [1, color, FLOOR]
+
+
+def test_moves_sent_during_bot_turn_are_rejected():
+    async def main():
+        server = MatchServer(5)
+        port = await server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(encode(dict(type="join", role="player", opponent="mcts:time=0.3")))
+        start = await read_message(reader)
+        match = next(iter(server.matches.values()))
+        first = generate_moves(match.engine)[0]
+        writer.write(encode(dict(type="move", source=first.source, color=first.color, target=first.target)))
+        own = await read_message(reader)
+        # 电脑玩家思考期间发来的走法立即被拒绝，不会留到下一步
+        early = generate_moves(match.engine.copy())[0]
+        writer.write(encode(dict(type="move", source=early.source, color=early.color, target=early.target)))
+        rejected = await read_message(reader)
+        bot = await read_message(reader)
+        await asyncio.sleep(0.1)
+        waiting = match.engine.current_player, match.inbox.qsize(), match.version
+
+        # 电脑玩家思考期间离开，对局马上结束
+        move = generate_moves(match.engine)[0]
+        writer.write(encode(dict(type="move", source=move.source, color=move.color, target=move.target)))
+        await read_message(reader)
+        writer.close()
+        started = asyncio.get_running_loop().time()
+        while server.matches:
+            await asyncio.sleep(0.01)
+        elapsed = asyncio.get_running_loop().time() - started
+        await server.close()
+        return start, own, rejected, bot, waiting, elapsed
+
+    start, own, rejected, bot, waiting, elapsed = asyncio.run(main())
+    assert start["seat"] == 0 and own["type"] == "diff"
+    assert rejected == dict(type="error", message="Not your turn")
+    assert bot["type"] == "diff" and bot["version"] == own["version"] + 1
+    assert waiting == (0, 0, bot["version"])
+    assert elapsed < 0.25
@@ -0,0 +1,109 @@
+import random
+
+from engine import AzulEngine
+from moves import generate_moves
+from snapshot import History, restore_snapshot, take_snapshot
+
+
+def play_random(engine: AzulEngine, rng: random.Random):
+    move = rng.choice(generate_moves(engine))
+    engine.play(move.source, move.color, move.target)
+    if engine.is_round_over():
+        engine.finish_round()
+
+
+def test_restore_round_trip_and_same_future():
+    for seed in range(10):
+        engine = AzulEngine(seed)
+        engine.start_new_round()
+        previous = None
+        while not engine.game_over:
+            previous = take_snapshot(engine, previous)
+            restored = restore_snapshot(previous)
+            assert restored.key == engine.key
+            assert take_snapshot(restored) == previous
+            # 恢复出来的引擎继续对局，之后的发牌和原来的一致
+            move_seed = seed * 1000 + engine.round_count
+            play_random(engine, random.Random(move_seed))
+            play_random(restored, random.Random(move_seed))
+            assert restored.key == engine.key and restored.round_count == engine.round_count
+
+
+def test_unchanged_parts_are_shared():
+    engine = AzulEngine(3)
+    engine.start_new_round()
+    before = take_snapshot(engine)
+    move = generate_moves(engine)[0]
+    engine.play(move.source, move.color, move.target)
+    after = take_snapshot(engine, before)
+    mover = before.current_player
+    assert after.players[1 - mover] is before.players[1 - mover]
+    changed = after.players[mover]
+    assert changed is not before.players[mover]
+    for row, (old, new) in enumerate(zip(before.players[mover].rows, changed.rows)):
+        assert (new is old) == (row != move.target)
+    for disk, (old, new) in enumerate(zip(before.disks, after.disks)):
+        assert (new is old) == (disk != move.source)
+    assert after.bag is before.bag and after.rng_state is before.rng_state
+
+
+def test_history_undo_redo():
+    engine = AzulEngine(5)
+    engine.start_new_round()
+    history = History()
+    history.record(engine)
+    assert not history.can_undo() and history.undo() is None
+    keys = [engine.key]
+    rng = random.Random(5)
+    for _ in range(6):
+        play_random(engine, rng)
+        history.record(engine)
+        keys.append(engine.key)
+    for key in reversed(keys[:-1]):
+        assert restore_snapshot(history.undo()).key == key
+    assert history.undo() is None
+    for key in keys[1:]:
+        assert restore_snapshot(history.redo()).key == key
+    assert history.redo() is None
+    history.undo()
+    history.record(engine)
+    assert not history.can_redo()
+
+
+class FirstMove:
+    def choose_move(self, engine):
+        return generate_moves(engine)[0]
+
+    def close(self):
+        pass
+
+
+def test_game_undo_skips_ai_moves(clock):
+    import game as game_module
+    for ai_seat in (None, 2):
+        game = game_module.Game(ai_seat=ai_seat, ai_player=FirstMove() if ai_seat else None,
+                                instant=True)
+        game.engine.rng = random.Random(1)
+        game.handle_click(game.game_button.rect.center)
+        rng = random.Random(1)
+        keys = []
+        for _ in range(40):
+            if game.is_ai_turn():
+                game.play_ai_move()
+                continue
+            keys.append((game.engine.key, game.engine.round_count))
+            move = rng.choice(generate_moves(game.engine))
+            game.play_move(move.source, move.color, move.target)
+        end = (game.engine.key, game.engine.round_count)
+        # 悔棋总是回到人类玩家走棋前的局面
+        for key in reversed(keys[-10:]):
+            game.undo()
+            assert (game.engine.key, game.engine.round_count) == key
+            assert game.current_player != ai_seat
+        for _ in range(10):
+            game.redo()
+        assert (game.engine.key, game.engine.round_count) == end
+        game.undo()
+        move = generate_moves(game.engine)[0]
+        game.play_move(move.source, move.color, move.target)
+        assert not game.history.can_redo()
@@ -0,0 +1,74 @@
+import random
+
+from conftest import FakeClock
+from moves import generate_moves
+from timeline import Timeline
+
+
+def test_steps_run_in_order_when_due():
+    clock = FakeClock()
+    timeline = Timeline(clock)
+    ran = []
+    timeline.add(100, lambda: ran.append("a"))
+    timeline.add(50, lambda: ran.append("b"))     # 上一步之后 50ms
+    assert timeline.busy and not timeline.update()
+    clock.advance(100)
+    assert timeline.update() and ran == ["a"]
+    clock.advance(49)
+    assert not timeline.update()
+    clock.advance(1)
+    assert timeline.update() and ran == ["a", "b"] and not timeline.busy
+    # 队列空了以后，新步骤从现在开始计时
+    clock.advance(1000)
+    timeline.add(10, lambda: ran.append("c"))
+    clock.advance(10)
+    timeline.update()
+    assert ran[-1] == "c"
+
+
+def test_late_update_runs_all_due_steps():
+    clock = FakeClock()
+    timeline = Timeline(clock)
+    ran = []
+    for i in range(3):
+        timeline.add(10, lambda i=i: ran.append(i))
+    clock.advance(1000)
+    timeline.update()
+    assert ran == [0, 1, 2]
+    timeline.add(10, lambda: ran.append(3))
+    timeline.clear()
+    assert not timeline.busy
+
+
+def test_instant_runs_immediately():
+    ran = []
+    timeline = Timeline(FakeClock(), instant=True)
+    timeline.add(1000, lambda: ran.append(1))
+    assert ran == [1] and not timeline.busy
+
+
+def play(instant: bool, clock) -> tuple:
+    import game as game_module
+    game = game_module.Game(instant=instant)
+    game.engine.rng = random.Random(3)
+    game.handle_click(game.game_button.rect.center)
+    rng = random.Random(0)
+    animating = 0
+    while game.state != game_module.GameState.END and game.round_count <= 3:
+        if game.state == game_module.GameState.RUNNING:
+            move = rng.choice(generate_moves(game.engine))
+            game.play_move(move.source, move.color, move.target)
+        animating += game.timeline.busy
+        clock.advance(250)
+        game.timeline.update()
+        game.draw()
+    boards = [game.player1_board, game.player2_board]
+    assert [board.score for board in boards] == [player.score for player in game.engine.players]
+    return [game.round_count] + [board.score for board in boards], animating
+
+
+def test_animated_scoring_ends_like_instant_scoring(clock):
+    animated, frames = play(False, clock)
+    instant, no_frames = play(True, clock)
+    assert animated == instant
+    assert frames > 0 and no_frames == 0
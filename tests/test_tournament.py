@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+
+import tournament
+from bots import GreedyPlayer, RandomPlayer, make_bot
+from engine import FLOOR, MAX_ROUNDS
+from mcts import MCTSPlayer
+from moves import generate_moves
+from tournament import (compute_elo, elo_difference, load_results, make_tasks, play_game, run_tournament,
+                        wilson_interval)
+
+
+def test_make_bot_specs():
+    assert isinstance(make_bot("random", 1), RandomPlayer)
+    assert isinstance(make_bot("greedy"), GreedyPlayer)
+    bot = make_bot("mcts:playouts=20,c=2", 1)
+    assert isinstance(bot, MCTSPlayer) and bot.playouts == 20 and bot.time_limit is None
+    assert bot.exploration == 2
+    with pytest.raises(ValueError):
+        make_bot("nobody")
+
+
+def test_tasks_swap_seats_for_each_seed():
+    tasks = make_tasks(["a", "b", "c"], 4, seed=10)
+    assert len(tasks) == 3 * 4 and len({task["game_id"] for task in tasks}) == 12
+    pair = [task for task in tasks if set(task["seats"]) == {"a", "b"}]
+    assert [(task["seats"], task["seed"]) for task in pair] == [
+        (["a", "b"], 10), (["b", "a"], 10), (["a", "b"], 11), (["b", "a"], 11)]
+
+
+def test_games_are_reproducible():
+    task = dict(game_id="x", seats=["random", "greedy"], seed=3)
+    first, second = play_game(task), play_game(task)
+    for result in (first, second):
+        result.pop("seconds")
+    assert first == second
+    assert first["winner"] in (0, 1, None) and first["rounds"] >= 5 and not first["capped"]
+
+
+class FloorPlayer:
+    """总是把棋子放进扣分区，永远完成不了一行"""
+
+    def choose_move(self, engine):
+        return next(move for move in generate_moves(engine) if move.target == FLOOR)
+
+    def close(self):
+        pass
+
+
+def test_endless_game_stops_at_round_limit(monkeypatch):
+    monkeypatch.setattr(tournament, "make_bot", lambda spec, seed=None: FloorPlayer())
+    result = play_game(dict(game_id="x", seats=["floor", "floor"], seed=1))
+    assert result["capped"] and result["winner"] is None
+    assert result["rounds"] == MAX_ROUNDS
+
+
+def test_results_file_resumes(tmp_path):
+    out = tmp_path / "results.jsonl"
+    tasks = make_tasks(["random", "greedy"], 4)
+    done = play_game(tasks[0])
+    # 上次运行完成了一局，最后一行只写了一半
+    out.write_text(json.dumps(done) + "\n" + '{"game_id": "0-1-1", "sea', encoding="utf-8")
+    seen = []
+    results = run_tournament(tasks, workers=2, out_path=str(out), on_result=seen.append)
+    assert sorted(result["game_id"] for result in seen) == ["0-1-1", "0-1-2", "0-1-3"]
+    assert sorted(result["game_id"] for result in results) == [task["game_id"] for task in tasks]
+    assert len(load_results(str(out))) == 4
+
+
+def test_rating_helpers():
+    low, high = wilson_interval(50, 100)
+    assert low < 0.5 < high and high - low < 0.2
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    assert elo_difference(0.5) == 0
+    assert elo_difference(0.75) == pytest.approx(190.8, abs=0.1)
+    results = [dict(seats=["a", "b"], winner=0)] * 30 + [dict(seats=["b", "a"], winner=1)] * 30
+    results += [dict(seats=["a", "b"], winner=None)] * 10
+    elo = compute_elo(results, ["a", "b"])
+    assert elo["a"] > 0 > elo["b"] and elo["a"] == pytest.approx(-elo["b"])
+
+
+def crash_on_game_1(task: dict) -> dict:
+    """在进程池中代替 play_game：对局 0-1-1 总是让进程崩溃"""
+    if task["game_id"] == "0-1-1":
+        os._exit(1)
+    return play_game(task)
+
+
+def test_worker_crash_only_blames_the_crashing_game(tmp_path, monkeypatch):
+    monkeypatch.setattr(tournament, "play_game", crash_on_game_1)
+    tasks = make_tasks(["random", "greedy"], 8)
+    started = []
+    real_run_pool = tournament._run_pool
+
+    def run_pool(game_ids, pending, workers, record):
+        started.append((list(game_ids), workers))
+        return real_run_pool(game_ids, pending, workers, record)
+
+    monkeypatch.setattr(tournament, "_run_pool", run_pool)
+    out = tmp_path / "results.jsonl"
+    results = run_tournament(tasks, workers=2, out_path=str(out))
+    expected = sorted(task["game_id"] for task in tasks if task["game_id"] != "0-1-1")
+    assert sorted(result["game_id"] for result in results) == expected
+    assert sorted(result["game_id"] for result in load_results(str(out))) == expected
+    # 崩溃后只有正在运行的两局被单独重新运行，崩溃的那局单独运行 MAX_RETRIES + 1 次后放弃
+    isolated = [game_ids[0] for game_ids, workers in started if workers == 1]
+    assert isolated.count("0-1-1") == tournament.MAX_RETRIES + 1
+    assert len(set(isolated)) <= 2
@@ -0,0 +1,61 @@
+import random
+
+from engine import AzulEngine
+from moves import generate_moves
+from zobrist import TranspositionTable
+
+
+def full_key(engine: AzulEngine) -> int:
+    """从头重新计算的哈希"""
+    fresh = engine.copy()
+    fresh.rehash()
+    return fresh.key
+
+
+def test_incremental_key_matches_full_rehash():
+    for seed in range(20):
+        rng = random.Random(seed)
+        engine = AzulEngine(seed)
+        engine.start_new_round()
+        assert engine.key == full_key(engine)
+        while not engine.game_over:
+            move = rng.choice(generate_moves(engine))
+            engine.play(move.source, move.color, move.target)
+            assert engine.key == full_key(engine)
+            if engine.is_round_over():
+                engine.finish_round()
+                assert engine.key == full_key(engine)
+
+
+def test_transposed_moves_give_the_same_key():
+    engine = AzulEngine(5)
+    engine.start_new_round()
+    # 两个玩家各从不同的圆盘拿棋子放到空行，交换先手玩家两步的顺序后局面相同
+    color_of = [next(color for color in range(5) if engine.disks[disk][color]) for disk in range(3)]
+    first, second, third = [(disk, color_of[disk], row) for disk, row in ((0, 3), (1, 0), (2, 4))]
+    keys = []
+    for order in ((first, third), (third, first)):
+        child = engine.copy()
+        child.play(*order[0])
+        child.play(*second)
+        child.play(*order[1])
+        keys.append(child.key)
+    assert keys[0] == keys[1]
+    child = engine.copy()
+    child.play(*first)
+    assert child.key != engine.key
+
+
+def test_table_replacement():
+    table = TranspositionTable(size_bits=4)
+    table.store(3, depth=5, value=10, flag=TranspositionTable.EXACT, move=(0, 1, 2))
+    # 同一个桶里较浅的结果放进总是替换槽，不挤掉深度优先槽
+    table.store(3 + 16, depth=2, value=-1, flag=TranspositionTable.LOWER)
+    assert table.probe(3).value == 10 and table.probe(3 + 16).value == -1
+    # 更深的结果占据深度优先槽，原来的结果移到总是替换槽
+    table.store(3 + 32, depth=6, value=7, flag=TranspositionTable.UPPER)
+    assert table.probe(3 + 32).depth == 6 and table.probe(3).move == (0, 1, 2)
+    assert table.probe(3 + 16) is None
+    assert len(table) == 2
+    table.clear()
+    assert table.probe(3) is None and len(table) == 0
@@ -0,0 +1,45 @@
+"""
+非阻塞的时间线
+
+结算动画等需要按时间顺序执行的步骤先放入时间线，由主循环每一帧调用 update 执行到期的步骤，
+期间界面照常绘制和响应输入。instant 模式下没有延迟，步骤在加入时立即执行（用于自动对局）。
+"""
+from collections import deque
+from typing import Callable, Deque, Tuple
+
+
+class Timeline:
+    """按顺序执行的延时步骤队列。每一步的 delay 从上一步的执行时间算起"""
+
+    def __init__(self, clock: Callable[[], int], instant: bool = False):
+        self.clock = clock          # 返回当前毫秒数，例如 pygame.time.get_ticks
+        self.instant = instant
+        self.steps: Deque[Tuple[int, Callable[[], None]]] = deque()
+        self.last_due = 0
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.steps)
+
+    def add(self, delay: int, action: Callable[[], None]):
+        """在上一步之后 delay 毫秒执行 action"""
+        if self.instant:
+            action()
+            return
+        if not self.steps:
+            self.last_due = self.clock()
+        self.last_due += delay
+        self.steps.append((self.last_due, action))
+
+    def update(self) -> bool:
+        """执行所有到期的步骤，返回是否执行了步骤"""
+        ran = False
+        now = self.clock()
+        while self.steps and self.steps[0][0] <= now:
+            _, action = self.steps.popleft()
+            action()
+            ran = True
+        return ran
+
+    def clear(self):
+        self.steps.clear()
@@ -0,0 +1,311 @@
+"""
+电脑玩家自我对弈锦标赛
+
+每对电脑玩家下若干局，同一个种子的发牌各下两局并交换座位。
+对局在进程池中并行运行，每局结束立即写入结果文件（JSON Lines）。
+同时提交的对局数不超过进程数，某个进程崩溃时只有正在运行的对局受到怀疑：
+这些对局在单进程的进程池中逐个重新运行，找出真正导致崩溃的对局，其他对局不受影响；
+使用同一个结果文件再次运行会跳过已经完成的对局。
+指定 --replays 时每局的二进制记录（见 replay.py）追加到记录文件中。
+
+用法：
+    python tournament.py random greedy mcts:playouts=200 --games 100 --workers 8
+"""
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import combinations
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from bots import make_bot
+from engine import AzulEngine, MAX_ROUNDS, PENALTY_EVENT
+from replay import ReplayWriter
+
+# 一局对局单独运行时导致进程崩溃后的最多重试次数
+MAX_RETRIES = 2
+
+
+def play_game(task: dict) -> dict:
+    """下一局，返回结果记录。task 包含 game_id、seats（两个座位的描述）和 seed，
+    task["record"] 为真时结果中的 replay 是这局的二进制记录。
+    超过 MAX_ROUNDS 回合（或 task["max_rounds"]）仍未结束的对局记为平局，capped 为真"""
+    started = time.perf_counter()
+    seed = task["seed"]
+    bots = [make_bot(spec, seed * 2 + seat) for seat, spec in enumerate(task["seats"])]
+    engine = AzulEngine(seed)
+    writer = ReplayWriter(seed, task["seats"]) if task.get("record") else None
+    penalties = [0, 0]
+    penalty_points = [0, 0]
+    max_rounds = task.get("max_rounds", MAX_ROUNDS)
+    try:
+        engine.start_new_round()
+        while not engine.game_over and engine.round_count <= max_rounds:
+            if writer:
+                writer.round(engine)
+            while not engine.is_round_over():
+                move = bots[engine.current_player].choose_move(engine)
+                engine.play(move.source, move.color, move.target)
+                if writer:
+                    writer.move(move.source, move.color, move.target)
+            for event in engine.finish_round():
+                if event.kind == PENALTY_EVENT:
+                    penalties[event.player] += 1
+                    penalty_points[event.player] += event.score
+    finally:
+        for bot in bots:
+            bot.close()
+
+    result = {
+        "game_id": task["game_id"],
+        "seats": task["seats"],
+        "seed": seed,
+        "scores": [board.score for board in engine.players],
+        "winner": engine.winner() if engine.game_over else None,
+        "capped": not engine.game_over,
+        "penalties": penalties,
+        "penalty_points": penalty_points,
+        # 奖励分明细：每个玩家完整的行数、列数和颜色数
+        "bonuses": [list(board.end_game_bonus()) for board in engine.players],
+        "rounds": min(engine.round_count, max_rounds),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    if writer:
+        writer.end(engine)
+        result["replay"] = writer.getvalue()
+    return result
+
+
+def make_tasks(bots: Sequence[str], games_per_pair: int, seed: int = 0) -> List[dict]:
+    """循环赛：每对玩家下 games_per_pair 局，每个种子交换座位各下一局"""
+    tasks = []
+    for (i, first), (j, second) in combinations(enumerate(bots), 2):
+        for k in range(games_per_pair):
+            seats = [first, second] if k % 2 == 0 else [second, first]
+            tasks.append({
+                "game_id": f"{i}-{j}-{k}",
+                "seats": seats,
+                "seed": seed + k // 2,
+            })
+    return tasks
+
+
+def load_results(path: str) -> List[dict]:
+    """读取已完成的对局（忽略崩溃时写了一半的最后一行）"""
+    if not path or not os.path.exists(path):
+        return []
+    results = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return results
+
+
+def _drop_partial_line(path: str):
+    """截掉崩溃时写了一半的最后一行，之后追加的结果从新的一行开始"""
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            f.truncate(end)
+
+
+def _run_pool(game_ids: List[str], tasks: Dict[str, dict], workers: int,
+              record: Callable[[dict], None]) -> List[str]:
+    """在 workers 个进程中运行对局，同时提交的对局数不超过进程数，完成的对局交给 record。
+    进程池崩溃时返回当时正在运行的对局（其余对局没有开始），否则返回空列表"""
+    queue = iter(game_ids)
+    running: Dict[Future, str] = {}
+    executor = ProcessPoolExecutor(workers)
+
+    def submit_next():
+        game_id = next(queue, None)
+        if game_id is not None:
+            running[executor.submit(play_game, tasks[game_id])] = game_id
+
+    try:
+        for _ in range(workers):
+            submit_next()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                del running[future]
+                record(result)
+                submit_next()
+        return []
+    except BrokenProcessPool:
+        return list(running.values())
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_tournament(tasks: List[dict], workers: int = 1, out_path: Optional[str] = None,
+                   on_result: Optional[Callable[[dict], None]] = None,
+                   replay_path: Optional[str] = None) -> List[dict]:
+    """在进程池中运行所有对局，返回全部结果（包括结果文件中已有的）。
+    指定 replay_path 时每局的二进制记录追加到该文件"""
+    results = load_results(out_path)
+    done = {result["game_id"] for result in results}
+    pending = {task["game_id"]: dict(task, record=bool(replay_path))
+               for task in tasks if task["game_id"] not in done}
+    retries: Dict[str, int] = {}
+    if out_path and os.path.exists(out_path):
+        _drop_partial_line(out_path)
+    out = open(out_path, "a", encoding="utf-8") if out_path else None
+    replays = open(replay_path, "ab") if replay_path else None
+
+    def record(result: dict):
+        del pending[result["game_id"]]
+        replay = result.pop("replay", None)
+        if replays and replay:
+            replays.write(replay)
+            replays.flush()
+        results.append(result)
+        if out:
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+        if on_result:
+            on_result(result)
+
+    try:
+        while pending:
+            suspects = _run_pool(list(pending), pending, workers, record)
+            # 进程崩溃：崩溃时正在运行的对局逐个单独运行，单独运行时仍然崩溃的才算这局的责任，
+            # 反复崩溃的对局放弃。没有开始的对局在下一个进程池中继续
+            for game_id in suspects:
+                while game_id in pending and _run_pool([game_id], pending, 1, record):
+                    retries[game_id] = retries.get(game_id, 0) + 1
+                    if retries[game_id] > MAX_RETRIES:
+                        print(f"Giving up on game {game_id} after {retries[game_id]} worker crashes")
+                        del pending[game_id]
+    finally:
+        if out:
+            out.close()
+        if replays:
+            replays.close()
+    return results
+
+
+def wilson_interval(successes: float, n: int, z: float = 1.96) -> Tuple[float, float]:
+    """胜率的 Wilson 置信区间（平局按半胜计算）"""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def elo_difference(score: float) -> float:
+    """得分率对应的 Elo 差"""
+    score = min(max(score, 1e-3), 1 - 1e-3)
+    return -400 * math.log10(1 / score - 1)
+
+
+def compute_elo(results: List[dict], bots: Sequence[str], iterations: int = 200) -> Dict[str, float]:
+    """用 Bradley-Terry 最大似然估计 Elo（平均为0），每对玩家加一局虚拟平局避免无穷大"""
+    index = {bot: i for i, bot in enumerate(bots)}
+    n = len(bots)
+    wins = [0.0] * n
+    games = [[0] * n for _ in range(n)]
+    for i, j in combinations(range(n), 2):
+        games[i][j] += 1
+        games[j][i] += 1
+        wins[i] += 0.5
+        wins[j] += 0.5
+    for result in results:
+        a, b = (index.get(seat) for seat in result["seats"])
+        if a is None or b is None:
+            continue
+        games[a][b] += 1
+        games[b][a] += 1
+        if result["winner"] is None:
+            wins[a] += 0.5
+            wins[b] += 0.5
+        else:
+            wins[a if result["winner"] == 0 else b] += 1
+
+    strength = [1.0] * n
+    for _ in range(iterations):
+        for i in range(n):
+            denominator = sum(games[i][j] / (strength[i] + strength[j]) for j in range(n) if j != i)
+            if denominator:
+                strength[i] = wins[i] / denominator
+        mean_log = sum(math.log(s) for s in strength) / n
+        strength = [s / math.exp(mean_log) for s in strength]
+    return {bot: 400 * math.log10(strength[index[bot]]) for bot in bots}
+
+
+def summarize(results: List[dict], bots: Sequence[str]) -> str:
+    """每个玩家的 Elo、胜率（95%置信区间）、平均分、每局扣分区棋子数和平均回合数"""
+    elo = compute_elo(results, bots)
+    lines = [f"{'Bot':<28}{'Elo':>7}{'Games':>7}{'Win%':>7}{'95% CI':>15}{'Score':>8}{'Pen/G':>7}{'Rounds':>8}"]
+    for bot in sorted(bots, key=lambda name: -elo[name]):
+        played = points = score = penalties = rounds = 0
+        for result in results:
+            for seat, spec in enumerate(result["seats"]):
+                if spec != bot:
+                    continue
+                played += 1
+                points += 0.5 if result["winner"] is None else float(result["winner"] == seat)
+                score += result["scores"][seat]
+                penalties += result["penalties"][seat]
+                rounds += result["rounds"]
+        if not played:
+            continue
+        low, high = wilson_interval(points, played)
+        lines.append(f"{bot:<28}{elo[bot]:>7.0f}{played:>7}{100 * points / played:>7.1f}"
+                     f"{f'[{100 * low:.1f}, {100 * high:.1f}]':>15}{score / played:>8.1f}"
+                     f"{penalties / played:>7.2f}{rounds / played:>8.2f}")
+
+    # 两两对战的得分率和对应的Elo差
+    lines.append("")
+    for first, second in combinations(bots, 2):
+        pair = [result for result in results if set(result["seats"]) == {first, second}]
+        if not pair:
+            continue
+        points = sum(0.5 if result["winner"] is None else float(result["seats"][result["winner"]] == first)
+                     for result in pair)
+        low, high = wilson_interval(points, len(pair))
+        lines.append(f"{first} vs {second}: {points:g}/{len(pair)} "
+                     f"({100 * points / len(pair):.1f}%, Elo {elo_difference(points / len(pair)):+.0f}, "
+                     f"CI [{elo_difference(low):+.0f}, {elo_difference(high):+.0f}])")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="电脑玩家自我对弈锦标赛")
+    parser.add_argument("bots", nargs="+", help="电脑玩家描述，例如 random greedy mcts:playouts=200")
+    parser.add_argument("--games", type=int, default=20, help="每对玩家的对局数（交换座位各一半）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数")
+    parser.add_argument("--seed", type=int, default=0, help="发牌的起始种子")
+    parser.add_argument("--out", default="tournament_results.jsonl", help="结果文件（JSON Lines）")
+    parser.add_argument("--replays", help="对局记录文件（二进制，可以用 game.py --replay 回放）")
+    args = parser.parse_args()
+    if len(set(args.bots)) < 2:
+        parser.error("Need at least two different bots")
+
+    tasks = make_tasks(args.bots, args.games, args.seed)
+    started = time.perf_counter()
+    finished = [0]
+
+    def progress(result: dict):
+        finished[0] += 1
+        print(f"[{finished[0]}] {result['game_id']} {result['seats'][0]} {result['scores'][0]} - "
+              f"{result['scores'][1]} {result['seats'][1]}", flush=True)
+
+    results = run_tournament(tasks, args.workers, args.out, progress, args.replays)
+    print(f"\n{len(results)} games in {time.perf_counter() - started:.1f}s\n")
+    print(summarize(results, args.bots))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Zobrist 哈希和置换表
+
+每个状态分量（圆盘、待定区每种颜色的数量，先手棋子位置，准备区每行的颜色和数量，
+结算区每一格，扣分区每一格，分数，行动方）对应一个64位随机数，状态的哈希值是
+这些随机数的异或。引擎在每一步和每个结算步骤中增量更新，见 engine.py。
+"""
+import random
+from typing import List, NamedTuple, Optional
+
+_rng = random.Random(0x5A2B1)
+
+
+def _key() -> int:
+    return _rng.getrandbits(64)
+
+
+def _count_keys(size: int) -> List[int]:
+    """数量为0时键为0，这样空的分量不影响哈希"""
+    return [0] + [_key() for _ in range(size - 1)]
+
+
+# 5个圆盘 x 5种颜色 x 数量0-20
+DISK_KEYS = [[_count_keys(21) for _ in range(5)] for _ in range(5)]
+# 待定区 5种颜色 x 数量0-20
+CENTER_KEYS = [_count_keys(21) for _ in range(5)]
+# 先手棋子：在待定区 / 被玩家1拿到 / 被玩家2拿到
+TOKEN_CENTER_KEY = _key()
+TOKEN_HELD_KEYS = [_key(), _key()]
+# 2个玩家 x 5行 x 5种颜色 x 数量0-5
+PREP_KEYS = [[[_count_keys(6) for _ in range(5)] for _ in range(5)] for _ in range(2)]
+# 2个玩家 x 结算区25格
+WALL_KEYS = [[_key() for _ in range(25)] for _ in range(2)]
+# 2个玩家 x 扣分区7格 x 棋子（5种颜色和先手棋子）
+FLOOR_KEYS = [[[_key() for _ in range(6)] for _ in range(7)] for _ in range(2)]
+# 2个玩家 x 分数（取低10位，分数可能为负）
+SCORE_MASK = 1023
+SCORE_KEYS = [[_key() for _ in range(SCORE_MASK + 1)] for _ in range(2)]
+# 轮到玩家2行动
+SIDE_KEY = _key()
+
+
+class TTEntry(NamedTuple):
+    key: int
+    depth: int
+    value: int
+    flag: int
+    move: Optional[tuple]
+
+
+class TranspositionTable:
+    """固定大小的置换表
+
+    每个桶有两个槽：深度优先槽只被更深（或同一局面）的结果替换，
+    被挤出的结果和较浅的结果都放进总是替换槽。
+    """
+    EXACT = 0
+    LOWER = 1   # 值是下界（发生了beta剪枝）
+    UPPER = 2   # 值是上界（没有走法超过alpha）
+
+    def __init__(self, size_bits: int = 16):
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.deep: List[Optional[TTEntry]] = [None] * self.size
+        self.recent: List[Optional[TTEntry]] = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        """查找局面，没有记录时返回None"""
+        self.probes += 1
+        index = key & self.mask
+        entry = self.deep[index]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        entry = self.recent[index]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, value: int, flag: int, move: Optional[tuple] = None):
+        """保存搜索结果"""
+        index = key & self.mask
+        entry = TTEntry(key, depth, value, flag, move)
+        old = self.deep[index]
+        if old is None or old.key == key or depth >= old.depth:
+            if old is not None and old.key != key:
+                self.recent[index] = old
+            self.deep[index] = entry
+        else:
+            self.recent[index] = entry
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self.deep) + sum(entry is not None for entry in self.recent)